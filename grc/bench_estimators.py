@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Benchmark the legacy (sync block + keep_one_in_n) estimator wiring against
+the decimating estimator on the same complex input.
+
+    python3 bench_estimators.py --samples 64000000 --window 32000
+
+Reports wall time, process CPU time and the bytes of float output each
+estimator writes into the flowgraph buffers.
+"""
+import contextlib
+import os
+import time
+from argparse import ArgumentParser
+
+import numpy as np
+from gnuradio import blocks, gr
+
+import default_epy_block_0 as epy_block_0
+import default_epy_block_1 as epy_block_1
+
+
+def make_input(n=1 << 16, seed=0):
+    rng = np.random.default_rng(seed)
+    return ((rng.standard_normal(n) + 1j * rng.standard_normal(n)) / np.sqrt(2)).astype(np.complex64)
+
+
+def run(wiring, samples, window):
+    tb = gr.top_block()
+    src = blocks.vector_source_c(make_input().tolist(), True)
+    head = blocks.head(gr.sizeof_gr_complex, samples)
+    sink = blocks.null_sink(gr.sizeof_float)
+    tb.connect(src, head)
+
+    if wiring == 'legacy':
+        est = epy_block_0.blk(alpha=0.1)
+        keep = blocks.keep_one_in_n(gr.sizeof_float, window)
+        tb.connect(head, est, keep, sink)
+    else:
+        est = epy_block_1.blk(alpha=0.1, window=window)
+        tb.connect(head, est, sink)
+
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        wall0, cpu0 = time.perf_counter(), time.process_time()
+        tb.run()
+        wall, cpu = time.perf_counter() - wall0, time.process_time() - cpu0
+
+    return {
+        'wall_s': wall,
+        'cpu_s': cpu,
+        'est_out_bytes': est.nitems_written(0) * gr.sizeof_float,
+    }
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument('--samples', type=int, default=32000 * 2000)
+    parser.add_argument('--window', type=int, default=32000)
+    args = parser.parse_args()
+
+    print(f"{'wiring':<8} {'wall [s]':>9} {'cpu [s]':>9} {'Msps':>8} {'estimator output':>18}")
+    results = {}
+    for wiring in ('legacy', 'decim'):
+        r = results[wiring] = run(wiring, args.samples, args.window)
+        print(f"{wiring:<8} {r['wall_s']:>9.2f} {r['cpu_s']:>9.2f} {args.samples / r['wall_s'] / 1e6:>8.1f} "
+              f"{r['est_out_bytes'] / 1e6:>15.3f} MB")
+
+    legacy, decim = results['legacy'], results['decim']
+    print(f"\nCPU reduction: {(1 - decim['cpu_s'] / legacy['cpu_s']) * 100:.1f}% | "
+          f"output bytes: {legacy['est_out_bytes']} -> {decim['est_out_bytes']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark of the power computation used in the estimator work()
+methods, at buffer sizes GNU Radio typically hands to a block.
+
+    python3 bench_power_kernel.py
+
+Needs only NumPy (no GNU Radio).
+"""
+import timeit
+from argparse import ArgumentParser
+
+import numpy as np
+
+from power_kernel import PowerKernel
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[512, 4096, 8192, 32768])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    kernels = {
+        'kernel': PowerKernel(),
+        'kernel stride=4': PowerKernel(stride=4),
+        'kernel stride=16': PowerKernel(stride=16),
+    }
+    m2m4 = PowerKernel()
+
+    print(f"{'method':<18}" + "".join(f"{n:>14}" for n in args.sizes) + "   (Msamples/s)")
+    rows = {}
+    for n in args.sizes:
+        x = ((rng.standard_normal(n) + 1j * rng.standard_normal(n)) / np.sqrt(2)).astype(np.complex64)
+        cases = {'np.mean(abs**2)': lambda: np.mean(np.abs(x)**2)}
+        cases.update({name: (lambda k=k: k.power(x)) for name, k in kernels.items()})
+        cases['kernel m2m4'] = lambda: m2m4.m2m4(x)
+
+        for name, fn in cases.items():
+            number = max(1, 2000000 // n)
+            best = min(timeit.repeat(fn, number=number, repeat=args.repeat)) / number
+            rows.setdefault(name, []).append(n / best / 1e6)
+
+    for name, rates in rows.items():
+        print(f"{name:<18}" + "".join(f"{r:>14.1f}" for r in rates))
+
+
+if __name__ == '__main__':
+    main()
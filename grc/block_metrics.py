@@ -0,0 +1,127 @@
+"""
+Work-call metrics for the estimator blocks, exported in Prometheus text format.
+
+Blocks record every work() call: samples in and out, time spent and the rate
+they emitted. GNU Radio runs each block's work() on its own thread, so the
+totals are plain attributes, written by that thread only, and the hot path
+takes no lock. The first block created starts /metrics on
+SDR_BLOCK_METRICS_PORT (default 9110, 0 turns it off); the controllers
+export theirs from python/metrics.py.
+
+    self.metrics = block_metrics.register("linear_decim")
+    ...
+    self.metrics.record(len(input_items[0]), n_out, time.perf_counter() - start, rate)
+"""
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_PORT = 9110
+PORT = int(os.environ.get("SDR_BLOCK_METRICS_PORT", str(DEFAULT_PORT)))
+
+_blocks = []
+_lock = threading.Lock()
+_server = None
+
+
+class BlockMetrics(object):
+    """
+    Totals of one block instance.
+
+    Args:
+        name: Value of the `block` label, unique within the process
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.samples_in = 0
+        self.samples_out = 0
+        self.seconds = 0.0
+        self.rate_bps = 0.0
+        self._last = (time.monotonic(), 0)  # (scrape time, samples_in) for samples/sec
+
+    def record(self, n_in, n_out, seconds, rate_bps=None):
+        self.calls += 1
+        self.samples_in += n_in
+        self.samples_out += n_out
+        self.seconds += seconds
+        if rate_bps is not None:
+            self.rate_bps = rate_bps
+
+    def input_rate(self):
+        """Input samples/sec since the previous call (i.e. the previous scrape)."""
+        now, samples = time.monotonic(), self.samples_in
+        then, before = self._last
+        self._last = (now, samples)
+        return (samples - before) / (now - then) if now > then else 0.0
+
+
+def register(name):
+    """Metrics for a new block instance; starts the endpoint with the first one."""
+    global _server
+    with _lock:
+        taken = {block.name for block in _blocks}
+        unique, n = name, 1
+        while unique in taken:
+            n += 1
+            unique = f"{name}_{n}"
+        metrics = BlockMetrics(unique)
+        _blocks.append(metrics)
+        if _server is None and PORT:
+            try:
+                _server = serve(PORT)
+            except OSError as e:
+                _server = False  # Don't retry for every block
+                print(f"Block metrics disabled, cannot bind port {PORT}: {e}")
+    return metrics
+
+
+FAMILIES = (
+    ("sdr_block_work_calls_total", "counter", "work() calls", lambda b: b.calls),
+    ("sdr_block_samples_in_total", "counter", "Input samples consumed", lambda b: b.samples_in),
+    ("sdr_block_samples_out_total", "counter", "Output items produced", lambda b: b.samples_out),
+    ("sdr_block_work_seconds_total", "counter", "Time spent in work()", lambda b: b.seconds),
+    ("sdr_block_samples_per_second", "gauge", "Input samples/sec since the previous scrape",
+     lambda b: b.input_rate()),
+    ("sdr_block_rate_bps", "gauge", "Last bitrate the block emitted", lambda b: b.rate_bps),
+)
+
+
+def expose():
+    """All blocks' metrics in Prometheus text format (0.0.4)."""
+    with _lock:
+        blocks = list(_blocks)
+    lines = []
+    for name, kind, help, value in FAMILIES:
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} {kind}")
+        for block in blocks:
+            v = value(block)
+            lines.append(f'{name}{{block="{block.name}"}} {repr(float(v)) if isinstance(v, float) else v}')
+    return "\n".join(lines) + "\n"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = expose().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port=DEFAULT_PORT, host="127.0.0.1"):
+    """Serve /metrics on a daemon thread; returns the server. Raises OSError if the port is taken."""
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="block-metrics", daemon=True).start()
+    return server
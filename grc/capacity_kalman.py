@@ -0,0 +1,169 @@
+"""
+Model-based bitrate prediction: Kalman-tracked signal and noise power
+mapped to achievable rate with a Shannon-style capacity model.
+
+Per window the M2M4 estimator (power_kernel.py) gives total power M2 and
+SNR, hence signal power S = M2 * snr / (1 + snr) and noise power
+N = M2 / (1 + snr). Both are tracked in dB by constant-velocity Kalman
+filters (level + damped trend), so a drifting channel is extrapolated
+instead of followed with an EWMA lag:
+
+    forecast SNR(h) = S(h) - N(h)            [dB]
+    rate            = B * log2(1 + SNR)      clipped to [rate_min, rate_max]
+    B               = rate_max / log2(1 + snr_max)
+
+The emitted rate is the lower confidence bound of the forecast
+`horizon` seconds ahead (SNR - z * sigma), so an uncertain or falling
+channel lowers the rate before the samples say so. With `hold`, the
+previous rate is kept while it lies between that bound and the mean
+forecast: it is still safe and not needlessly low, so estimation noise
+does not turn into rate changes.
+
+KalmanBank runs any number of independent filters in lockstep on numpy
+arrays (the 2x2 covariance algebra is written out elementwise), so the
+offline evaluation filters every trace of a sweep at once.
+"""
+import numpy as np
+
+
+class KalmanBank(object):
+    """
+    Independent level + trend Kalman filters, one per array element.
+
+    Args:
+        n: Number of filters
+        q_level: Level process noise (dB^2 per second)
+        q_trend: Trend process noise ((dB/s)^2 per second)
+        damping: Fraction of the trend kept after one second (1 = no damping)
+    """
+
+    def __init__(self, n, q_level=0.001, q_trend=0.05, damping=0.9):
+        self.q_level = q_level
+        self.q_trend = q_trend
+        self.damping = damping
+        self.level = np.zeros(n)
+        self.trend = np.zeros(n)
+        self.p00 = np.full(n, np.inf)  # level variance, inf until the first measurement
+        self.p01 = np.zeros(n)
+        self.p11 = np.zeros(n)
+
+    def _reach(self, dt):
+        """Level change per unit trend over dt seconds with the trend decaying."""
+        if self.damping >= 1.0:
+            return dt
+        return (1.0 - self.damping ** dt) / -np.log(self.damping)
+
+    def predict(self, dt):
+        reach, phi = self._reach(dt), self.damping ** dt
+        self.level += reach * self.trend
+        self.p00 += 2 * reach * self.p01 + reach * reach * self.p11 + self.q_level * dt
+        self.p01 = phi * (self.p01 + reach * self.p11)
+        self.p11 = phi * phi * self.p11 + self.q_trend * dt
+        self.trend *= phi
+
+    def update(self, z, r):
+        """Fold in measurements z (NaN = none for that filter) with variance r."""
+        z = np.asarray(z, dtype=float)
+        seen = ~np.isnan(z)
+        first = seen & np.isinf(self.p00)
+        if first.any():
+            # Start at the first measurement with no trend
+            self.level[first] = z[first]
+            self.p00[first] = r
+            self.p01[first] = 0.0
+            self.p11[first] = self.q_trend
+        update = seen & ~first
+        if update.any():
+            innovation = np.where(update, z - self.level, 0.0)
+            s = self.p00 + r
+            k0 = np.where(update, self.p00 / s, 0.0)
+            k1 = np.where(update, self.p01 / s, 0.0)
+            self.level += k0 * innovation
+            self.trend += k1 * innovation
+            self.p11 -= k1 * self.p01
+            self.p00 *= 1 - k0
+            self.p01 *= 1 - k0
+
+    def forecast(self, h):
+        """(level, variance) h seconds ahead, without changing the state."""
+        reach = self._reach(h)
+        var = self.p00 + 2 * reach * self.p01 + reach * reach * self.p11 + self.q_level * h
+        return self.level + reach * self.trend, var
+
+
+class CapacityModel(object):
+    """
+    Args:
+        rate_min, rate_max: Output range (bps)
+        snr_max_db: SNR at which rate_max is reached
+        step: Output rounding (bps), as the other estimator blocks round
+    """
+
+    def __init__(self, rate_min=1000000.0, rate_max=10000000.0, snr_max_db=20.0, step=100000.0):
+        self.rate_min = rate_min
+        self.rate_max = rate_max
+        self.step = step
+        self.bandwidth = rate_max / np.log2(1 + 10 ** (snr_max_db / 10))
+
+    def rate(self, snr_db):
+        rate = self.bandwidth * np.log2(1 + 10 ** (np.asarray(snr_db, dtype=float) / 10))
+        rate = np.clip(rate, self.rate_min, self.rate_max)
+        return np.round(rate / self.step) * self.step if self.step else rate
+
+
+def signal_noise_db(m2, snr, floor_db=-40.0):
+    """M2M4 (total power, linear SNR) -> (signal dB, noise dB), floored."""
+    m2 = np.asarray(m2, dtype=float)
+    snr = np.asarray(snr, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        noise = np.where(np.isinf(snr), 0.0, m2 / (1 + snr))
+        signal = m2 - noise
+        floor = 10 ** (floor_db / 10)
+        return (10 * np.log10(np.maximum(signal, floor)),
+                10 * np.log10(np.maximum(noise, floor)))
+
+
+class PredictiveEstimator(object):
+    """
+    Kalman-tracked S and N -> conservative capacity forecast, for n streams.
+
+    Args:
+        n: Number of independent streams (1 in the GRC block)
+        horizon: Forecast horizon in seconds (~ telemetry-to-enforcement delay)
+        z: Confidence multiplier; the rate is the SNR forecast minus z sigma
+        meas_std_db: Standard deviation of one window's S/N measurement (dB)
+        capacity: CapacityModel (default: 1-10 Mbps, full rate at 20 dB)
+        hold: Keep the previous rate while it is inside [bound, forecast]
+        **kalman: KalmanBank options (q_level, q_trend, damping)
+    """
+
+    def __init__(self, n=1, horizon=2.0, z=1.0, meas_std_db=0.2, capacity=None, hold=True, **kalman):
+        self.n = n
+        self.horizon = horizon
+        self.z = z
+        self.meas_var = meas_std_db ** 2
+        self.capacity = capacity or CapacityModel()
+        self.hold = hold
+        self.rate = None
+        # Filters 0..n-1 track signal power, n..2n-1 noise power
+        self.bank = KalmanBank(2 * n, **kalman)
+
+    def update(self, m2, snr, dt):
+        """
+        One window per stream: returns (rate, forecast, snr_std_db) arrays,
+        rate being the lower bound and forecast the mean rate at the horizon.
+        """
+        signal_db, noise_db = signal_noise_db(m2, snr)
+        self.bank.predict(dt)
+        self.bank.update(np.concatenate([np.atleast_1d(signal_db), np.atleast_1d(noise_db)]), self.meas_var)
+        rate, forecast, std_db = self.predict(self.horizon)
+        if self.hold and self.rate is not None:
+            rate = np.where((self.rate >= rate) & (self.rate <= forecast), self.rate, rate)
+        self.rate = rate
+        return rate, forecast, std_db
+
+    def predict(self, h):
+        level, var = self.bank.forecast(h)
+        snr_db = level[:self.n] - level[self.n:]
+        std_db = np.sqrt(var[:self.n] + var[self.n:])
+        return self.capacity.rate(snr_db - self.z * std_db), self.capacity.rate(snr_db), std_db
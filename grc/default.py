@@ -24,14 +24,14 @@ from argparse import ArgumentParser
 from gnuradio.eng_arg import eng_float, intx
 from gnuradio import eng_notation
 from gnuradio import zeromq
-import default_epy_block_0 as epy_block_0  # embedded python block
+import default_epy_block_1 as epy_block_1  # embedded python block
 import threading
 
 
 
 class default(gr.top_block, Qt.QWidget):
 
-    def __init__(self):
+    def __init__(self, window=32000):
         gr.top_block.__init__(self, "Not titled yet", catch_exceptions=True)
         Qt.QWidget.__init__(self)
         self.setWindowTitle("Not titled yet")
@@ -62,6 +62,11 @@ class default(gr.top_block, Qt.QWidget):
             print(f"Qt GUI: Could not restore geometry: {str(exc)}", file=sys.stderr)
         self.flowgraph_started = threading.Event()
 
+        ##################################################
+        # Parameters
+        ##################################################
+        self.window = window
+
         ##################################################
         # Variables
         ##################################################
@@ -79,7 +84,7 @@ class default(gr.top_block, Qt.QWidget):
         self._noise_amp_win = qtgui.RangeWidget(self._noise_amp_range, self.set_noise_amp, "'noise_amp'", "counter_slider", float, QtCore.Qt.Horizontal)
         self.top_layout.addWidget(self._noise_amp_win)
         self.zeromq_pub_sink_0 = zeromq.pub_sink(gr.sizeof_float, 1, 'tcp://127.0.0.1:5555', 100, False, (-1), 'BITRATE', True, True)
-        self.epy_block_0 = epy_block_0.blk(alpha=0.1)
+        self.epy_block_1 = epy_block_1.blk(alpha=0.1, window=window)
         self.digital_glfsr_source_x_0 = digital.glfsr_source_b(16, True, 0, 1)
         self.digital_constellation_modulator_0 = digital.generic_mod(
             constellation=qpsk,
@@ -106,18 +111,16 @@ class default(gr.top_block, Qt.QWidget):
             noise_amp,
             42)
         self.blocks_throttle2_0 = blocks.throttle( gr.sizeof_char*1, samp_rate, True, 0 if "auto" == "auto" else max( int(float(0.1) * samp_rate) if "auto" == "time" else int(0.1), 1) )
-        self.blocks_keep_one_in_n_0 = blocks.keep_one_in_n(gr.sizeof_float*1, 32000)
 
 
         ##################################################
         # Connections
         ##################################################
-        self.connect((self.blocks_keep_one_in_n_0, 0), (self.zeromq_pub_sink_0, 0))
         self.connect((self.blocks_throttle2_0, 0), (self.digital_constellation_modulator_0, 0))
-        self.connect((self.channels_dynamic_channel_model_0, 0), (self.epy_block_0, 0))
         self.connect((self.digital_constellation_modulator_0, 0), (self.channels_dynamic_channel_model_0, 0))
+        self.connect((self.channels_dynamic_channel_model_0, 0), (self.epy_block_1, 0))
         self.connect((self.digital_glfsr_source_x_0, 0), (self.blocks_throttle2_0, 0))
-        self.connect((self.epy_block_0, 0), (self.blocks_keep_one_in_n_0, 0))
+        self.connect((self.epy_block_1, 0), (self.zeromq_pub_sink_0, 0))
 
 
     def closeEvent(self, event):
@@ -128,6 +131,9 @@ class default(gr.top_block, Qt.QWidget):
 
         event.accept()
 
+    def get_window(self):
+        return self.window
+
     def get_samp_rate(self):
         return self.samp_rate
 
@@ -152,11 +158,21 @@ class default(gr.top_block, Qt.QWidget):
 
 
 
+def argument_parser():
+    parser = ArgumentParser()
+    parser.add_argument(
+        "--window", dest="window", type=intx, default=32000,
+        help="Set samples per bitrate estimate [default=%(default)r]")
+    return parser
+
+
 def main(top_block_cls=default, options=None):
+    if options is None:
+        options = argument_parser().parse_args()
 
     qapp = Qt.QApplication(sys.argv)
 
-    tb = top_block_cls()
+    tb = top_block_cls(window=options.window)
 
     tb.start()
     tb.flowgraph_started.set()
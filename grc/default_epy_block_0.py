@@ -1,8 +1,11 @@
+import time
 import numpy as np
 from gnuradio import gr
+import block_metrics
+from power_kernel import PowerKernel, RateLimitedLog
 
 class blk(gr.sync_block):
-    def __init__(self, alpha=0.1):
+    def __init__(self, alpha=0.1, stride=1):
         gr.sync_block.__init__(self, 
             name="Linear Bitrate Calc", 
             in_sig=[np.complex64], 
@@ -18,11 +21,16 @@ class blk(gr.sync_block):
         self.alpha = alpha       # Smoothing factor
         self.avg_power = 0.0     # State variable
 
+        self.kernel = PowerKernel(stride=stride)  # stride > 1 = cheaper estimate
+        self.log = RateLimitedLog(interval=1.0)
+        self.metrics = block_metrics.register("linear")
+
     def work(self, input_items, output_items):
         if len(input_items[0]) == 0: return 0
+        start = time.perf_counter()
             
         # 2. CALCULATE POWER
-        inst_power = np.mean(np.abs(input_items[0])**2)
+        inst_power = self.kernel.power(input_items[0])
         
         # 3. SMOOTHING
         self.avg_power = (self.alpha * inst_power) + ((1 - self.alpha) * self.avg_power)
@@ -43,8 +51,11 @@ class blk(gr.sync_block):
         # 6. ROUNDING
         current_rate = round(current_rate / 100000) * 100000
         
-        # DEBUG
-        print(f"PWR: {self.avg_power:.2f} | FACTOR: {linear_factor:.2f} | RATE: {current_rate/1e6:.1f} Mbps", end='\r')
+        # DEBUG (at most once per second)
+        if self.log.due():
+            print(f"PWR: {self.avg_power:.2f} | FACTOR: {linear_factor:.2f} | RATE: {current_rate/1e6:.1f} Mbps", end='\r')
 
         output_items[0][:] = current_rate
-        return len(output_items[0])
\ No newline at end of file
+        n_out = len(output_items[0])
+        self.metrics.record(len(input_items[0]), n_out, time.perf_counter() - start, current_rate)
+        return n_out
\ No newline at end of file
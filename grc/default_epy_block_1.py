@@ -0,0 +1,65 @@
+import time
+import numpy as np
+from gnuradio import gr
+import block_metrics
+from power_kernel import PowerKernel
+
+class blk(gr.decim_block):
+    def __init__(self, alpha=0.1, window=32000, stride=1):
+        """
+        Decimating version of the Linear Bitrate Calc block.
+
+        Emits one rate per `window` input samples instead of writing the
+        same rate into every output sample, so no keep_one_in_n is needed.
+
+        Args:
+            alpha: Smoothing factor, applied once per window
+            window: Input samples per power estimate (= decimation)
+            stride: Estimate power from every stride-th sample (1 = all)
+        """
+        gr.decim_block.__init__(self,
+            name="Decimating Bitrate Calc",
+            in_sig=[np.complex64],
+            out_sig=[np.float32],
+            decim=int(window))
+
+        # 1. DEFINITIONS
+        self.pwr_min = 0.3       # Baseline Power (Slider = 0)
+        self.pwr_max = 1.3       # Max Power (Slider = 1)
+
+        self.rate_max = 10000000.0 # 10 Mbps
+        self.rate_min = 1000000.0  # 1 Mbps
+
+        self.alpha = alpha       # Smoothing factor
+        self.window = int(window)
+        self.kernel = PowerKernel(stride=stride)
+        self.avg_power = None    # State variable, seeded by the first window
+        self.metrics = block_metrics.register("linear_decim")
+
+    def work(self, input_items, output_items):
+        n_out = len(output_items[0])
+        if n_out == 0: return 0
+        start = time.perf_counter()
+
+        # 2. CALCULATE POWER (one value per window)
+        in0 = input_items[0]
+        out = output_items[0]
+        for i in range(n_out):
+            power = self.kernel.power(in0[i * self.window:(i + 1) * self.window])
+
+            # 3. SMOOTHING
+            if self.avg_power is None:
+                self.avg_power = power
+            else:
+                self.avg_power = (self.alpha * power) + ((1 - self.alpha) * self.avg_power)
+
+            # 4. MAPPING (same curve as Linear Bitrate Calc)
+            raw_factor = min(max((self.avg_power - self.pwr_min) / (self.pwr_max - self.pwr_min), 0.0), 1.0)
+            linear_factor = raw_factor ** 0.5
+
+            # 5. CALCULATE RATE + 6. ROUNDING
+            current_rate = self.rate_max - (linear_factor * (self.rate_max - self.rate_min))
+            out[i] = round(current_rate / 100000) * 100000
+
+        self.metrics.record(n_out * self.window, n_out, time.perf_counter() - start, float(out[n_out - 1]))
+        return n_out
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Offline evaluation of the bitrate estimators: tracking error vs churn.
+
+Windows of QPSK in complex Gaussian noise are synthesized from a noise
+trajectory (one noise_amp per window) and every estimator sees the same
+samples. No GNU Radio is needed: the estimator formulas run on the same
+PowerKernel the blocks use.
+
+Ground truth is the capacity model (capacity_kalman.CapacityModel) at the
+true SNR. Reported per estimator:
+
+    MAE now     mean |rate(t) - capacity(t)|
+    MAE +h      mean |rate(t) - capacity(t + horizon)|: the rate is in
+                force until the next update reaches the switch
+    over %      windows with rate above capacity(t + horizon) by more than
+                --tolerance (policed above what the channel carries)
+    changes/min distinct rate changes (each is a QoS reconfiguration)
+
+All rates are rounded to 100 kbps like the blocks' output, so on a
+continuously drifting channel some churn is inherent; the controllers'
+rate policy (python/rate_policy.py) still sits behind every estimator.
+
+`linear` is default_epy_block_1's power curve; its rates follow a
+different mapping than the capacity model, so its error columns mostly
+show that mismatch. The capacity rows isolate the filtering.
+
+    python3 eval_estimators.py                     # synthetic steps / fading / ramp
+    python3 eval_estimators.py --sweep sweep.npz   # replay sweep.py runs
+    python3 eval_estimators.py --rates rates.f32   # replay a headless.py --out series
+
+Replays invert the linear estimator's curve to get back the noise power
+it saw, then synthesize fresh samples at that noise level.
+"""
+import sys
+from argparse import ArgumentParser
+
+import numpy as np
+
+from capacity_kalman import CapacityModel, PredictiveEstimator, signal_noise_db
+from power_kernel import PowerKernel
+
+# default_epy_block_1 mapping
+PWR_MIN, PWR_MAX = 0.3, 1.3
+RATE_MIN, RATE_MAX = 1e6, 10e6
+
+
+def linear_rates(m2, alpha=0.1):
+    """Rates default_epy_block_1 emits for per-window powers (streams x windows)."""
+    avg = np.empty_like(m2)
+    acc = m2[:, 0]
+    for i in range(m2.shape[1]):
+        acc = alpha * m2[:, i] + (1 - alpha) * acc
+        avg[:, i] = acc
+    factor = np.sqrt(np.clip((avg - PWR_MIN) / (PWR_MAX - PWR_MIN), 0.0, 1.0))
+    return np.round((RATE_MAX - factor * (RATE_MAX - RATE_MIN)) / 100000) * 100000
+
+
+def noise_from_rates(rates, signal_power=1.0):
+    """Invert the linear curve: emitted rates -> noise_amp the estimator saw."""
+    factor = (RATE_MAX - np.asarray(rates, dtype=float)) / (RATE_MAX - RATE_MIN)
+    power = PWR_MIN + np.clip(factor, 0.0, 1.0) ** 2 * (PWR_MAX - PWR_MIN)
+    return np.sqrt(np.maximum(power - signal_power, 1e-4))
+
+
+def synthetic(name, duration=600.0, dt=1.0, seed=0):
+    """noise_amp per window for one of the synthetic channels."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(0, duration, dt)
+    if name == "steps":
+        # Interference switching on and off every 30-90 s
+        amp = np.empty(len(t))
+        i = 0
+        while i < len(t):
+            n = max(1, int(rng.uniform(30, 90) / dt))
+            amp[i:i + n] = rng.choice((0.1, 0.4, 0.8))
+            i += n
+    elif name == "fading":
+        # Slow fade with a 40 s period
+        amp = 0.45 + 0.35 * np.sin(2 * np.pi * t / 40.0)
+    elif name == "ramp":
+        # Receiver walking away and back over the run
+        amp = 0.05 + 0.85 * (1 - np.abs(2 * t / duration - 1))
+    else:
+        raise ValueError(f"Unknown channel {name!r}")
+    return amp
+
+
+CHANNELS = ("steps", "fading", "ramp")
+
+
+def measure(amps, samples, seed=0):
+    """
+    Per-window M2M4 measurements of QPSK + noise at each noise_amp.
+    amps: (streams, windows) -> (m2, snr) arrays of the same shape.
+    """
+    rng = np.random.default_rng(seed)
+    kernel = PowerKernel()
+    m2 = np.empty(amps.shape)
+    snr = np.empty(amps.shape)
+    qpsk = np.array([1 + 1j, -1 + 1j, -1 - 1j, 1 - 1j], dtype=np.complex64) / np.sqrt(2)
+    for s in range(amps.shape[0]):
+        for w in range(amps.shape[1]):
+            noise = (rng.standard_normal(samples) + 1j * rng.standard_normal(samples)) * (amps[s, w] / np.sqrt(2))
+            x = (qpsk[rng.integers(0, 4, samples)] + noise).astype(np.complex64)
+            m2[s, w], snr[s, w] = kernel.m2m4(x)
+    return m2, snr
+
+
+def estimators(horizon, z, meas_std_db, capacity):
+    """name -> function((m2, snr) streams x windows, dt) -> rates."""
+    def raw(m2, snr, dt):
+        s, n = signal_noise_db(m2, snr)
+        return capacity.rate(s - n)
+
+    def ewma(m2, snr, dt, alpha=0.1):
+        s, n = signal_noise_db(m2, snr)
+        snr_db = s - n
+        out = np.empty_like(snr_db)
+        acc = snr_db[:, 0]
+        for i in range(snr_db.shape[1]):
+            acc = alpha * snr_db[:, i] + (1 - alpha) * acc
+            out[:, i] = acc
+        return capacity.rate(out)
+
+    def kalman(h, zz, hold=False):
+        def run(m2, snr, dt):
+            est = PredictiveEstimator(m2.shape[0], horizon=h, z=zz, meas_std_db=meas_std_db,
+                                      capacity=capacity, hold=hold)
+            out = np.empty(m2.shape)
+            for i in range(m2.shape[1]):
+                out[:, i] = est.update(m2[:, i], snr[:, i], dt)[0]
+            return out
+        return run
+
+    return [
+        ("linear (current)", lambda m2, snr, dt: linear_rates(m2)),
+        ("capacity, raw", raw),
+        ("capacity, EWMA 0.1", ewma),
+        ("kalman now", kalman(0.0, 0.0)),
+        (f"kalman +{horizon:g}s", kalman(horizon, 0.0)),
+        (f"kalman +{horizon:g}s, -{z:g} sigma", kalman(horizon, z)),
+        ("  + hold (block default)", kalman(horizon, z, hold=True)),
+    ]
+
+
+def evaluate(rates, truth, dt, horizon, tolerance=0.02):
+    """Metrics over all streams (streams x windows arrays)."""
+    ahead = int(round(horizon / dt))
+    future = np.concatenate([truth[:, ahead:], np.repeat(truth[:, -1:], ahead, axis=1)], axis=1)
+    minutes = truth.shape[1] * dt / 60.0 * truth.shape[0]
+    return {
+        "mae_now": float(np.mean(np.abs(rates - truth))),
+        "mae_ahead": float(np.mean(np.abs(rates - future))),
+        "over_pct": 100.0 * float(np.mean(rates > future * (1 + tolerance))),
+        "changes_per_min": np.count_nonzero(np.diff(rates, axis=1)) / minutes,
+    }
+
+
+def main():
+    parser = ArgumentParser(description="Tracking error vs rate changes of the bitrate estimators")
+    parser.add_argument("--sweep", help="sweep.py result file to replay")
+    parser.add_argument("--rates", help="headless.py --out float32 series to replay")
+    parser.add_argument("--duration", type=float, default=600.0, help="Synthetic trace length (s)")
+    parser.add_argument("--window", type=int, default=32000, help="Samples per estimate")
+    parser.add_argument("--samp-rate", type=int, default=32000)
+    parser.add_argument("--samples", type=int, default=4000,
+                        help="Synthesized samples per window (fewer = faster, noisier estimates)")
+    parser.add_argument("--horizon", type=float, default=2.0)
+    parser.add_argument("--z", type=float, default=1.0)
+    parser.add_argument("--meas-std-db", type=float, default=0.2)
+    parser.add_argument("--snr-max-db", type=float, default=20.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    dt = args.window / args.samp_rate
+    if args.sweep:
+        data = np.load(args.sweep)
+        runs = np.unique(data["run_id"])
+        series = [data["rate"][data["run_id"] == r] for r in runs]
+        length = min(len(s) for s in series)
+        sets = [(f"{args.sweep} ({len(runs)} runs)", np.stack([noise_from_rates(s[:length]) for s in series]))]
+    elif args.rates:
+        sets = [(args.rates, noise_from_rates(np.fromfile(args.rates, dtype=np.float32))[None, :])]
+    else:
+        sets = [(name, synthetic(name, args.duration, dt, args.seed)[None, :]) for name in CHANNELS]
+
+    capacity = CapacityModel(RATE_MIN, RATE_MAX, args.snr_max_db)
+    for name, amps in sets:
+        m2, snr = measure(amps, args.samples, args.seed)
+        truth = capacity.rate(-20 * np.log10(amps))
+        print(f"\n{name}: {amps.shape[0]} x {amps.shape[1]} windows of {dt:g} s, "
+              f"capacity {truth.min() / 1e6:.1f}-{truth.max() / 1e6:.1f} Mbps")
+        print(f"{'estimator':>26} {'MAE now':>8} {'MAE +h':>8} {'over %':>7} {'changes/min':>11}")
+        for label, fn in estimators(args.horizon, args.z, args.meas_std_db, capacity):
+            r = evaluate(fn(m2, snr, dt), truth, dt, args.horizon)
+            print(f"{label:>26} {r['mae_now'] / 1e6:>8.2f} {r['mae_ahead'] / 1e6:>8.2f} "
+                  f"{r['over_pct']:>7.1f} {r['changes_per_min']:>11.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
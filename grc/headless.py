@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Headless, faster-than-real-time version of the `default` flowgraph.
+
+No Qt is imported. The noise_amp slider is replaced by a schedule of
+channel settings in simulated seconds, the throttle can be removed or
+scaled, and the bitrate series goes to a float32 file and/or a ZMQ PUB
+endpoint (same [BITRATE, float32] frames as the GUI flowgraph).
+
+    python3 headless.py --duration 3600 --throttle 0 --out rates.f32 \\
+        --schedule "0:noise=0 600:noise=0.5,fd=10 1800:noise=0.2"
+
+Schedule entries are `<t>:<key>=<value>[,<key>=<value>...]` where key is
+one of noise (noise_amp), fd (Doppler frequency) or k (Rician K factor).
+Settings take effect with buffer granularity (a few thousand samples).
+"""
+import sys
+import time
+from argparse import ArgumentParser
+
+import numpy as np
+from gnuradio import blocks
+from gnuradio import channels
+from gnuradio import digital
+from gnuradio import gr
+from gnuradio import zeromq
+
+import default_epy_block_0 as linear_legacy
+import default_epy_block_1 as linear_decim
+import predictive_calc
+import throughput_calc_decim as threshold_decim
+
+ESTIMATORS = {
+    'linear': linear_decim.blk,
+    'legacy': linear_legacy.blk,
+    'threshold': threshold_decim.blk,
+    'predictive': predictive_calc.blk,
+}
+
+SCHEDULE_KEYS = {
+    'noise': 'set_noise_amp',
+    'fd': 'set_doppler_freq',
+    'k': 'set_K',
+}
+
+
+def parse_schedule(text):
+    """'0:noise=0 60:noise=0.5,fd=5' -> [(0.0, {'noise': 0.0}), (60.0, {...})]"""
+    events = []
+    for entry in text.split():
+        t, _, settings = entry.partition(':')
+        values = {}
+        for item in settings.split(','):
+            key, _, value = item.partition('=')
+            if key not in SCHEDULE_KEYS or not value:
+                raise ValueError(f"Bad schedule entry {entry!r} (keys: {', '.join(SCHEDULE_KEYS)})")
+            values[key] = float(value)
+        events.append((float(t), values))
+    return sorted(events, key=lambda e: e[0])
+
+
+class schedule_tap(gr.sync_block):
+    """Sink that counts samples and applies channel settings when their time comes."""
+
+    def __init__(self, events, samp_rate, channel):
+        gr.sync_block.__init__(self,
+            name="Channel Schedule",
+            in_sig=[np.complex64],
+            out_sig=None)
+        self.events = [(int(t * samp_rate), values) for t, values in events]
+        self.channel = channel
+        self.next_idx = 0
+
+    def work(self, input_items, output_items):
+        n = len(input_items[0])
+        end = self.nitems_read(0) + n
+        while self.next_idx < len(self.events) and self.events[self.next_idx][0] < end:
+            for key, value in self.events[self.next_idx][1].items():
+                getattr(self.channel, SCHEDULE_KEYS[key])(value)
+            self.next_idx += 1
+        return n
+
+
+class headless(gr.top_block):
+    """
+    Args:
+        schedule: List of (t_seconds, {key: value}) from parse_schedule()
+        duration: Simulated seconds to run
+        throttle: Complex samples per second after the modulator, as a multiple
+            of samp_rate: 1 = real time (0 = run at full CPU speed)
+        estimator: 'linear', 'threshold' or 'predictive' (decimating estimator blocks),
+            or 'legacy' (full-rate Linear Bitrate Calc thinned by keep_one_in_n)
+        est_params: Attribute overrides for the estimator, e.g. {'pwr_min': 0.4}
+        window: Samples per bitrate estimate
+        delays, mags: Multipath tap delays (samples) and magnitudes
+        seed: Seed for the bit source and the channel model
+        out_path: Write the bitrate series as raw float32 to this file
+        zmq_address: Publish the bitrate series on this ZMQ PUB endpoint
+        collect: Keep the series in memory (see rates())
+    """
+
+    def __init__(self, schedule=(), duration=60.0, samp_rate=32000, throttle=0.0,
+                 estimator='linear', est_params=None, window=32000,
+                 delays=(0.0, 0.1, 0.3), mags=(1.0, 0.99, 1.0), seed=42,
+                 out_path=None, zmq_address=None, collect=False):
+        gr.top_block.__init__(self, "Headless adaptive bitrate", catch_exceptions=True)
+
+        self.samp_rate = samp_rate
+        self.window = window
+        self.qpsk = digital.constellation_calcdist([-1-1j, -1+1j, 1+1j, 1-1j], [0, 1, 3, 2],
+            4, 1, digital.constellation.AMPLITUDE_NORMALIZATION).base()
+        self.qpsk.set_npwr(1.0)
+
+        # Initial channel state comes from the t=0 schedule entries
+        initial = {'noise': 0.0, 'fd': 0.0, 'k': 4.0}
+        for t, values in schedule:
+            if t <= 0:
+                initial.update(values)
+
+        ##################################################
+        # Blocks
+        ##################################################
+        self.digital_glfsr_source_x_0 = digital.glfsr_source_b(16, True, 0, max(1, seed & 0xffff))
+        self.digital_constellation_modulator_0 = digital.generic_mod(
+            constellation=self.qpsk,
+            differential=True,
+            samples_per_symbol=2,
+            pre_diff_code=True,
+            excess_bw=0.35,
+            verbose=False,
+            log=False,
+            truncate=False)
+        self.blocks_head_0 = blocks.head(gr.sizeof_gr_complex, int(duration * samp_rate))
+        self.channels_dynamic_channel_model_0 = channels.dynamic_channel_model(
+            samp_rate,
+            0.01,
+            1e3,
+            0.01,
+            1e3,
+            8,
+            initial['fd'],
+            False,
+            initial['k'],
+            list(delays),
+            list(mags),
+            1,
+            initial['noise'],
+            seed)
+        self.schedule_tap_0 = schedule_tap(
+            [(t, v) for t, v in schedule if t > 0], samp_rate, self.channels_dynamic_channel_model_0)
+
+        # The estimator choice lives here: default.py is generated from adaptive_bitrate.grc,
+        # which wires only the decimating linear estimator
+        if estimator == 'predictive':
+            self.estimator_0 = ESTIMATORS[estimator](window=window, samp_rate=samp_rate)
+        elif estimator == 'legacy':
+            self.estimator_0 = ESTIMATORS[estimator](alpha=0.1)
+        else:
+            self.estimator_0 = ESTIMATORS[estimator](window=window)
+        for name, value in (est_params or {}).items():
+            if not hasattr(self.estimator_0, name):
+                raise ValueError(f"Estimator {estimator!r} has no parameter {name!r}")
+            setattr(self.estimator_0, name, value)
+
+        ##################################################
+        # Connections
+        ##################################################
+        self.connect((self.digital_glfsr_source_x_0, 0), (self.digital_constellation_modulator_0, 0))
+        if throttle > 0:
+            # On the complex stream: QPSK at 2 samples/symbol makes 8 samples per source byte
+            self.blocks_throttle2_0 = blocks.throttle(gr.sizeof_gr_complex*1, samp_rate * throttle, True)
+            self.connect((self.digital_constellation_modulator_0, 0), (self.blocks_throttle2_0, 0))
+            self.connect((self.blocks_throttle2_0, 0), (self.blocks_head_0, 0))
+        else:
+            self.connect((self.digital_constellation_modulator_0, 0), (self.blocks_head_0, 0))
+        self.connect((self.blocks_head_0, 0), (self.channels_dynamic_channel_model_0, 0))
+        self.connect((self.blocks_head_0, 0), (self.schedule_tap_0, 0))
+        self.connect((self.channels_dynamic_channel_model_0, 0), (self.estimator_0, 0))
+        rates = self.estimator_0
+        if estimator == 'legacy':
+            self.blocks_keep_one_in_n_0 = blocks.keep_one_in_n(gr.sizeof_float*1, window)
+            self.connect((self.estimator_0, 0), (self.blocks_keep_one_in_n_0, 0))
+            rates = self.blocks_keep_one_in_n_0
+
+        self.blocks_vector_sink_0 = None
+        if collect:
+            self.blocks_vector_sink_0 = blocks.vector_sink_f(1, 1024)
+            self.connect((rates, 0), (self.blocks_vector_sink_0, 0))
+        if out_path:
+            self.blocks_file_sink_0 = blocks.file_sink(gr.sizeof_float*1, out_path, False)
+            self.blocks_file_sink_0.set_unbuffered(False)
+            self.connect((rates, 0), (self.blocks_file_sink_0, 0))
+        if zmq_address:
+            self.zeromq_pub_sink_0 = zeromq.pub_sink(gr.sizeof_float, 1, zmq_address, 100, False, (-1), 'BITRATE', True, True)
+            self.connect((rates, 0), (self.zeromq_pub_sink_0, 0))
+        if not (collect or out_path or zmq_address):
+            self.blocks_null_sink_0 = blocks.null_sink(gr.sizeof_float*1)
+            self.connect((rates, 0), (self.blocks_null_sink_0, 0))
+
+    def rates(self):
+        """(t_seconds, rate_bps) arrays collected when collect=True."""
+        rates = np.array(self.blocks_vector_sink_0.data(), dtype=np.float32)
+        t = (np.arange(len(rates)) + 1) * (self.window / self.samp_rate)
+        return t, rates
+
+
+def argument_parser():
+    parser = ArgumentParser(description="Run the adaptive bitrate flowgraph without a GUI")
+    parser.add_argument("--duration", type=float, default=60.0, help="Simulated seconds [default=%(default)r]")
+    parser.add_argument("--schedule", default="0:noise=0", help="Channel schedule [default=%(default)r]")
+    parser.add_argument("--throttle", type=float, default=0.0,
+                        help="Run at N x real time (complex samples at N x samp_rate), 0 = unthrottled "
+                             "[default=%(default)r]")
+    parser.add_argument("--estimator", choices=sorted(ESTIMATORS), default='linear')
+    parser.add_argument("--param", action='append', default=[], metavar="NAME=VALUE",
+                        help="Estimator parameter override, e.g. --param pwr_min=0.4")
+    parser.add_argument("--window", type=int, default=32000, help="Samples per estimate [default=%(default)r]")
+    parser.add_argument("--samp-rate", type=int, default=32000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", help="Write bitrate series as raw float32 to this file")
+    parser.add_argument("--zmq", help="Publish bitrate series on this ZMQ endpoint, e.g. tcp://127.0.0.1:5555")
+    return parser
+
+
+def main(options=None):
+    if options is None:
+        options = argument_parser().parse_args()
+
+    try:
+        schedule = parse_schedule(options.schedule)
+        est_params = {}
+        for item in options.param:
+            name, _, value = item.partition('=')
+            est_params[name] = float(value)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+
+    tb = headless(schedule=schedule, duration=options.duration, samp_rate=options.samp_rate,
+                  throttle=options.throttle, estimator=options.estimator, est_params=est_params,
+                  window=options.window, seed=options.seed, out_path=options.out,
+                  zmq_address=options.zmq)
+
+    start = time.perf_counter()
+    tb.run()
+    wall = time.perf_counter() - start
+    print(f"\nSimulated {options.duration:.0f} s in {wall:.1f} s ({options.duration / wall:.1f}x real time)",
+          file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,96 @@
+import time
+import numpy as np
+import pmt
+from gnuradio import gr
+from power_kernel import PowerKernel, RateLimitedLog
+from capacity_kalman import CapacityModel, PredictiveEstimator
+import block_metrics
+
+class blk(gr.decim_block):
+    def __init__(self, window=32000, samp_rate=32000, horizon=2.0, z=1.0, meas_std_db=0.2,
+                 snr_max_db=20.0, stride=1):
+        """
+        Predictive bitrate estimator, decimating like Decimating Bitrate Calc.
+
+        Tracks signal and noise power (M2M4 per window) with Kalman filters,
+        maps the SNR forecast `horizon` seconds ahead to a Shannon-style
+        capacity and emits its lower confidence bound, one rate per window.
+        Each output item is tagged with `forecast` (mean rate at the horizon,
+        bps) and `snr_std` (forecast uncertainty, dB).
+
+        Args:
+            window: Input samples per estimate (= decimation)
+            samp_rate: Sample rate, for the window duration
+            horizon: Forecast horizon in seconds
+            z: Confidence multiplier (rate = forecast SNR - z sigma)
+            meas_std_db: Measurement noise of one window's S/N estimate (dB)
+            snr_max_db: SNR at which the maximum rate (10 Mbps) is reached
+            stride: Estimate from every stride-th sample (1 = all)
+        """
+        gr.decim_block.__init__(self,
+            name="Predictive Bitrate Calc",
+            in_sig=[np.complex64],
+            out_sig=[np.float32],
+            decim=int(window))
+
+        self.window = int(window)
+        self.dt = self.window / float(samp_rate)
+        self.rate_max = 10000000.0 # 10 Mbps
+        self.rate_min = 1000000.0  # 1 Mbps
+        self.estimator = PredictiveEstimator(
+            horizon=horizon, z=z, meas_std_db=meas_std_db,
+            capacity=CapacityModel(self.rate_min, self.rate_max, snr_max_db))
+
+        self.kernel = PowerKernel(stride=stride)
+        self.log = RateLimitedLog(interval=1.0)
+        self.forecast_key = pmt.intern("forecast")
+        self.std_key = pmt.intern("snr_std")
+        self.metrics = block_metrics.register("predictive")
+
+    # Tunables live on the estimator; exposed here for headless/sweep overrides
+    @property
+    def horizon(self):
+        return self.estimator.horizon
+
+    @horizon.setter
+    def horizon(self, value):
+        self.estimator.horizon = value
+
+    @property
+    def z(self):
+        return self.estimator.z
+
+    @z.setter
+    def z(self, value):
+        self.estimator.z = value
+
+    @property
+    def meas_std_db(self):
+        return self.estimator.meas_var ** 0.5
+
+    @meas_std_db.setter
+    def meas_std_db(self, value):
+        self.estimator.meas_var = value ** 2
+
+    def work(self, input_items, output_items):
+        n_out = len(output_items[0])
+        if n_out == 0: return 0
+        start = time.perf_counter()
+
+        in0 = input_items[0]
+        out = output_items[0]
+        for i in range(n_out):
+            m2, snr = self.kernel.m2m4(in0[i * self.window:(i + 1) * self.window])
+            rate, forecast, std_db = self.estimator.update(m2, snr, self.dt)
+            out[i] = rate[0]
+
+            offset = self.nitems_written(0) + i
+            self.add_item_tag(0, offset, self.forecast_key, pmt.from_double(float(forecast[0])))
+            self.add_item_tag(0, offset, self.std_key, pmt.from_double(float(std_db[0])))
+
+        if self.log.due():
+            print(f"RATE: {out[n_out - 1]/1e6:.1f} Mbps | FORECAST: {forecast[0]/1e6:.1f} Mbps "
+                  f"(+/- {std_db[0]:.1f} dB SNR)", end='\r')
+
+        self.metrics.record(n_out * self.window, n_out, time.perf_counter() - start, float(out[n_out - 1]))
+        return n_out
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Parallel parameter sweep over estimator settings and channel conditions.
+
+Every point of the grid is one independent headless run (see headless.py)
+executed in a process pool. The bitrate series of all runs and a per-run
+summary table are written to one columnar .npz file.
+
+    python3 sweep.py --duration 600 --jobs 8 --repeats 3 --out sweep.npz \\
+        --grid noise=0,0.25,0.5,0.75 --grid fd=0,10 \\
+        --grid alpha=0.05,0.1,0.2 --grid pwr_min=0.2,0.3
+
+Grid keys:
+    channel:    noise, fd, k, profile (multipath tap set, see PROFILES)
+    estimator:  any attribute of the chosen estimator block, e.g.
+                alpha, pwr_min, pwr_max (linear) or
+                alpha, high_thresh, low_thresh (threshold) or
+                horizon, z, meas_std_db (predictive)
+
+A run is fully determined by its parameters and seed, both stored in the
+result file, so any row can be re-run with run_scenario().
+"""
+import contextlib
+import itertools
+import multiprocessing
+import os
+import sys
+import time
+from argparse import ArgumentParser
+
+import numpy as np
+
+CHANNEL_KEYS = ('noise', 'fd', 'k', 'profile')
+
+# Multipath tap profiles: (delays in samples, magnitudes)
+PROFILES = {
+    '3tap': ((0.0, 0.1, 0.3), (1.0, 0.99, 1.0)),  # default.py setting
+    'flat': ((0.0,), (1.0,)),
+    '5tap': ((0.0, 0.5, 1.1, 2.3, 3.7), (1.0, 0.7, 0.5, 0.3, 0.1)),
+}
+
+
+def expand_grid(grid, repeats=1, base_seed=1):
+    """{'noise': [0, .5], 'alpha': [.1]} x repeats -> list of scenario dicts."""
+    keys = sorted(grid)
+    scenarios = []
+    for values in itertools.product(*(grid[k] for k in keys)):
+        for rep in range(repeats):
+            scenario = dict(zip(keys, values))
+            scenario['seed'] = base_seed + len(scenarios)
+            scenarios.append(scenario)
+    return scenarios
+
+
+def summarize(rates, dt):
+    """Mean rate, number of rate changes and seconds spent at each level."""
+    if len(rates) == 0:
+        return {'mean_rate': 0.0, 'n_changes': 0, 'levels': {}}
+    levels, counts = np.unique(rates, return_counts=True)
+    return {
+        'mean_rate': float(rates.mean()),
+        'n_changes': int(np.count_nonzero(np.diff(rates))),
+        'levels': dict(zip(levels.tolist(), (counts * dt).tolist())),
+    }
+
+
+def run_scenario(scenario, duration=60.0, estimator='linear', window=32000, samp_rate=32000):
+    """Run one scenario in this process; returns (t, rates) arrays."""
+    from headless import headless  # Imported here so the pool workers load GNU Radio themselves
+
+    channel = {k: float(scenario[k]) for k in ('noise', 'fd', 'k') if k in scenario}
+    delays, mags = PROFILES[scenario.get('profile', '3tap')]
+    est_params = {k: float(v) for k, v in scenario.items() if k not in CHANNEL_KEYS + ('seed',)}
+
+    tb = headless(schedule=[(0.0, channel)], duration=duration, samp_rate=samp_rate,
+                  estimator=estimator, est_params=est_params, window=window,
+                  delays=delays, mags=mags, seed=int(scenario['seed']), collect=True)
+    # Estimator status lines would interleave across workers
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        tb.run()
+    return tb.rates()
+
+
+def _worker(job):
+    run_id, scenario, kwargs = job
+    start = time.perf_counter()
+    t, rates = run_scenario(scenario, **kwargs)
+    return run_id, t, rates, time.perf_counter() - start
+
+
+def run_sweep(scenarios, jobs=None, **kwargs):
+    """Fan scenarios out over a process pool; yields results as they finish."""
+    # spawn: never fork a process that may already hold GNU Radio threads
+    ctx = multiprocessing.get_context('spawn')
+    # Short-lived workers would all race for the block metrics port (block_metrics.py)
+    os.environ.setdefault("SDR_BLOCK_METRICS_PORT", "0")
+    work = [(i, s, kwargs) for i, s in enumerate(scenarios)]
+    with ctx.Pool(processes=jobs) as pool:
+        for result in pool.imap_unordered(_worker, work):
+            yield result
+
+
+def save_results(path, scenarios, results, dt):
+    """
+    Columnar layout:
+        run_id, t, rate                  one row per bitrate sample
+        runs_<column>                    one row per run (params, seed, metrics)
+        level_run_id, level, level_time  seconds each run spent at each rate
+    """
+    results = sorted(results, key=lambda r: r[0])
+    columns = {
+        'run_id': np.concatenate([np.full(len(r[2]), r[0], dtype=np.int32) for r in results]),
+        't': np.concatenate([r[1] for r in results]),
+        'rate': np.concatenate([r[2] for r in results]),
+    }
+
+    param_keys = sorted({k for s in scenarios for k in s})
+    runs = {k: [] for k in ['run_id'] + param_keys + ['mean_rate', 'n_changes', 'wall_s']}
+    level_cols = {'level_run_id': [], 'level': [], 'level_time': []}
+    for run_id, t, rates, wall in results:
+        scenario, metrics = scenarios[run_id], summarize(rates, dt)
+        runs['run_id'].append(run_id)
+        for k in param_keys:
+            runs[k].append(scenario.get(k, np.nan if k != 'profile' else ''))
+        runs['mean_rate'].append(metrics['mean_rate'])
+        runs['n_changes'].append(metrics['n_changes'])
+        runs['wall_s'].append(wall)
+        for level, seconds in metrics['levels'].items():
+            level_cols['level_run_id'].append(run_id)
+            level_cols['level'].append(level)
+            level_cols['level_time'].append(seconds)
+
+    columns.update({f'runs_{k}': np.asarray(v) for k, v in runs.items()})
+    columns.update({k: np.asarray(v) for k, v in level_cols.items()})
+    np.savez_compressed(path, **columns)
+    return runs
+
+
+def parse_grid(items):
+    grid = {}
+    for item in items:
+        key, _, values = item.partition('=')
+        if not values:
+            raise ValueError(f"Bad --grid {item!r}, expected key=v1,v2,...")
+        if key == 'profile':
+            unknown = set(values.split(',')) - set(PROFILES)
+            if unknown:
+                raise ValueError(f"Unknown profile(s) {sorted(unknown)}; known: {sorted(PROFILES)}")
+            grid[key] = values.split(',')
+        else:
+            grid[key] = [float(v) for v in values.split(',')]
+    return grid
+
+
+def argument_parser():
+    parser = ArgumentParser(description="Parallel estimator/channel parameter sweep")
+    parser.add_argument("--grid", action='append', default=[], metavar="KEY=V1,V2,...")
+    parser.add_argument("--estimator", choices=['linear', 'threshold', 'predictive'], default='linear')
+    parser.add_argument("--duration", type=float, default=60.0, help="Simulated seconds per run")
+    parser.add_argument("--window", type=int, default=32000)
+    parser.add_argument("--repeats", type=int, default=1, help="Runs per grid point (different seeds)")
+    parser.add_argument("--seed", type=int, default=1, help="Seed of the first run")
+    parser.add_argument("--jobs", type=int, default=None, help="Worker processes [default: CPU count]")
+    parser.add_argument("--out", default="sweep.npz")
+    return parser
+
+
+def main(options=None):
+    if options is None:
+        options = argument_parser().parse_args()
+    try:
+        grid = parse_grid(options.grid)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+
+    samp_rate = 32000
+    scenarios = expand_grid(grid, options.repeats, options.seed)
+    print(f"{len(scenarios)} runs x {options.duration:.0f} s simulated, estimator={options.estimator}")
+
+    start = time.perf_counter()
+    results = []
+    for result in run_sweep(scenarios, jobs=options.jobs, duration=options.duration,
+                            estimator=options.estimator, window=options.window, samp_rate=samp_rate):
+        results.append(result)
+        print(f"  [{len(results)}/{len(scenarios)}] run {result[0]} done in {result[3]:.1f} s", end='\r')
+
+    runs = save_results(options.out, scenarios, results, options.window / samp_rate)
+    print(f"\nSweep finished in {time.perf_counter() - start:.1f} s -> {options.out}")
+
+    keys = sorted(grid) + ['seed']
+    print("  ".join(f"{k:>10}" for k in keys) + f"  {'mean Mbps':>10}  {'changes':>8}")
+    for i in range(len(runs['run_id'])):
+        params = "  ".join(f"{str(runs[k][i]):>10}" for k in keys)
+        print(f"{params}  {runs['mean_rate'][i] / 1e6:>10.2f}  {runs['n_changes'][i]:>8}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,8 +1,11 @@
+import time
 import numpy as np
 from gnuradio import gr
+import block_metrics
+from power_kernel import PowerKernel, RateLimitedLog
 
 class blk(gr.sync_block):
-    def __init__(self, high_thresh=1.5, low_thresh=1.2, alpha=0.05):
+    def __init__(self, high_thresh=1.5, low_thresh=1.2, alpha=0.05, stride=1):
         """
         Adaptive bitrate based on received signal power.
         
@@ -10,6 +13,7 @@ class blk(gr.sync_block):
             high_thresh: Power threshold to switch to low bitrate (1 Mbps)
             low_thresh: Power threshold to switch to high bitrate (5 Mbps)
             alpha: Smoothing factor (0-1, lower = smoother)
+            stride: Estimate power from every stride-th sample (1 = all)
         
         Expected power ranges:
         - Clean signal (noise=0): ~1.0
@@ -30,6 +34,10 @@ class blk(gr.sync_block):
         
         self.init_samples = 0
         self.init_period = 100  # Calibration period
+
+        self.kernel = PowerKernel(stride=stride)
+        self.log = RateLimitedLog(interval=1.0)
+        self.metrics = block_metrics.register("threshold")
         
         print(f"\n=== Adaptive Bitrate Block ===")
         print(f"High threshold: {high_thresh} (drop to 1 Mbps)")
@@ -40,9 +48,10 @@ class blk(gr.sync_block):
     def work(self, input_items, output_items):
         if len(input_items[0]) == 0:
             return 0
+        start = time.perf_counter()
         
         # Calculate instantaneous power
-        inst_power = np.mean(np.abs(input_items[0])**2)
+        inst_power = self.kernel.power(input_items[0])
         
         # Initialize or smooth
         if self.init_samples < self.init_period:
@@ -70,14 +79,18 @@ class blk(gr.sync_block):
             direction = "↓" if self.last_rate < old_rate else "↑"
             print(f"\n{direction} RATE CHANGE: {rate_mbps:.1f} Mbps (Power: {self.avg_power:.3f})")
         
-        # Periodic status (every ~1 second at 32kHz sample rate)
-        if self.init_samples % 32000 == 0:
+        # Periodic status (at most once per second, SNR only computed here)
+        if self.log.due():
             rate_mbps = self.last_rate / 1e6
             status = "HIGH" if self.avg_power > self.high_thresh else "LOW" if self.avg_power < self.low_thresh else "MID"
-            print(f"Power: {self.avg_power:.3f} [{status}] | Bitrate: {rate_mbps:.1f} Mbps", end='\r')
+            _, snr = self.kernel.m2m4(input_items[0])
+            snr_db = 10 * np.log10(snr) if 0 < snr < np.inf else float('nan')
+            print(f"Power: {self.avg_power:.3f} [{status}] | SNR: {snr_db:.1f} dB | Bitrate: {rate_mbps:.1f} Mbps", end='\r')
         
         self.init_samples += len(input_items[0])
         
         # Output constant rate for all samples
         output_items[0][:] = self.last_rate
-        return len(output_items[0])
\ No newline at end of file
+        n_out = len(output_items[0])
+        self.metrics.record(len(input_items[0]), n_out, time.perf_counter() - start, self.last_rate)
+        return n_out
\ No newline at end of file
@@ -0,0 +1,69 @@
+import time
+import numpy as np
+from gnuradio import gr
+import block_metrics
+from power_kernel import PowerKernel
+
+class blk(gr.decim_block):
+    def __init__(self, high_thresh=1.5, low_thresh=1.2, alpha=0.05, window=32000, stride=1):
+        """
+        Decimating version of the Adaptive Bitrate Calculator.
+
+        Same hysteresis thresholds, but produces one rate per `window`
+        input samples instead of a full-rate float stream.
+
+        Args:
+            high_thresh: Power threshold to switch to low bitrate (1 Mbps)
+            low_thresh: Power threshold to switch to high bitrate (5 Mbps)
+            alpha: Smoothing factor (0-1, lower = smoother), applied per window
+            window: Input samples per power estimate (= decimation)
+            stride: Estimate power from every stride-th sample (1 = all)
+        """
+        gr.decim_block.__init__(self,
+            name="Decimating Adaptive Bitrate Calculator",
+            in_sig=[np.complex64],
+            out_sig=[np.float32],
+            decim=int(window))
+
+        self.high_thresh = high_thresh
+        self.low_thresh = low_thresh
+        self.alpha = alpha
+        self.window = int(window)
+        self.kernel = PowerKernel(stride=stride)
+
+        self.avg_power = None       # Seeded by the first window
+        self.last_rate = 5000000.0  # Start at 5 Mbps
+        self.metrics = block_metrics.register("threshold_decim")
+
+    def work(self, input_items, output_items):
+        n_out = len(output_items[0])
+        if n_out == 0:
+            return 0
+        start = time.perf_counter()
+
+        in0 = input_items[0]
+        out = output_items[0]
+        for i in range(n_out):
+            # Power of this window (allocation-free, see power_kernel.py)
+            power = self.kernel.power(in0[i * self.window:(i + 1) * self.window])
+
+            if self.avg_power is None:
+                self.avg_power = power
+            else:
+                self.avg_power = (self.alpha * power) + ((1 - self.alpha) * self.avg_power)
+
+            old_rate = self.last_rate
+            if self.avg_power > self.high_thresh:
+                self.last_rate = 1000000.0  # Channel degraded: 1 Mbps
+            elif self.avg_power < self.low_thresh:
+                self.last_rate = 5000000.0  # Channel improved: 5 Mbps
+            # Between thresholds: keep current rate (hysteresis)
+
+            if old_rate != self.last_rate:
+                direction = "↓" if self.last_rate < old_rate else "↑"
+                print(f"\n{direction} RATE CHANGE: {self.last_rate / 1e6:.1f} Mbps (Power: {self.avg_power:.3f})")
+
+            out[i] = self.last_rate
+
+        self.metrics.record(n_out * self.window, n_out, time.perf_counter() - start, self.last_rate)
+        return n_out
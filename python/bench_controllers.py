@@ -0,0 +1,279 @@
+"""
+Cross-controller telemetry-to-enforcement benchmark and conformance check.
+
+Starts one controller (qos_app.py under OS-Ken, pox_controller.py under
+POX, or the Java SDRListener) against a stand-in telemetry publisher and a
+fake `ovs-vsctl` placed first on PATH. The fake appends a timestamp and
+its arguments to a log for every invocation and succeeds, so no Open
+vSwitch or Mininet is involved and runs are repeatable offline.
+
+Every scripted sample carries a distinct rate, so each
+`ingress_policing_rate=<kbps>` seen by the fake identifies the telemetry
+sample it enforces. Reported per scenario:
+
+    latency p50/p99  telemetry send -> ovs-vsctl invocation for that rate
+    commands         ovs-vsctl invocations (Java issues two per update)
+    skipped          samples never enforced (coalesced or held by policy)
+    missed           checkpoint samples never enforced: the last sample of
+                     a burst or a step must always land (with --policy
+                     default the controller's rate policy may hold them)
+    out of order     enforcements of a sample older than one already enforced
+
+Telemetry goes out as GRC float32 frames, which all three controllers
+parse. The publisher binds the controllers' fixed tcp://127.0.0.1:5555 as
+an XPUB and waits for the controller's subscription before sending.
+
+    python bench_controllers.py qos
+    python bench_controllers.py pox --pox-dir ~/pox
+    python bench_controllers.py java --repeat 3 --scenario steps
+    python bench_controllers.py qos --policy default   # keep the controller's rate policy
+"""
+import os
+import shutil
+import signal
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+
+import zmq
+
+from latency import LatencyStats
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+TELEMETRY_ENDPOINT = "tcp://127.0.0.1:5555"
+
+FAKE_VSCTL = """#!/bin/bash
+# Stand-in ovs-vsctl: log "<epoch seconds> <args>" and succeed
+ts=${EPOCHREALTIME:-$(date +%s.%N)}
+echo "${ts/,/.} $*" >> "$SDR_FAKE_VSCTL_LOG"
+"""
+
+
+###########################################################################
+# Scenarios
+###########################################################################
+
+def steps(n=20, gap=0.5):
+    """One new rate every `gap` seconds: every sample must be enforced."""
+    return [(gap, 2000 + 250 * (i % 10) + i, True) for i in range(n)]
+
+
+def bursts(n=5, size=50, spacing=0.001, pause=1.5):
+    """Bursts of fast samples: the newest of each burst must land, in order."""
+    script = []
+    for b in range(n):
+        for i in range(size):
+            script.append((pause if i == 0 else spacing, 1000 + 100 * b + i, i == size - 1))
+    return script
+
+
+def flapping(n=20, gap=0.3):
+    """Rate alternating between a high and a low level."""
+    return [(gap, (6000 if i % 2 else 2000) + i, True) for i in range(n)]
+
+
+SCENARIOS = {"steps": steps, "bursts": bursts, "flapping": flapping}
+
+
+###########################################################################
+# Controllers
+###########################################################################
+
+def controller_command(name, args):
+    """(argv, extra env) to start controller `name` with the vsctl backend."""
+    exact = args.policy == "exact"
+    if name == "qos":
+        manager = shutil.which("osken-manager") or "osken-manager"
+        env = {"SDR_QOS_BACKEND": "vsctl", "SDR_FEEDBACK": "", "SDR_SNAPSHOT": ""}
+        if exact:
+            env["SDR_UP_DELAY"] = "0"
+        return [manager, "--ofp-tcp-listen-port", str(args.of_port), os.path.join(HERE, "qos_app.py")], env
+    if name == "pox":
+        argv = [sys.executable, os.path.join(args.pox_dir, "pox.py"), "pox_controller",
+                "--backend=vsctl", "--feedback="]
+        if exact:
+            argv.append("--up_delay=0")
+        argv += ["openflow.of_01", f"--port={args.of_port}"]
+        return argv, {"PYTHONPATH": HERE + os.pathsep + os.environ.get("PYTHONPATH", "")}
+    if name == "java":
+        # SDRListener applies every change of the kbps value; it has no policy options
+        return ["java", "-jar", args.jar], {}
+    raise ValueError(f"Unknown controller {name!r}")
+
+
+class Harness(object):
+    """
+    Args:
+        workdir: Directory for the fake ovs-vsctl and its log
+    """
+
+    def __init__(self, workdir):
+        self.bin = os.path.join(workdir, "bin")
+        os.makedirs(self.bin, exist_ok=True)
+        vsctl = os.path.join(self.bin, "ovs-vsctl")
+        with open(vsctl, "w") as f:
+            f.write(FAKE_VSCTL)
+        os.chmod(vsctl, 0o755)
+        self.log = os.path.join(workdir, "vsctl.log")
+        self.ctx = zmq.Context()
+        self.pub = self.ctx.socket(zmq.XPUB)
+        self.pub.bind(TELEMETRY_ENDPOINT)
+        self.proc = None
+
+    def start(self, argv, env, timeout=30.0):
+        open(self.log, "w").close()
+        full_env = dict(os.environ, **env)
+        full_env["PATH"] = self.bin + os.pathsep + full_env.get("PATH", "")
+        full_env["SDR_FAKE_VSCTL_LOG"] = self.log
+        self.proc = subprocess.Popen(argv, env=full_env, cwd=HERE, stdout=subprocess.DEVNULL,
+                                     stderr=subprocess.PIPE, start_new_session=True)
+        # XPUB hands us the subscription: the controller is listening from here on
+        poller = zmq.Poller()
+        poller.register(self.pub, zmq.POLLIN)
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.proc.poll() is not None:
+                raise RuntimeError(f"{argv[0]} exited ({self.proc.returncode}): "
+                                   f"{self.proc.stderr.read().decode(errors='replace')[-2000:]}")
+            if poller.poll(200) and self.pub.recv().startswith(b"\x01BITRATE"):
+                return
+        raise RuntimeError(f"No telemetry subscription from {argv[0]} within {timeout:.0f} s")
+
+    def stop(self):
+        if self.proc and self.proc.poll() is None:
+            os.killpg(self.proc.pid, signal.SIGTERM)
+            try:
+                self.proc.wait(5)
+            except subprocess.TimeoutExpired:
+                os.killpg(self.proc.pid, signal.SIGKILL)
+                self.proc.wait()
+        self.proc = None
+
+    def close(self):
+        self.stop()
+        self.pub.close(linger=0)
+        self.ctx.term()
+
+    def send(self, script):
+        """Publish a script of (gap, kbps, checkpoint); returns {kbps: send time}."""
+        sent = {}
+        next_at = time.time()
+        for gap, kbps, _ in script:
+            next_at += gap
+            delay = next_at - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            sent[kbps] = time.time()
+            self.pub.send_multipart([b"BITRATE", struct.pack("<f", kbps * 1000.0)])
+        return sent
+
+    def invocations(self):
+        """[(time, {column: value})] from the fake's log."""
+        calls = []
+        with open(self.log) as f:
+            for line in f:
+                ts, _, rest = line.partition(" ")
+                columns = dict(arg.split("=", 1) for arg in rest.split() if "=" in arg)
+                calls.append((float(ts), columns))
+        return calls
+
+
+def analyze(script, sent, calls):
+    order = {kbps: i for i, (_, kbps, _) in enumerate(script)}
+    latency = LatencyStats(window=max(len(script), 1))
+    enforced = {}
+    out_of_order = unknown = 0
+    newest = -1
+    for ts, columns in calls:
+        if "ingress_policing_rate" not in columns:
+            continue
+        kbps = int(columns["ingress_policing_rate"])
+        if kbps not in order:
+            unknown += 1
+            continue
+        if order[kbps] < newest:
+            out_of_order += 1
+        newest = max(newest, order[kbps])
+        if kbps not in enforced:
+            enforced[kbps] = ts
+            latency.record(max(ts - sent[kbps], 0.0))
+    checkpoints = [kbps for _, kbps, checkpoint in script if checkpoint]
+    return {
+        "sent": len(script),
+        "enforced": len(enforced),
+        "commands": len(calls),
+        "skipped": len(script) - len(enforced),
+        "missed": sum(kbps not in enforced for kbps in checkpoints),
+        "out_of_order": out_of_order,
+        "unknown": unknown,
+        "latency": latency,
+    }
+
+
+def run(name, args):
+    argv, env = controller_command(name, args)
+    workdir = tempfile.mkdtemp(prefix="sdr_bench_")
+    harness = Harness(workdir)
+    results = []
+    try:
+        for rep in range(args.repeat):
+            # A fresh controller per repetition: no state carries over
+            harness.start(argv, env)
+            time.sleep(args.warmup)
+            for scenario in args.scenario:
+                script = SCENARIOS[scenario]()
+                # Make rates unique across scenarios of one run
+                offset = 10000 * (1 + args.scenario.index(scenario))
+                script = [(gap, kbps + offset, cp) for gap, kbps, cp in script]
+                start = len(harness.invocations())
+                sent = harness.send(script)
+                time.sleep(args.settle)
+                results.append((scenario, rep, analyze(script, sent, harness.invocations()[start:])))
+            harness.stop()
+    finally:
+        harness.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def main():
+    parser = ArgumentParser(description="Telemetry-to-enforcement latency and conformance of the controllers")
+    parser.add_argument("controller", choices=["qos", "pox", "java"])
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="Scenario(s) to run [default: all]")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs, each with a fresh controller")
+    parser.add_argument("--policy", choices=["exact", "default"], default="exact",
+                        help="exact: every rate change is applied at once; default: controller settings")
+    parser.add_argument("--settle", type=float, default=2.0, help="Seconds to wait after a scenario")
+    parser.add_argument("--warmup", type=float, default=1.0, help="Seconds between subscribe and first sample")
+    parser.add_argument("--of-port", type=int, default=16653, help="OpenFlow port for the controller")
+    parser.add_argument("--pox-dir", default=os.path.expanduser("~/pox"), help="POX checkout (pox)")
+    parser.add_argument("--jar", default=os.path.join(HERE, "..", "java", "target", "sdr-controller-1.0-SNAPSHOT.jar"),
+                        help="SDRListener fat jar (java)")
+    args = parser.parse_args()
+    args.scenario = args.scenario or sorted(SCENARIOS)
+
+    try:
+        results = run(args.controller, args)
+    except (RuntimeError, OSError) as e:
+        print(f"{args.controller}: {e}", file=sys.stderr)
+        return 1
+
+    print(f"{'scenario':>9} {'run':>3} {'sent':>5} {'enforced':>8} {'commands':>8} {'skipped':>7} "
+          f"{'missed':>6} {'ooo':>4} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    failed = False
+    for scenario, rep, r in results:
+        s = r["latency"].summary()
+        print(f"{scenario:>9} {rep:>3} {r['sent']:>5} {r['enforced']:>8} {r['commands']:>8} {r['skipped']:>7} "
+              f"{r['missed']:>6} {r['out_of_order']:>4} {s['p50_ms']:>8.1f} {s['p99_ms']:>8.1f} {s['max_ms']:>8.1f}")
+        # A rate policy may hold samples back on purpose; order and identity still must hold
+        failed |= bool((r["missed"] and args.policy == "exact") or r["out_of_order"] or r["unknown"])
+    print("CONFORMANT" if not failed else "NOT CONFORMANT (missed, out-of-order or unexpected rates)")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+"""
+Memory and lookup benchmark for MAC learning tables with many hosts.
+
+Compares the original dict {mac: port} with MacTable (string keys) and
+MacTable(compact=True) (int keys): bytes per host, learn and lookup
+rates, and how a capacity-bounded table behaves under host churn.
+
+    python bench_mac_table.py --hosts 100000,1000000
+"""
+import sys
+import time
+import tracemalloc
+from argparse import ArgumentParser
+
+import numpy as np
+
+from mac_table import MacTable
+
+
+def make_raw(n, seed=0):
+    """n distinct 6-byte MACs as they appear in a frame header."""
+    rng = np.random.default_rng(seed)
+    values = np.unique(rng.integers(0, 1 << 46, n + n // 100 + 16))[:n]
+    rng.shuffle(values)
+    return [v.to_bytes(6, "big") for v in values.tolist()]
+
+
+def make_macs(n, seed=0):
+    return [raw.hex(":") for raw in make_raw(n, seed)]
+
+
+class DictTable(object):
+    """The original per-datapath dict, behind the MacTable interface."""
+
+    def __init__(self):
+        self.entries = {}
+
+    def learn(self, mac, port, now=None):
+        self.entries[mac] = port
+
+    def lookup(self, mac, now=None):
+        return self.entries.get(mac)
+
+    def __len__(self):
+        return len(self.entries)
+
+
+VARIANTS = {
+    "dict": lambda capacity: DictTable(),
+    "MacTable": lambda capacity: MacTable(capacity, max_age=600),
+    "MacTable compact": lambda capacity: MacTable(capacity, max_age=600, compact=True),
+}
+
+
+def measure(name, raw_macs, lookups):
+    """Learn from raw header bytes, so the key objects a table keeps are counted too."""
+    ports = [i % 48 + 1 for i in range(len(raw_macs))]
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    table = VARIANTS[name](len(raw_macs))
+    for raw, port in zip(raw_macs, ports):
+        table.learn(raw.hex(":"), port)
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    # Timed again without tracemalloc, which slows every allocation
+    table = VARIANTS[name](len(raw_macs))
+    start = time.perf_counter()
+    for raw, port in zip(raw_macs, ports):
+        table.learn(raw.hex(":"), port)
+    learn_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for mac in lookups:
+        table.lookup(mac)
+    lookup_s = time.perf_counter() - start
+    return size / len(raw_macs), len(raw_macs) / learn_s, len(lookups) / lookup_s
+
+
+def churn(capacity, n_hosts, compact=False):
+    """Learn n_hosts distinct MACs into a table bounded at `capacity`."""
+    table = MacTable(capacity, max_age=600, compact=compact)
+    macs = make_macs(n_hosts, seed=1)
+    start = time.perf_counter()
+    for i, mac in enumerate(macs):
+        table.learn(mac, i % 48 + 1)
+    elapsed = time.perf_counter() - start
+    # Evictions come in batches, so the table ends up to a batch below capacity
+    recent = all(table.lookup(mac) is not None for mac in macs[-len(table):])
+    return len(table), table.evictions, recent, n_hosts / elapsed
+
+
+def main():
+    parser = ArgumentParser(description="MAC table memory/lookup benchmark")
+    parser.add_argument("--hosts", default="100000,1000000")
+    parser.add_argument("--lookups", type=int, default=1000000)
+    parser.add_argument("--capacity", type=int, default=100000, help="Bound for the churn test")
+    args = parser.parse_args()
+
+    print(f"{'hosts':>9} {'table':>17} {'bytes/host':>11} {'learn/s':>11} {'lookup/s':>11}")
+    rng = np.random.default_rng(2)
+    for n in (int(h) for h in args.hosts.split(",")):
+        raw = make_raw(n)
+        # Half hits, half (almost surely) misses
+        hits = [raw[i].hex(":") for i in rng.integers(0, n, args.lookups // 2)]
+        lookups = hits + make_macs(args.lookups - len(hits), seed=3)
+        for name in VARIANTS:
+            per_host, learn_rate, lookup_rate = measure(name, raw, lookups)
+            print(f"{n:>9} {name:>17} {per_host:>11.0f} {learn_rate:>11.0f} {lookup_rate:>11.0f}")
+
+    n_churn = max(int(h) for h in args.hosts.split(","))
+    print(f"\nChurn: {n_churn} distinct hosts into capacity {args.capacity}")
+    for compact in (False, True):
+        size, evictions, recent, rate = churn(args.capacity, n_churn, compact)
+        print(f"  compact={compact!s:>5}: size={size} evictions={evictions} "
+              f"most recent {size} all present={recent} ({rate:.0f} learns/s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+"""
+Cost per hot-path event of the metrics layer (metrics.py).
+
+Each operation runs in a tight loop and the empty loop is subtracted, so
+the figures are what instrumenting one event adds. "timed observe" is the
+controllers' pattern: two perf_counter() calls around the work plus one
+histogram observation. The no-op method call is the interpreter's floor
+for any instrumented event and puts the figures in scale on a slow host.
+With --threads > 1 the same loop runs in several
+threads at once and the totals are checked, since accumulation is per
+thread and takes no lock; those figures include GIL hand-offs, so the
+--budget-ns check applies to the single-thread run only.
+
+    python bench_metrics.py
+    python bench_metrics.py --events 2000000 --threads 4
+"""
+import sys
+import threading
+import time
+from argparse import ArgumentParser
+
+from metrics import ControllerMetrics, Registry
+
+
+def loop_ns(fn, events):
+    """Mean ns per call of fn(i) over `events` calls."""
+    start = time.perf_counter()
+    fn(events)
+    return (time.perf_counter() - start) / events * 1e9
+
+
+def operations(metrics):
+    counter, histogram, gauge = metrics.zmq_messages, metrics.parse, metrics.registry.gauge("bench_gauge")
+    perf_counter = time.perf_counter
+
+    def empty(n):
+        for _ in range(n):
+            pass
+
+    def inc(n):
+        for _ in range(n):
+            counter.inc()
+
+    def set_gauge(n):
+        for i in range(n):
+            gauge.set(i)
+
+    def observe(n):
+        for i in range(n):
+            histogram.observe(i * 1e-9)
+
+    def timed(n):
+        for _ in range(n):
+            start = perf_counter()
+            histogram.observe(perf_counter() - start)
+
+    def timing_only(n):
+        for _ in range(n):
+            start = perf_counter()
+            perf_counter() - start
+
+    class Noop(object):
+        def call(self, value):
+            pass
+
+    def noop(n, call=Noop().call):
+        for i in range(n):
+            call(i)
+
+    return empty, [("counter inc", inc), ("gauge set", set_gauge), ("histogram observe", observe),
+                   ("timed observe", timed), ("  (perf_counter x2 alone)", timing_only),
+                   ("  (no-op method call)", noop)]
+
+
+def main():
+    parser = ArgumentParser(description="Per-event overhead of the controller metrics")
+    parser.add_argument("--events", type=int, default=1000000)
+    parser.add_argument("--threads", type=int, default=1)
+    parser.add_argument("--budget-ns", type=float, default=1000.0, help="Fail above this cost per event")
+    args = parser.parse_args()
+
+    metrics = ControllerMetrics(Registry(), "bench")
+    empty, ops = operations(metrics)
+    base = loop_ns(empty, args.events)
+    print(f"{args.events} events, {args.threads} thread(s), empty loop {base:.0f} ns subtracted")
+    print(f"{'operation':<28} {'ns/event':>9}")
+    over = []
+    for name, fn in ops:
+        if args.threads == 1:
+            cost = loop_ns(fn, args.events) - base
+        else:
+            # Wall time of all threads over all their events: includes GIL contention
+            threads = [threading.Thread(target=fn, args=(args.events,)) for _ in range(args.threads)]
+            start = time.perf_counter()
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            cost = (time.perf_counter() - start) / (args.events * args.threads) * 1e9 - base
+        print(f"{name:<28} {cost:>9.0f}")
+        if args.threads == 1 and not name.startswith(" ") and cost > args.budget_ns:
+            over.append(name)
+
+    # Per-thread cells must not lose increments
+    runs = 1 if args.threads == 1 else args.threads
+    expected_inc = args.events * runs
+    expected_obs = args.events * runs * 2  # observe and timed observe
+    ok = metrics.zmq_messages.value == expected_inc and metrics.parse.count == expected_obs
+    print(f"totals: counter {metrics.zmq_messages.value} (expected {expected_inc}), "
+          f"histogram {metrics.parse.count} (expected {expected_obs}) {'ok' if ok else 'MISMATCH'}")
+
+    start = time.perf_counter()
+    text = metrics.registry.expose()
+    print(f"scrape: {len(text)} bytes in {(time.perf_counter() - start) * 1e3:.2f} ms")
+    if over:
+        print(f"Over the {args.budget_ns:.0f} ns budget: {', '.join(over)}")
+    return 0 if ok and not over else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
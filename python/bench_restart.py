@@ -0,0 +1,218 @@
+"""
+Synthetic reconnect test: controller restart to steady state, cold vs warm.
+
+qos_app.py (meter backend) runs against fake switches whose flow tables
+are filled from the flow-mods the app sends. Host pairs exchange traffic
+until every pair is forwarded in the data plane and the app has enforced
+a telemetry rate; the state is snapshotted. Then the controller
+restarts: cold with empty tables (the original behaviour), warm from the
+snapshot. The switches reconnect with empty flow tables and the same
+traffic resumes.
+
+Restart-to-steady-state is app start-up (incl. snapshot load) + switch
+connect handling + every packet-in until no pair needs the controller,
+each packet-in also costing a switch <-> controller round trip (--rtt-ms).
+Floods and whether the last QoS rate was back on the switch before any
+new telemetry are reported as well.
+
+    python bench_restart.py --hosts 1000 --pairs 5000 --switches 2
+"""
+import os
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+
+import numpy as np
+
+os.environ["SDR_QOS_BACKEND"] = "meter"  # QoS goes through the fake switches, not OVSDB
+os.environ.setdefault("SDR_FEEDBACK", "")  # Several apps per process; nothing listens
+os.environ.setdefault("SDR_METRICS_PORT", "0")
+import qos_app
+import snapshot
+from fake_datapath import FakeDatapath
+from mac_table import MacTables
+from links import single_link
+from os_ken.controller import ofp_event
+from os_ken.lib import hub
+
+BROADCAST = "ff:ff:ff:ff:ff:ff"
+TELEMETRY_BPS = 4200000.0
+
+
+class TableDatapath(FakeDatapath):
+    """FakeDatapath that keeps the (in_port, eth_dst) -> port flows it receives."""
+
+    def __init__(self, dpid):
+        super(TableDatapath, self).__init__(dpid, record=False)
+        self.flows = {}
+        self.floods = 0
+        self.meter_rates = []
+
+    def send_msg(self, msg):
+        parser = self.ofproto_parser
+        if isinstance(msg, parser.OFPFlowMod) and msg.priority == 1:
+            actions = [i for i in msg.instructions if isinstance(i, parser.OFPInstructionActions)]
+            self.flows[(msg.match["in_port"], msg.match["eth_dst"])] = actions[0].actions[0].port
+        elif isinstance(msg, parser.OFPPacketOut):
+            self.floods += msg.actions[0].port == self.ofproto.OFPP_FLOOD
+        elif isinstance(msg, parser.OFPMeterMod):
+            self.meter_rates.append(msg.bands[0].rate)
+        return super(TableDatapath, self).send_msg(msg)
+
+
+def make_traffic(n_hosts, n_pairs, n_switches, seed=0):
+    """Hosts as (mac, dpid, port) and `n_pairs` distinct (src, dst) host indices."""
+    rng = np.random.default_rng(seed)
+    hosts = [((i + 1).to_bytes(6, "big").hex(":"), i % n_switches + 1, (i // n_switches) % 48 + 1)
+             for i in range(n_hosts)]
+    # Pairs stay on one switch: inter-switch links are not modelled
+    pairs = set()
+    while len(pairs) < n_pairs:
+        a, b = rng.integers(0, n_hosts, 2).tolist()
+        if a != b and hosts[a][1] == hosts[b][1]:
+            pairs.add((a, b))
+    return hosts, sorted(pairs)
+
+
+def connect(app, dpids):
+    datapaths = {}
+    start = time.perf_counter()
+    for dpid in dpids:
+        dp = datapaths[dpid] = TableDatapath(dpid)
+        features = dp.ofproto_parser.OFPSwitchFeatures(dp)
+        app.switch_features_handler(ofp_event.EventOFPSwitchFeatures(features))
+    hub.sleep(0.05)  # QoS re-assertion runs on the pipeline's green threads
+    return datapaths, time.perf_counter() - start
+
+
+def run_traffic(app, datapaths, hosts, pairs, rng, rtt, window, arped):
+    """
+    Random packets over `pairs` until `window` packets in a row stay in the
+    data plane. A pair's first packet is preceded by an ARP broadcast; hosts
+    keep their ARP cache (`arped`) across a controller restart.
+    """
+    packet_ins = packets = quiet = 0
+    spent = 0.0
+    while quiet < window:
+        s, d = pairs[rng.integers(0, len(pairs))]
+        # Replies are as likely as requests
+        if rng.integers(0, 2):
+            s, d = d, s
+        src, dpid, in_port = hosts[s]
+        dst = hosts[d][0]
+        dp = datapaths[dpid]
+        frames = []
+        if (s, d) not in arped:
+            arped.add((s, d))
+            frames.append(BROADCAST)
+        if (in_port, dst) not in dp.flows:
+            frames.append(dst)
+        for frame_dst in frames:
+            start = time.perf_counter()
+            app._packet_in_handler(ofp_event.EventOFPPacketIn(dp.packet_in(in_port, src, frame_dst)))
+            spent += time.perf_counter() - start + rtt
+            packet_ins += 1
+        packets += 1
+        quiet = 0 if frames and frames[-1] == dst else quiet + 1
+    return packets, packet_ins, spent
+
+
+def restart(path, warm, hosts, pairs, n_switches, rtt, window, seed, arped):
+    qos_app.SNAPSHOT_PATH = path if warm else None
+    start = time.perf_counter()
+    app = qos_app.SDRQoSOrchestrator()
+    startup = time.perf_counter() - start
+    datapaths, connect_s = connect(app, range(1, n_switches + 1))
+    reasserted = all(dp.meter_rates and dp.meter_rates[-1] == app.links.default.last_kbps
+                     for dp in datapaths.values())
+    reinstalled = sum(len(dp.flows) for dp in datapaths.values())
+    floods_before = sum(dp.floods for dp in datapaths.values())
+    packets, packet_ins, spent = run_traffic(app, datapaths, hosts, pairs, np.random.default_rng(seed),
+                                             rtt, window, set(arped))
+    return {
+        "startup_ms": startup * 1e3,
+        "connect_ms": connect_s * 1e3,
+        "reinstalled": reinstalled,
+        "packet_ins": packet_ins,
+        "floods": sum(dp.floods for dp in datapaths.values()) - floods_before,
+        "packets": packets,
+        "steady_ms": (startup + connect_s + spent) * 1e3,
+        "qos": reasserted,
+    }
+
+
+def snapshot_cost(n_hosts, path, repeat=3):
+    """Best save / load times (ms) and file size for `n_hosts` learned MACs."""
+    tables = MacTables(capacity=0, max_age=600)
+    for i in range(n_hosts):
+        tables.table(i % 4 + 1).learn((i + 1).to_bytes(6, "big").hex(":"), i % 48 + 1)
+    links = single_link("s1-eth2")
+    save_s = load_s = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        size = snapshot.save(path, tables, links)
+        save_s = min(save_s, time.perf_counter() - start)
+        start = time.perf_counter()
+        state = snapshot.load(path)
+        snapshot.restore(state, MacTables(capacity=0, max_age=600), links)
+        load_s = min(load_s, time.perf_counter() - start)
+    return save_s * 1e3, load_s * 1e3, size
+
+
+def main():
+    parser = ArgumentParser(description="Controller restart-to-steady-state, cold vs warm (snapshot)")
+    parser.add_argument("--hosts", type=int, default=1000)
+    parser.add_argument("--pairs", type=int, default=5000)
+    parser.add_argument("--switches", type=int, default=2)
+    parser.add_argument("--rtt-ms", type=float, default=1.0, help="Switch <-> controller round trip")
+    parser.add_argument("--window", type=int, default=5000, help="Packets without a packet-in = steady state")
+    parser.add_argument("--snapshot-hosts", default="10000,100000")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    hosts, pairs = make_traffic(args.hosts, args.pairs, args.switches, args.seed)
+    rtt = args.rtt_ms / 1e3
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "state.npz")
+
+        # Before the restart: learn everything, enforce a rate, snapshot
+        qos_app.SNAPSHOT_PATH = None
+        app = qos_app.SDRQoSOrchestrator()
+        datapaths, _ = connect(app, range(1, args.switches + 1))
+        arped = set()
+        run_traffic(app, datapaths, hosts, pairs, np.random.default_rng(args.seed), rtt, args.window, arped)
+        app.enforce_qos(TELEMETRY_BPS)
+        snapshot.save(path, app.mac_to_port, app.links, app.flow_ports)
+        print(f"{args.hosts} hosts, {len(pairs)} pairs on {args.switches} switch(es), "
+              f"{len(app.mac_to_port)} MACs / {len(app.flow_ports)} flow destinations learned, "
+              f"RTT {args.rtt_ms} ms")
+
+        print(f"{'restart':>8} {'startup ms':>10} {'connect ms':>10} {'flows':>7} {'pkt-in':>7} "
+              f"{'floods':>7} {'to steady ms':>12} {'QoS back':>8}")
+        for warm in (False, True):
+            r = restart(path, warm, hosts, pairs, args.switches, rtt, args.window, args.seed + 1, arped)
+            print(f"{'warm' if warm else 'cold':>8} {r['startup_ms']:>10.1f} {r['connect_ms']:>10.1f} "
+                  f"{r['reinstalled']:>7} {r['packet_ins']:>7} {r['floods']:>7} {r['steady_ms']:>12.1f} "
+                  f"{'yes' if r['qos'] else 'no':>8}")
+
+        # An empty or corrupt snapshot means a cold start, not a controller that fails to start
+        for garbage in (b"", b"PK\x03\x04" + bytes(64), b"not a snapshot"):
+            with open(path, "wb") as f:
+                f.write(garbage)
+            qos_app.SNAPSHOT_PATH = path
+            app = qos_app.SDRQoSOrchestrator()
+            if len(app.mac_to_port) or app.links.default.last_kbps is not None:
+                print(f"corrupt snapshot {garbage[:8]!r} was restored")
+                return 1
+        print("empty / corrupt snapshots: cold start")
+
+        print(f"\n{'MACs':>8} {'save ms':>8} {'load ms':>8} {'bytes':>9}")
+        for n in (int(h) for h in args.snapshot_hosts.split(",")):
+            save_ms, load_ms, size = snapshot_cost(n, path)
+            print(f"{n:>8} {save_ms:>8.1f} {load_ms:>8.1f} {size:>9}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
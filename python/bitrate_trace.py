@@ -0,0 +1,207 @@
+"""
+Record and replay the BITRATE telemetry stream.
+
+A trace file is a 16-byte header followed by fixed-size little-endian
+records (float64 receive time, float32 bitrate), so it can be opened
+with np.memmap without parsing:
+
+    python bitrate_trace.py record field.brt --duration 600
+    python bitrate_trace.py replay field.brt --speed 10 --loop --jitter-ms 2
+    python bitrate_trace.py info field.brt
+
+`record` subscribes to the GRC publisher (any format telemetry_codec
+decodes); `replay` binds like GRC and trans.py do and sends codec frames,
+or GRC-style raw float32 frames with --legacy.
+"""
+import struct
+import sys
+import time
+from argparse import ArgumentParser
+
+import numpy as np
+import zmq
+
+import telemetry_codec
+from qos_pipeline import drain_socket
+
+MAGIC = b"BRTR"
+VERSION = 1
+HEADER = struct.Struct("<4sHHQ")  # magic, version, record size, reserved
+RECORD = np.dtype([("t", "<f8"), ("rate", "<f4")])
+
+
+class TraceWriter(object):
+    """Appends (timestamp, rate) records to a trace file."""
+
+    def __init__(self, path):
+        self.f = open(path, "wb")
+        self.f.write(HEADER.pack(MAGIC, VERSION, RECORD.itemsize, 0))
+        self.count = 0
+
+    def write(self, t, rates):
+        """Write all `rates` (sequence of floats) with the same timestamp `t`."""
+        records = np.empty(len(rates), dtype=RECORD)
+        records["t"] = t
+        records["rate"] = rates
+        self.f.write(records.tobytes())
+        self.count += len(records)
+
+    def close(self):
+        self.f.close()
+
+
+def load_trace(path):
+    """Memory-map a trace file as a structured array with fields t and rate."""
+    with open(path, "rb") as f:
+        magic, version, size, _ = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC or size != RECORD.itemsize:
+        raise ValueError(f"{path} is not a bitrate trace (version {version})")
+    return np.memmap(path, dtype=RECORD, mode="r", offset=HEADER.size)
+
+
+def record(path, address="tcp://127.0.0.1:5555", duration=None):
+    ctx = zmq.Context()
+    socket = ctx.socket(zmq.SUB)
+    socket.connect(address)
+    socket.setsockopt(zmq.SUBSCRIBE, b"BITRATE")
+
+    writer = TraceWriter(path)
+    print(f"Recording {address} -> {path}")
+    end = time.monotonic() + duration if duration else None
+    next_status = 0.0
+    try:
+        while end is None or time.monotonic() < end:
+            for parts in drain_socket(socket, timeout_ms=200, copy=False):
+                t = time.time()
+                try:
+                    # GRC may pack several float32 items into one frame
+                    records = telemetry_codec.decode(parts)
+                except telemetry_codec.CodecError:
+                    continue
+                writer.write(t, records["rate"])
+            if time.monotonic() >= next_status:
+                print(f"  {writer.count} samples", end="\r")
+                next_status = time.monotonic() + 1.0
+    except KeyboardInterrupt:
+        pass
+    finally:
+        writer.close()
+        socket.close()
+        ctx.term()
+    print(f"\nWrote {writer.count} samples")
+
+
+def replay(path, address="tcp://*:5555", speed=1.0, loop=False, jitter_ms=0.0, seed=0,
+           warmup=0.5, legacy=False):
+    """
+    Republish a trace as telemetry_codec frames (sequence number = index).
+
+    Args:
+        speed: Time scale (1 = as recorded, 10 = ten times faster, 0 = no pacing)
+        loop: Start over at the end of the trace
+        jitter_ms: Std-dev of Gaussian jitter added to each send time
+        seed: RNG seed for the jitter, so runs are repeatable
+        warmup: Seconds to wait after bind so subscribers can connect
+        legacy: Send raw [b'BITRATE', float32] frames instead
+    """
+    trace = load_trace(path)
+    if len(trace) == 0:
+        print("Empty trace")
+        return
+    rng = np.random.default_rng(seed)
+
+    ctx = zmq.Context()
+    socket = ctx.socket(zmq.PUB)
+    socket.bind(address)
+    time.sleep(warmup)
+
+    # Precompute legacy payloads and relative send offsets once
+    rates = trace["rate"].tolist()
+    payloads = [telemetry_codec.encode_legacy(r) for r in rates] if legacy else None
+    offsets = np.asarray(trace["t"] - trace["t"][0])
+    if speed > 0:
+        offsets = offsets / speed
+    span = offsets[-1] + (np.median(np.diff(offsets)) if len(offsets) > 1 else 0.0)
+
+    sent = 0
+    print(f"Replaying {len(trace)} samples from {path} on {address} (speed={speed or 'max'})")
+    try:
+        while True:
+            start = time.perf_counter()
+            jitter = rng.normal(0.0, jitter_ms / 1e3, len(offsets)) if jitter_ms > 0 else None
+            for i, rate in enumerate(rates):
+                if speed > 0:
+                    target = start + offsets[i] + (jitter[i] if jitter is not None else 0.0)
+                    delay = target - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                if legacy:
+                    socket.send_multipart([telemetry_codec.TOPIC, payloads[i]])
+                else:
+                    socket.send_multipart(telemetry_codec.message(rate, seq=sent))
+                sent += 1
+            if not loop:
+                break
+            if speed > 0:
+                # Keep the loop period equal to the trace span
+                delay = start + span - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        socket.close(linger=1000)
+        ctx.term()
+    print(f"Sent {sent} messages")
+
+
+def info(path):
+    trace = load_trace(path)
+    if len(trace) == 0:
+        print("Empty trace")
+        return
+    t, rates = trace["t"], trace["rate"]
+    span = t[-1] - t[0]
+    print(f"{path}: {len(trace)} samples over {span:.1f} s ({len(trace) / max(span, 1e-9):.1f} msg/s)")
+    print(f"  rate min/mean/max: {rates.min() / 1e6:.2f} / {rates.mean() / 1e6:.2f} / {rates.max() / 1e6:.2f} Mbps")
+    print(f"  rate changes: {np.count_nonzero(np.diff(rates))}")
+
+
+def main():
+    parser = ArgumentParser(description="Record/replay BITRATE telemetry")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("record")
+    p.add_argument("path")
+    p.add_argument("--address", default="tcp://127.0.0.1:5555")
+    p.add_argument("--duration", type=float, help="Seconds to record [default: until Ctrl+C]")
+
+    p = sub.add_parser("replay")
+    p.add_argument("path")
+    p.add_argument("--address", default="tcp://*:5555")
+    p.add_argument("--speed", type=float, default=1.0, help="Time scale, 0 = as fast as possible")
+    p.add_argument("--loop", action="store_true")
+    p.add_argument("--jitter-ms", type=float, default=0.0)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--legacy", action="store_true", help="Send raw float32 frames like GRC")
+
+    p = sub.add_parser("info")
+    p.add_argument("path")
+
+    args = parser.parse_args()
+    try:
+        if args.command == "record":
+            record(args.path, args.address, args.duration)
+        elif args.command == "replay":
+            replay(args.path, args.address, args.speed, args.loop, args.jitter_ms, args.seed,
+                   legacy=args.legacy)
+        else:
+            info(args.path)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
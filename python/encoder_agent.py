@@ -0,0 +1,416 @@
+"""
+Sender-side encoder agent: keep the video bitrate under the policed rate.
+
+Subscribes to the controllers' enforced-rate feedback (feedback.py) and
+picks a bitrate rung for the video source: the highest rung that fits
+the policed rate after a safety margin (and container/packet overhead).
+Drops are followed at once; rises need the new rate to have held for
+--up-hold seconds and are limited by a switching budget
+(--max-switches per --window seconds), since every switch costs the
+viewer a glitch.
+
+Actuators:
+  - ffmpeg: the README's h1 sender. "restart" mode restarts ffmpeg with
+    the new rate at once; "segment" mode only at segment boundaries, so
+    restarts are aligned and at most one per segment. With
+    --input-duration the file position is carried across restarts.
+  - log: prints and records the switches (stand-in for tests).
+
+    h1 python encoder_agent.py run --actuator ffmpeg --input video.mp4 --output udp://10.0.0.2:1234
+    python encoder_agent.py run --actuator log
+    python encoder_agent.py eval            # open vs closed loop goodput/loss on synthetic channels
+"""
+import shlex
+import subprocess
+import sys
+import threading
+import time
+from argparse import ArgumentParser
+
+import numpy as np
+import zmq
+
+import feedback
+import telemetry_codec
+
+DEFAULT_RUNGS = (500, 1000, 1500, 2000, 2500, 3000, 4000, 5000, 6500, 8000)
+
+
+class RungSelector(object):
+    """
+    Args:
+        rungs: Available video bitrates (kbps)
+        margin: Fraction of the policed rate kept free (VBR peaks, policer burst)
+        overhead: Packetization overhead on top of the video bitrate (MPEG-TS/UDP/IP)
+        up_hold: Seconds the policed rate must allow a higher rung before switching up
+        max_switches: Switches allowed per `window` seconds (drops are never held back)
+        window: Budget window in seconds
+        initial: Starting rung (kbps), before any feedback
+    """
+
+    def __init__(self, rungs=DEFAULT_RUNGS, margin=0.1, overhead=0.05, up_hold=5.0,
+                 max_switches=6, window=60.0, initial=3000):
+        self.rungs = tuple(sorted(rungs))
+        self.margin = margin
+        self.overhead = overhead
+        self.up_hold = up_hold
+        self.max_switches = max_switches
+        self.window = window
+        self.current = initial
+        self.up_since = None
+        self.recent = []      # switch times within the budget window
+        self.switches = 0
+        self.suppressed = 0   # up switches held back by the budget
+
+    def fit(self, capacity_bps):
+        """Highest rung that fits `capacity_bps`, else the lowest."""
+        usable_kbps = capacity_bps / 1000.0 * (1 - self.margin) / (1 + self.overhead)
+        fitting = [r for r in self.rungs if r <= usable_kbps]
+        return fitting[-1] if fitting else self.rungs[0]
+
+    def update(self, capacity_bps, now=None):
+        """New rung (kbps) to switch to, or None to stay."""
+        now = time.monotonic() if now is None else now
+        target = self.fit(capacity_bps)
+        if target == self.current:
+            self.up_since = None
+            return None
+        if target < self.current:
+            # Over the policed rate means loss: always follow a drop
+            return self._switch(target, now)
+
+        if self.up_since is None:
+            self.up_since = now
+        if now - self.up_since < self.up_hold:
+            return None
+        self.recent = [t for t in self.recent if now - t < self.window]
+        if len(self.recent) >= self.max_switches:
+            self.suppressed += 1
+            return None
+        return self._switch(target, now)
+
+    def _switch(self, rung, now):
+        self.current = rung
+        self.up_since = None
+        self.recent.append(now)
+        self.switches += 1
+        return rung
+
+
+###########################################################################
+# Actuators
+###########################################################################
+
+class Actuator(object):
+    """Applies a video bitrate to the source."""
+
+    name = "base"
+
+    def start(self, kbps):
+        self.set_bitrate(kbps)
+
+    def set_bitrate(self, kbps):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class LogActuator(Actuator):
+    """Stand-in: records (time, kbps) switches instead of driving an encoder."""
+
+    name = "log"
+
+    def __init__(self, quiet=False):
+        self.history = []
+        self.quiet = quiet
+
+    def set_bitrate(self, kbps):
+        self.history.append((time.monotonic(), kbps))
+        if not self.quiet:
+            print(f"[{time.strftime('%H:%M:%S')}] video bitrate -> {kbps} kbps")
+
+
+class FfmpegActuator(Actuator):
+    """
+    Args:
+        input: ffmpeg input (file or device)
+        output: Stream destination, e.g. udp://10.0.0.2:1234
+        mode: "restart" (switch at once) or "segment" (switch at segment boundaries)
+        segment: Segment length in seconds (segment mode)
+        input_duration: Length of a file input in seconds; enables resuming at the same position
+        ffmpeg: ffmpeg executable
+        extra: Additional output arguments (string)
+    """
+
+    name = "ffmpeg"
+
+    def __init__(self, input, output, mode="restart", segment=4.0, input_duration=None,
+                 ffmpeg="ffmpeg", extra=""):
+        if mode not in ("restart", "segment"):
+            raise ValueError(f"Unknown ffmpeg actuator mode {mode!r}")
+        self.input = input
+        self.output = output
+        self.mode = mode
+        self.segment = segment
+        self.input_duration = input_duration
+        self.ffmpeg = ffmpeg
+        self.extra = shlex.split(extra)
+        self.proc = None
+        self.started_at = None
+        self.position = 0.0
+        self.kbps = None
+        self.pending = None
+        self.restarts = 0
+        self.lock = threading.Lock()
+        self.running = True
+        if mode == "segment":
+            threading.Thread(target=self._segments, daemon=True).start()
+
+    def command(self, kbps, position=0.0):
+        """The README sender command at `kbps`, starting `position` seconds into the input."""
+        seek = ["-ss", f"{position:.3f}"] if position else []
+        return ([self.ffmpeg, "-hide_banner", "-loglevel", "error", "-re", "-stream_loop", "-1"] + seek +
+                ["-i", self.input, "-c:v", "libx264", "-b:v", f"{kbps}k", "-maxrate", f"{kbps}k",
+                 "-bufsize", f"{2 * kbps}k", "-preset", "ultrafast", "-tune", "zerolatency",
+                 "-intra-refresh", "1", "-pkt_size", "1316"] + self.extra + ["-f", "mpegts", self.output])
+
+    def start(self, kbps):
+        with self.lock:
+            self._restart(kbps)
+
+    def set_bitrate(self, kbps):
+        with self.lock:
+            if self.mode == "segment":
+                self.pending = kbps
+            else:
+                self._restart(kbps)
+
+    def _restart(self, kbps):
+        now = time.monotonic()
+        if self.proc is not None:
+            self.proc.terminate()
+            try:
+                self.proc.wait(timeout=2.0)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+            if self.input_duration:
+                self.position = (self.position + now - self.started_at) % self.input_duration
+            self.restarts += 1
+        self.proc = subprocess.Popen(self.command(kbps, self.position), stdin=subprocess.DEVNULL)
+        self.started_at = now
+        self.kbps = kbps
+
+    def _segments(self):
+        while self.running:
+            time.sleep(self.segment)
+            with self.lock:
+                if self.pending is not None and self.pending != self.kbps and self.proc is not None:
+                    self._restart(self.pending)
+                self.pending = None
+
+    def close(self):
+        self.running = False
+        with self.lock:
+            if self.proc is not None:
+                self.proc.terminate()
+                self.proc.wait()
+                self.proc = None
+
+
+###########################################################################
+# Agent
+###########################################################################
+
+def run_agent(selector, actuator, endpoint=feedback.DEFAULT_CONNECT, link=0, stale=5.0):
+    """Follow the enforced rate of `link` until interrupted."""
+    ctx = zmq.Context()
+    socket = ctx.socket(zmq.SUB)
+    socket.connect(endpoint)
+    socket.setsockopt(zmq.SUBSCRIBE, feedback.TOPIC)
+    actuator.start(selector.current)
+    print(f"Following link {link} on {endpoint}, starting at {selector.current} kbps ({actuator.name})")
+
+    last_heard = time.monotonic()
+    try:
+        while True:
+            if not socket.poll(1000, zmq.POLLIN):
+                if time.monotonic() - last_heard > stale:
+                    print(f"No feedback for {stale:.0f} s, holding {selector.current} kbps")
+                    last_heard = time.monotonic()
+                continue
+            try:
+                rates = feedback.decode(socket.recv_multipart())
+            except telemetry_codec.CodecError:
+                continue
+            if link not in rates:
+                continue
+            last_heard = time.monotonic()
+            rung = selector.update(rates[link][0])
+            if rung is not None:
+                actuator.set_bitrate(rung)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        actuator.close()
+        socket.close(linger=0)
+        print(f"{selector.switches} switches, {selector.suppressed} held back by the budget")
+    return 0
+
+
+###########################################################################
+# Open vs closed loop evaluation
+###########################################################################
+
+def simulate(t, enforced_bps, selector=None, open_kbps=3000, burst_ratio=0.1, overhead=0.05,
+             restart_gap=0.5, segment=None, vbr=0.1, feedback_delay=0.02,
+             republish=feedback.REPUBLISH_INTERVAL, seed=0):
+    """
+    Offer video into a token-bucket policer following `enforced_bps`.
+
+    Open loop (selector None) sends `open_kbps`; closed loop switches rung
+    per `selector`, `feedback_delay` after each change of the enforced rate
+    and after each `republish` seconds (the controllers' publish_all), at
+    the next segment boundary if `segment` is set, and sends nothing for
+    `restart_gap` seconds per switch. Returns per-step (offered, delivered)
+    bits and the number of encoder restarts.
+    """
+    rng = np.random.default_rng(seed)
+    dt = np.diff(t, append=t[-1] + (t[-1] - t[-2]))
+    offered = np.empty(len(t))
+    delivered = np.empty(len(t))
+    tokens = enforced_bps[0] * burst_ratio
+    rung = open_kbps if selector is None else selector.current
+    pending, gap_until, next_boundary = None, -1.0, segment or 0.0
+    next_republish = t[0]
+    restarts = 0
+    seen = []  # (time the encoder learns it, enforced bps)
+
+    for i in range(len(t)):
+        now = t[i]
+        rate = enforced_bps[i]
+        if selector is not None:
+            if i == 0 or rate != enforced_bps[i - 1] or (republish and now >= next_republish):
+                seen.append((now + feedback_delay, rate))
+            if republish and now >= next_republish:
+                next_republish += republish * ((now - next_republish) // republish + 1)
+            while seen and seen[0][0] <= now:
+                choice = selector.update(seen.pop(0)[1], now)
+                if choice is not None:
+                    pending = choice
+            if pending is not None and (segment is None or now >= next_boundary):
+                if pending != rung:
+                    rung, gap_until = pending, now + restart_gap
+                    restarts += 1
+                pending = None
+            if segment is not None and now >= next_boundary:
+                next_boundary += segment
+
+        # Token bucket: the policed rate refills, the burst caps the bucket
+        bucket = rate * burst_ratio
+        tokens = min(bucket, tokens + rate * dt[i])
+        bits = 0.0 if now < gap_until else rung * 1000.0 * (1 + overhead) * dt[i] * rng.lognormal(0, vbr)
+        sent = min(bits, tokens)
+        tokens -= sent
+        offered[i], delivered[i] = bits, sent
+    return offered, delivered, restarts
+
+
+def loss_metrics(t, offered, delivered, interval=1.0):
+    """
+    Throughput, loss and 'clean' seconds of a run: no loss (no datamoshing)
+    and no encoder restart (the picture freezes). Goodput only counts
+    clean seconds.
+    """
+    bins = ((t - t[0]) // interval).astype(int)
+    off = np.bincount(bins, offered)
+    dlv = np.bincount(bins, delivered)
+    lossy = (off - dlv) > 0.001 * np.maximum(off, 1.0)
+    lossy |= np.bincount(bins, offered == 0) > 0
+    duration = t[-1] - t[0] + interval
+    return {
+        "throughput_mbps": dlv.sum() / duration / 1e6,
+        "goodput_mbps": dlv[~lossy].sum() / duration / 1e6,
+        "loss_pct": 100.0 * (off.sum() - dlv.sum()) / max(off.sum(), 1.0),
+        "clean_pct": 100.0 * np.count_nonzero(~lossy) / len(lossy),
+    }
+
+
+def evaluate(args):
+    from eval_rate_policy import CHANNELS, run, synthetic
+    from rate_policy import make_policy
+
+    policy = make_policy(up_delay=args.policy_up_delay, burst_ratio=args.burst_ratio)
+    rungs = tuple(int(r) for r in args.rungs.split(","))
+    modes = [("open loop", None, None),
+             ("closed, restart", "restart", None),
+             (f"closed, segment {args.segment:g} s", "segment", args.segment)]
+    for name in CHANNELS:
+        t, telemetry = synthetic(name, args.duration, args.hz)
+        enforced, _ = run(policy, t, telemetry)
+        print(f"\n{name}: enforced rate {enforced.min() / 1e6:.1f}-{enforced.max() / 1e6:.1f} Mbps, "
+              f"open loop at {args.open_kbps} kbps")
+        print(f"{'mode':>20} {'restarts':>8} {'thru Mbps':>9} {'good Mbps':>9} {'loss %':>7} {'clean s %':>9}")
+        for label, mode, segment in modes:
+            selector = None if mode is None else RungSelector(rungs, args.margin, args.overhead, args.up_hold,
+                                                              args.max_switches, args.window, args.open_kbps)
+            offered, delivered, switches = simulate(t, enforced, selector, args.open_kbps, args.burst_ratio,
+                                                    args.overhead, args.restart_gap, segment)
+            m = loss_metrics(t, offered, delivered)
+            print(f"{label:>20} {switches:>8} {m['throughput_mbps']:>9.2f} {m['goodput_mbps']:>9.2f} "
+                  f"{m['loss_pct']:>7.2f} {m['clean_pct']:>9.1f}")
+    return 0
+
+
+def main():
+    parser = ArgumentParser(description="Encoder agent following the controller's enforced rate")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def selector_args(p):
+        p.add_argument("--rungs", default=",".join(str(r) for r in DEFAULT_RUNGS), help="Video bitrates (kbps)")
+        p.add_argument("--margin", type=float, default=0.1)
+        p.add_argument("--overhead", type=float, default=0.05)
+        p.add_argument("--up-hold", type=float, default=5.0)
+        p.add_argument("--max-switches", type=int, default=6)
+        p.add_argument("--window", type=float, default=60.0)
+
+    p = sub.add_parser("run")
+    selector_args(p)
+    p.add_argument("--feedback", default=feedback.DEFAULT_CONNECT)
+    p.add_argument("--link", type=int, default=0)
+    p.add_argument("--initial", type=int, default=3000, help="Rung before the first feedback (kbps)")
+    p.add_argument("--actuator", choices=("ffmpeg", "log"), default="log")
+    p.add_argument("--input", default="video.mp4")
+    p.add_argument("--output", default="udp://10.0.0.2:1234")
+    p.add_argument("--mode", choices=("restart", "segment"), default="restart")
+    p.add_argument("--segment", type=float, default=4.0)
+    p.add_argument("--input-duration", type=float)
+    p.add_argument("--ffmpeg", default="ffmpeg")
+
+    p = sub.add_parser("eval")
+    selector_args(p)
+    p.add_argument("--duration", type=float, default=600.0)
+    p.add_argument("--hz", type=float, default=20.0)
+    p.add_argument("--open-kbps", type=int, default=3000, help="Fixed rate of the open-loop sender (-b:v 3M)")
+    p.add_argument("--burst-ratio", type=float, default=0.1, help="Policer burst, seconds at the rate")
+    p.add_argument("--policy-up-delay", type=float, default=3.0)
+    p.add_argument("--restart-gap", type=float, default=0.5, help="Seconds without video per switch")
+    p.add_argument("--segment", type=float, default=4.0)
+
+    args = parser.parse_args()
+    if args.command == "eval":
+        return evaluate(args)
+
+    rungs = tuple(int(r) for r in args.rungs.split(","))
+    selector = RungSelector(rungs, args.margin, args.overhead, args.up_hold, args.max_switches,
+                            args.window, args.initial)
+    if args.actuator == "ffmpeg":
+        actuator = FfmpegActuator(args.input, args.output, args.mode, args.segment, args.input_duration,
+                                  args.ffmpeg)
+    else:
+        actuator = LogActuator()
+    return run_agent(selector, actuator, args.feedback, args.link)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
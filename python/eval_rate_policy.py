@@ -0,0 +1,160 @@
+"""
+Trace-driven evaluation of QoS rate policies: churn vs responsiveness.
+
+Each policy is fed the same telemetry (a bitrate_trace.py recording, or
+synthetic channels modelled on the GRC estimator: noisy power -> EMA ->
+1-10 Mbps -> rounded to 100 kbps) and its enforced rate is tracked over
+time. Reported per policy:
+
+  changes/min   reconfigurations issued (each is an OVSDB write or meter mod)
+  avoided       samples the original exact-match policy would have applied
+  over %        time the enforced rate is above the telemetry rate by more
+                than --tolerance (the link is policed above what the radio
+                carries; the stream risks loss)
+  under %       mean shortfall below the telemetry rate (unused capacity)
+  drop p50/max  seconds from a drop of the telemetry rate (> --drop-frac)
+                to an enforced rate within tolerance of it
+
+    python eval_rate_policy.py
+    python eval_rate_policy.py --trace field.brt
+"""
+import sys
+from argparse import ArgumentParser
+
+import numpy as np
+
+from bitrate_trace import load_trace
+from rate_policy import RatePolicy, RateState, make_policy, parse_ladder
+
+RATE_MIN, RATE_MAX = 1e6, 10e6
+
+
+def estimator_trace(power, alpha=0.1):
+    """Bitrate per power sample, as default_epy_block_0 computes it."""
+    avg = np.empty_like(power)
+    acc = 0.0
+    for i, p in enumerate(power):
+        acc = alpha * p + (1 - alpha) * acc
+        avg[i] = acc
+    factor = np.sqrt(np.clip((avg - 0.3) / (1.3 - 0.3), 0.0, 1.0))
+    rate = RATE_MAX - factor * (RATE_MAX - RATE_MIN)
+    return np.round(rate / 100000) * 100000
+
+
+def synthetic(name, duration=600.0, hz=20.0, seed=0):
+    """(t, bitrate) for one of the synthetic channels."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(0, duration, 1.0 / hz)
+    if name == "noisy":
+        # Steady channel, measurement noise only
+        power = 0.7 + rng.normal(0, 0.15, len(t))
+    elif name == "steps":
+        # Interference switching on and off every 30-90 s
+        level = np.empty(len(t))
+        i = 0
+        while i < len(t):
+            n = int(rng.uniform(30, 90) * hz)
+            level[i:i + n] = rng.choice((0.45, 0.8, 1.1))
+            i += n
+        power = level + rng.normal(0, 0.1, len(t))
+    elif name == "fading":
+        # Slow fade with a 40 s period plus noise
+        power = 0.8 + 0.35 * np.sin(2 * np.pi * t / 40.0) + rng.normal(0, 0.1, len(t))
+    else:
+        raise ValueError(f"Unknown channel {name!r}")
+    return t, estimator_trace(power)
+
+
+CHANNELS = ("noisy", "steps", "fading")
+
+
+def run(policy, t, rate):
+    """Enforced rate (bps) after each sample, and the policy's RateState."""
+    state = RateState()
+    current = None
+    enforced = np.empty(len(t))
+    for i in range(len(t)):
+        decision = policy.decide(state, current, float(rate[i]), now=float(t[i]))
+        if decision is not None:
+            current = decision[0]
+        enforced[i] = current * 1000.0
+    return enforced, state
+
+
+def drop_reactions(t, rate, enforced, tolerance, drop_frac):
+    """Seconds from each telemetry drop to the enforced rate following it."""
+    reactions = []
+    i = 1
+    while i < len(t):
+        if rate[i] < rate[i - 1] * (1 - drop_frac) and enforced[i - 1] > rate[i] * (1 + tolerance):
+            ok = np.nonzero(enforced[i:] <= rate[i] * (1 + tolerance))[0]
+            if len(ok):
+                reactions.append(t[i + ok[0]] - t[i])
+                i += ok[0]
+        i += 1
+    return reactions
+
+
+def evaluate(policy, t, rate, tolerance=0.02, drop_frac=0.1):
+    enforced, state = run(policy, t, rate)
+    dt = np.diff(t, append=t[-1] + (t[-1] - t[-2] if len(t) > 1 else 1.0))
+    over = enforced > rate * (1 + tolerance)
+    shortfall = np.clip((rate - enforced) / rate, 0.0, None)
+    reactions = drop_reactions(t, rate, enforced, tolerance, drop_frac)
+    minutes = (t[-1] - t[0] + dt[-1]) / 60.0
+    return {
+        "changes_per_min": state.changes / minutes,
+        "avoided": state.avoided,
+        "over_pct": 100.0 * dt[over].sum() / dt.sum(),
+        "under_pct": 100.0 * np.average(shortfall, weights=dt),
+        "drop_p50": float(np.median(reactions)) if reactions else 0.0,
+        "drop_max": max(reactions) if reactions else 0.0,
+    }
+
+
+def policies(ladder):
+    return [
+        ("exact (original)", RatePolicy()),
+        ("hysteresis 5%", make_policy(hysteresis=0.05)),
+        ("ladder", make_policy(ladder=ladder)),
+        ("dwell 2 s", make_policy(min_dwell=2.0)),
+        ("up 3 s / down 0", make_policy(up_delay=3.0)),
+        ("5% + up 3 s", make_policy(hysteresis=0.05, up_delay=3.0)),
+        ("5% + up 3 s + dwell 1 s", make_policy(hysteresis=0.05, up_delay=3.0, min_dwell=1.0)),
+        ("ladder + up 3 s", make_policy(ladder=ladder, up_delay=3.0)),
+        ("ladder + 5% + up 3 s + dwell 1 s", make_policy(ladder=ladder, hysteresis=0.05,
+                                                          up_delay=3.0, min_dwell=1.0)),
+    ]
+
+
+def main():
+    parser = ArgumentParser(description="Trace-driven churn vs responsiveness of QoS rate policies")
+    parser.add_argument("--trace", help="bitrate_trace.py recording (default: synthetic channels)")
+    parser.add_argument("--duration", type=float, default=600.0, help="Synthetic trace length (s)")
+    parser.add_argument("--hz", type=float, default=20.0, help="Synthetic telemetry rate")
+    parser.add_argument("--ladder", default="geometric:1000:10000:1.25")
+    parser.add_argument("--tolerance", type=float, default=0.02)
+    parser.add_argument("--drop-frac", type=float, default=0.1)
+    args = parser.parse_args()
+
+    if args.trace:
+        trace = load_trace(args.trace)
+        traces = [(args.trace, np.asarray(trace["t"]), np.asarray(trace["rate"], dtype=float))]
+    else:
+        traces = [(name, *synthetic(name, args.duration, args.hz)) for name in CHANNELS]
+
+    ladder = parse_ladder(args.ladder)
+    for name, t, rate in traces:
+        print(f"\n{name}: {len(t)} samples over {t[-1] - t[0]:.0f} s, "
+              f"{np.count_nonzero(np.diff(rate))} telemetry changes")
+        print(f"{'policy':>34} {'changes/min':>11} {'avoided':>8} {'over %':>7} {'under %':>8} "
+              f"{'drop p50':>8} {'drop max':>8}")
+        for label, policy in policies(ladder):
+            r = evaluate(policy, t, rate, args.tolerance, args.drop_frac)
+            print(f"{label:>34} {r['changes_per_min']:>11.1f} {r['avoided']:>8} {r['over_pct']:>7.2f} "
+                  f"{r['under_pct']:>8.2f} {r['drop_p50']:>8.2f} {r['drop_max']:>8.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
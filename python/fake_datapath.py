@@ -0,0 +1,489 @@
+"""
+Fake OpenFlow 1.3 datapath for exercising qos_app.py without a switch.
+
+FakeDatapath has what OS-Ken handlers touch (id, ofproto, ofproto_parser,
+send_msg): every message is serialized with the real OS-Ken encoder,
+parsed back and kept in `sent`, and its bytes can be written to a socket
+to stand in for the control channel.
+
+    python fake_datapath.py check                  # drive qos_app handlers, verify meters/flows
+    python fake_datapath.py queues                 # queue mode (htb) against a fake ovs-vsctl
+    python fake_datapath.py bench --updates 2000   # meter vs ovs-vsctl update latency
+
+`bench` uses the real ovs-vsctl if it is on PATH; otherwise --vsctl
+(default `true`) is spawned so at least the process cost is measured.
+"""
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+from argparse import ArgumentParser
+
+from os_ken.ofproto import ofproto_parser as ofp_parser
+from os_ken.ofproto import ofproto_protocol
+from os_ken.ofproto import ofproto_v1_3
+from os_ken.ofproto import ofproto_v1_3_parser
+
+from qos_backends import MeterBackend, VsctlBackend
+
+
+class FakeDatapath(ofproto_protocol.ProtocolDesc):
+    """
+    Args:
+        dpid: Datapath id
+        channel: Socket the serialized messages are written to (optional)
+        ports: {name: port number} answered to port description requests
+        record: Keep sent messages in `sent` (off for long benchmarks)
+    """
+
+    def __init__(self, dpid=1, channel=None, ports=None, record=True):
+        super(FakeDatapath, self).__init__(ofproto_v1_3.OFP_VERSION)
+        self.id = dpid
+        self.xid = 0
+        self.channel = channel
+        self.ports = ports or {"s1-eth1": 1, "s1-eth2": 2}
+        self.sent = []
+        self.record = record
+        self.sent_count = 0
+
+    def set_xid(self, msg):
+        self.xid = (self.xid + 1) & self.ofproto.MAX_XID
+        msg.set_xid(self.xid)
+        return self.xid
+
+    def send_msg(self, msg):
+        if msg.xid is None:
+            self.set_xid(msg)
+        msg.serialize()
+        if self.channel is not None:
+            self.channel.sendall(msg.buf)
+        self.sent_count += 1
+        if self.record:
+            self.sent.append(msg)
+        return True
+
+    def parsed(self):
+        """
+        Round-trip sent messages through the OS-Ken decoder. Types OS-Ken
+        cannot decode (e.g. meter mods, packet outs) are returned as sent.
+        """
+        out = []
+        for msg in self.sent:
+            version, msg_type, msg_len, xid = ofp_parser.header(msg.buf)
+            if ofproto_v1_3_parser._MSG_PARSERS.get(msg_type) is None:
+                out.append(msg)
+                continue
+            out.append(ofp_parser.msg(self, version, msg_type, msg_len, xid, bytes(msg.buf)))
+        return out
+
+    def of_type(self, cls):
+        return [m for m in self.parsed() if isinstance(m, cls)]
+
+    def port_desc_reply(self):
+        parser = self.ofproto_parser
+        ports = [parser.OFPPort(port_no=no, hw_addr="00:00:00:00:00:%02x" % no, name=name.encode(),
+                                config=0, state=0, curr=0, advertised=0, supported=0, peer=0,
+                                curr_speed=0, max_speed=0)
+                 for name, no in self.ports.items()]
+        reply = parser.OFPPortDescStatsReply(self, body=ports)
+        reply.body = ports
+        return reply
+
+    def port_stats(self, port_no, rx_bytes=0, tx_bytes=0, rx_dropped=0, tx_dropped=0):
+        """One port's entry of a port stats reply (packets = bytes / 1000)."""
+        return self.ofproto_parser.OFPPortStats(port_no, rx_bytes // 1000, tx_bytes // 1000, rx_bytes, tx_bytes,
+                                                rx_dropped, tx_dropped, 0, 0, 0, 0, 0, 0, 0, 0)
+
+    def flow_stats(self, in_port, eth_dst, byte_count, duration, cookie=0):
+        """One learned flow's entry of a flow stats reply (packets = bytes / 1000)."""
+        return self.ofproto_parser.OFPFlowStats(
+            table_id=0, duration_sec=int(duration), duration_nsec=int(duration % 1 * 1e9), priority=1,
+            idle_timeout=0, hard_timeout=0, flags=0, cookie=cookie, packet_count=byte_count // 1000,
+            byte_count=byte_count, match=self.ofproto_parser.OFPMatch(in_port=in_port, eth_dst=eth_dst),
+            instructions=[])
+
+    def flow_stats_reply(self, *flows, more=False):
+        from os_ken.controller import ofp_event
+        reply = self.ofproto_parser.OFPFlowStatsReply(self, flags=self.ofproto.OFPMPF_REPLY_MORE if more else 0)
+        reply.body = list(flows)
+        return ofp_event.EventOFPFlowStatsReply(reply)
+
+    def packet_in(self, in_port, src, dst):
+        parser = self.ofproto_parser
+        frame = bytes.fromhex(dst.replace(":", "") + src.replace(":", "")) + b"\x08\x00" + bytes(46)
+        return parser.OFPPacketIn(self, buffer_id=self.ofproto.OFP_NO_BUFFER, total_len=len(frame),
+                                  reason=self.ofproto.OFPR_NO_MATCH, table_id=0, cookie=0,
+                                  match=parser.OFPMatch(in_port=in_port), data=frame)
+
+
+def _drain(sock):
+    while sock.recv(65536):
+        pass
+
+
+def control_channel():
+    """Connected socket pair; the far end is read and discarded by a thread."""
+    near, far = socket.socketpair()
+    threading.Thread(target=_drain, args=(far,), daemon=True).start()
+    return near
+
+
+###########################################################################
+# Conformance check
+###########################################################################
+
+def check():
+    """Drive qos_app's handlers with the meter backend and verify what it sends."""
+    os.environ["SDR_QOS_BACKEND"] = "meter"
+    os.environ.setdefault("SDR_FEEDBACK", "")
+    os.environ.setdefault("SDR_MAX_HEADROOM", "1.5")
+    os.environ.setdefault("SDR_METRICS_PORT", "0")
+    from os_ken.controller import ofp_event
+    from os_ken.lib import hub
+    import qos_app
+
+    app = qos_app.SDRQoSOrchestrator()
+    ofproto = ofproto_v1_3
+    dps = [FakeDatapath(dpid) for dpid in (1, 2)]
+    parser = dps[0].ofproto_parser
+    qos_port = dps[0].ports[qos_app.OVS_INTERFACE]
+    other_port = next(no for no in dps[0].ports.values() if no != qos_port)
+
+    for dp in dps:
+        features = parser.OFPSwitchFeatures(dp)
+        app.switch_features_handler(ofp_event.EventOFPSwitchFeatures(features))
+        app.port_desc_stats_reply_handler(ofp_event.EventOFPPortDescStatsReply(dp.port_desc_reply()))
+        # Learn both hosts, then traffic each way installs one flow per direction
+        for msg in (dp.packet_in(qos_port, "00:00:00:00:00:02", "ff:ff:ff:ff:ff:ff"),
+                    dp.packet_in(other_port, "00:00:00:00:00:01", "00:00:00:00:00:02"),
+                    dp.packet_in(qos_port, "00:00:00:00:00:02", "00:00:00:00:00:01")):
+            app._packet_in_handler(ofp_event.EventOFPPacketIn(msg))
+
+    # A drop applies at once (a rise would wait for the policy's up delay)
+    app.enforce_qos(8000000.0)
+    app.enforce_qos(2500000.0)
+
+    failures = []
+
+    def expect(cond, what):
+        print(f"  [{'ok' if cond else 'FAIL'}] {what}")
+        if not cond:
+            failures.append(what)
+
+    meter_id = app.qos_backend.meter_id(qos_app.OVS_INTERFACE)
+    for dp in dps:
+        print(f"datapath {dp.id}: {len(dp.sent)} messages")
+        meters = dp.of_type(parser.OFPMeterMod)
+        expect([m.command for m in meters] == [ofproto.OFPMC_ADD, ofproto.OFPMC_MODIFY, ofproto.OFPMC_MODIFY],
+               "meter added once, then one MODIFY per rate update")
+        expect(all(m.meter_id == meter_id and m.flags == ofproto.OFPMF_KBPS | ofproto.OFPMF_BURST
+                   for m in meters), f"meter id {meter_id}, kbps + burst flags")
+        bands = [(m.bands[0].type, m.bands[0].rate, m.bands[0].burst_size) for m in meters[1:]]
+        expect(bands == [(ofproto.OFPMBT_DROP, 8000, 800), (ofproto.OFPMBT_DROP, 2500, 250)],
+               f"drop band rate/burst follow telemetry {bands}")
+
+        flows = [f for f in dp.of_type(parser.OFPFlowMod) if f.priority == 1]
+        metered = {f.match["in_port"]: [i for i in f.instructions if isinstance(i, parser.OFPInstructionMeter)]
+                   for f in flows}
+        expect(len(flows) == 2, "one learned flow per direction")
+        expect([i.meter_id for i in metered.get(qos_port, [])] == [meter_id],
+               f"flow from {qos_app.OVS_INTERFACE} (port {qos_port}) carries the meter")
+        expect(metered.get(other_port) == [], f"flow from port {other_port} is not metered")
+        expect(all(f.idle_timeout == qos_app.FLOW_IDLE_TIMEOUT and f.flags & ofproto.OFPFF_SEND_FLOW_REM
+                   for f in flows), f"learned flows idle out after {qos_app.FLOW_IDLE_TIMEOUT} s and report removal")
+        first_meter = next(i for i, m in enumerate(dp.sent) if isinstance(m, parser.OFPMeterMod))
+        first_metered = next(i for i, m in enumerate(dp.sent) if isinstance(m, parser.OFPFlowMod)
+                             and m.match.get("in_port") == qos_port)
+        expect(first_meter < first_metered, "meter exists before a flow references it")
+
+    # The only flow to host 1 idles out on switch 1: the host is forgotten there only
+    dp = dps[0]
+    host1 = "00:00:00:00:00:01"
+    removed = parser.OFPFlowRemoved(dp, cookie=0, priority=1, reason=ofproto.OFPRR_IDLE_TIMEOUT, table_id=0,
+                                    duration_sec=0, duration_nsec=0, idle_timeout=qos_app.FLOW_IDLE_TIMEOUT,
+                                    hard_timeout=0, packet_count=0, byte_count=0,
+                                    match=parser.OFPMatch(in_port=qos_port, eth_dst=host1))
+    app.flow_removed_handler(ofp_event.EventOFPFlowRemoved(removed))
+    expect(app.mac_to_port.table(dp.id).lookup(host1) is None, "FlowRemoved for the last flow to a host forgets it")
+    expect(app.mac_to_port.table(dps[1].id).lookup(host1) == other_port, "other switches keep the host")
+
+    # Switch 2 reconnects with an empty flow table: learned flows and the rate come back
+    dp = FakeDatapath(2)
+    app.state_change_handler(ofp_event.EventOFPStateChange(dps[1]))
+    app.switch_features_handler(ofp_event.EventOFPSwitchFeatures(parser.OFPSwitchFeatures(dp)))
+    hub.sleep(0.05)
+    flows = [f for f in dp.of_type(parser.OFPFlowMod) if f.priority == 1]
+    expect(sorted((f.match["in_port"], f.match["eth_dst"]) for f in flows)
+           == [(other_port, "00:00:00:00:00:02"), (qos_port, host1)], "reconnect re-installs learned flows")
+    bands = [m.bands[0].rate for m in dp.of_type(parser.OFPMeterMod)]
+    expect(bands[-1:] == [2500], f"reconnect re-asserts the last rate {bands}")
+
+    # Statistics: one port and one flow request per switch and poll
+    app.poll_stats()
+    for dp in (dps[0], dp):
+        expect([type(m).__name__ for m in dp.sent[-2:]] == ["OFPPortStatsRequest", "OFPFlowStatsRequest"]
+               and dp.sent[-2].port_no == ofproto.OFPP_ANY, f"datapath {dp.id} polled for port and flow stats")
+
+    # The policed port runs at 95% of 2500 kbps and its flows forward all of it: headroom grows
+    link = app.links.default
+    link.policy = link.policy.replace(up_delay=0)
+    dp = dps[0]
+    busy = 2500 * 1000 // 8 * 95 // 100  # bytes per second
+
+    def stats(now, rx_bytes, forwarded, tx_dropped=0):
+        """One poll: the port reply, then the flow reply for a flow installed at t=100."""
+        app.update_port_stats(dp.id, [dp.port_stats(qos_port, rx_bytes=rx_bytes),
+                                      dp.port_stats(other_port, tx_bytes=forwarded, tx_dropped=tx_dropped)], now)
+        app.update_flow_stats(dp.id, [dp.flow_stats(qos_port, host1, forwarded, now - 100.0)], now)
+        hub.sleep(0.05)
+        return dp.of_type(parser.OFPMeterMod)[-1].bands[0].rate
+
+    stats(100.0, 0, 0)
+    expect(link.headroom == 1.0 and link.measured_bps is None, "first reply is only a baseline")
+    rate = stats(101.0, busy, busy)
+    expect(abs(link.measured_bps - busy * 8) < 1 and link.lost_bps == 0 and link.headroom == 1.05,
+           f"measured {link.measured_bps:.0f} bps, headroom {link.headroom}")
+    expect(rate == 2625, f"rate raised by the headroom: {rate} kbps")
+    rate = stats(102.0, 2 * busy, 2 * busy, tx_dropped=10)
+    expect(link.headroom == 1.0 and rate == 2500, f"transmit drops reset the headroom: {rate} kbps")
+    stats(103.0, 3 * busy, 3 * busy)
+    expect(link.headroom == 1.05, "loss-free forwarding raises it again")
+    # Saturated, but a tenth of what arrives never reaches a flow: the policer is dropping it
+    rate = stats(104.0, 4 * busy, 3 * busy + busy * 9 // 10)
+    expect(abs(link.lost_bps - (busy - busy * 9 // 10) * 8) < 1 and link.headroom == 1.0 and rate == 2500,
+           f"policer loss resets the headroom: {link.lost_bps:.0f} bps lost, {rate} kbps")
+    stats(105.0, 0, 4 * busy)
+    expect(app.traffic.ports.resets == 2 and app.traffic.port_rate(dp.id, qos_port) is None,
+           "counters going backwards restart the baseline")
+    stats(106.0, busy // 2, 4 * busy + busy // 2)
+    expect(link.headroom == 1.0, "an under-used link gets no headroom")
+    expect(abs(link.measured_bps - busy // 2 * 8) < 1, f"measured {link.measured_bps:.0f} bps after the reset")
+
+    # Flow rates come from the switch's flow durations, not from when the replies arrive
+    host2, host3 = "00:00:00:00:00:02", "00:00:00:00:00:03"
+    app.flow_stats_reply_handler(dp.flow_stats_reply(dp.flow_stats(qos_port, host2, 0, 10.0)))
+    app.flow_stats_reply_handler(dp.flow_stats_reply(dp.flow_stats(qos_port, host2, 500000, 11.0)))
+    summary = app.traffic.summary()
+    expect(summary["flows"] == 1 and summary["top_flow_bps"] == 4000000,
+           f"500 kB over one second of flow duration is 4 Mbps: {summary}")
+    # A reply in two parts is handled once, when the last part arrives: host 2's flow is not pruned
+    # by the second part, and the new flow there is only a baseline
+    app.flow_stats_reply_handler(dp.flow_stats_reply(dp.flow_stats(qos_port, host2, 1000000, 12.0), more=True))
+    app.flow_stats_reply_handler(dp.flow_stats_reply(dp.flow_stats(other_port, host1, 0, 12.0)))
+    summary = app.traffic.summary()
+    expect(summary["flows"] == 1 and summary["top_flow_bps"] == 4000000 and dp.id not in app.flow_parts,
+           f"multipart reply: {summary}")
+
+    # Hot-path metrics, scraped the way Prometheus would
+    from urllib.request import urlopen
+    metrics = app.metrics
+    expect(metrics.packet_in.count == 6, f"{metrics.packet_in.count} packet-ins timed")
+    expect(metrics.changes.value >= 2 and metrics.changes.value <= metrics.apply.count,
+           f"{metrics.changes.value} rate changes, {metrics.holds.value} holds, {metrics.apply.count} applies timed")
+    server = app.serve_metrics(0)
+    try:
+        text = urlopen(f"http://127.0.0.1:{server.server.getsockname()[1]}/metrics", timeout=5).read().decode()
+    finally:
+        server.server.close()
+    expect(f'sdr_link_rate_kbps{{controller="osken",iface="{qos_app.OVS_INTERFACE}",link="{link.link_id}"}} '
+           f'{link.last_kbps}' in text and 'sdr_packet_in_seconds_count{controller="osken"} 6' in text
+           and f'sdr_qos_samples_total{{controller="osken",outcome="received"}} {app.qos_pipeline.received}' in text,
+           f"/metrics serves {len(text.splitlines())} lines in Prometheus text format")
+
+    # MACs age by the flows still on the switch: host 2 only receives through its flow,
+    # host 3 only sends (no flow to it), and only host 3 is forgotten
+    table = app.mac_to_port.table(dp.id)
+    app._packet_in_handler(ofp_event.EventOFPPacketIn(dp.packet_in(other_port, host3, host2)))
+    learned = time.monotonic()
+    hub.sleep(1.1)
+    app.flow_stats_reply_handler(dp.flow_stats_reply(dp.flow_stats(other_port, host2, 0, 1.0)))
+    expired = table.expire(int(learned) + qos_app.MAC_MAX_AGE + 0.5)
+    expect(expired == [host3] and table.lookup(host2) == qos_port,
+           f"a host with a flow on the switch outlives mac_max_age without packet-ins (expired {expired})")
+
+    # A disconnected switch is no longer polled and its counters are dropped
+    app.state_change_handler(ofp_event.EventOFPStateChange(dp))
+    expect(dp.id not in app.datapaths and app.traffic.port_rate(dp.id, qos_port) is None,
+           "disconnect stops polling and forgets the switch's counters")
+
+    print("PASS" if not failures else f"FAIL ({len(failures)})")
+    return 1 if failures else 0
+
+
+FAKE_VSCTL = """#!/bin/bash
+# Stand-in ovs-vsctl: log the arguments, print a UUID per created record like the real one
+echo "$*" >> "$SDR_FAKE_VSCTL_LOG"
+[ -e "$SDR_FAKE_VSCTL_LOG.fail" ] && exit 1
+for arg in "$@"; do
+    [ "$arg" = create ] && cat /proc/sys/kernel/random/uuid
+done
+exit 0
+"""
+
+
+def check_queues():
+    """Drive qos_app in queue mode (htb backend) with a fake ovs-vsctl and verify flows and queues."""
+    workdir = tempfile.mkdtemp(prefix="sdr-queues-")
+    vsctl = os.path.join(workdir, "ovs-vsctl")
+    with open(vsctl, "w") as f:
+        f.write(FAKE_VSCTL)
+    os.chmod(vsctl, 0o755)
+    log = os.path.join(workdir, "vsctl.log")
+    os.environ["PATH"] = workdir + os.pathsep + os.environ.get("PATH", "")
+    os.environ["SDR_FAKE_VSCTL_LOG"] = log
+    os.environ["SDR_QOS_BACKEND"] = "htb"
+    for name, value in (("SDR_FEEDBACK", ""), ("SDR_STATS_INTERVAL", "0"), ("SDR_METRICS_PORT", "0"),
+                        ("SDR_UP_DELAY", "0")):
+        os.environ.setdefault(name, value)
+    from os_ken.controller import ofp_event
+    import qos_app
+
+    app = qos_app.SDRQoSOrchestrator()
+    ofproto = ofproto_v1_3
+    dp = FakeDatapath(1)
+    parser = dp.ofproto_parser
+    egress = dp.ports[qos_app.OVS_INTERFACE]  # the link's port: queued
+    other = next(no for no in dp.ports.values() if no != egress)
+    sender, receiver = "00:00:00:00:00:01", "00:00:00:00:00:02"
+
+    failures = []
+
+    def expect(cond, what):
+        print(f"  [{'ok' if cond else 'FAIL'}] {what}")
+        if not cond:
+            failures.append(what)
+
+    def flows_to(dst):
+        return [m for m in dp.of_type(parser.OFPFlowMod) if m.match.get("eth_dst") == dst]
+
+    def calls():
+        with open(log) as f:
+            return f.read().splitlines()
+
+    app.switch_features_handler(ofp_event.EventOFPSwitchFeatures(parser.OFPSwitchFeatures(dp)))
+    app.port_desc_stats_reply_handler(ofp_event.EventOFPPortDescStatsReply(dp.port_desc_reply()))
+    for msg in (dp.packet_in(egress, receiver, "ff:ff:ff:ff:ff:ff"),
+                dp.packet_in(other, sender, receiver),
+                dp.packet_in(egress, receiver, sender)):
+        app._packet_in_handler(ofp_event.EventOFPPacketIn(msg))
+
+    # Towards the queued port: L2 flow into queue 0 plus one flow per class rule
+    flows = flows_to(receiver)
+    queue_of = lambda m: [a.queue_id for a in m.instructions[0].actions if isinstance(a, parser.OFPActionSetQueue)]
+    base = [m for m in flows if m.priority == 1]
+    rules = [m for m in flows if m.priority == 2]
+    expect(len(base) == 1 and queue_of(base[0]) == [0] and base[0].flags & ofproto.OFPFF_SEND_FLOW_REM,
+           "flow to the queued port goes to queue 0 and reports its removal")
+    expect(len(rules) == len(app.queue_plan.rules)
+           and all(queue_of(m) == [1] and m.flags & ofproto.OFPFF_SEND_FLOW_REM and m.match.get("in_port") == other
+                   for m in rules),
+           f"{len(rules)} class flows steer into queue 1 and report their removal")
+    expect(any(m.match.get("udp_dst") == 1234 and m.match.get("ip_proto") == 17 for m in rules)
+           and any(m.match.get("ip_dscp") == 34 for m in rules), "class flows match UDP 1234 and DSCP 34")
+    expect(all(queue_of(m) == [] for m in flows_to(sender)), "flows to the other port are not queued")
+
+    # First rate creates QoS and queues in one call, later rates resize them in one call
+    app.enforce_qos(8000000.0)
+    first = calls()
+    app.enforce_qos(2500000.0)
+    second = calls()[len(first):]
+    expect(len(first) == 1 and "type=linux-htb" in first[0] and first[0].count("create queue") == 2
+           and "other-config:max-rate=8000000" in first[0] and "ingress_policing_rate=0" in first[0],
+           "first update creates a linux-htb QoS with 2 queues and turns policing off")
+    qos_uuid, queues = app.qos_backend.records[qos_app.OVS_INTERFACE]
+    expect(len(second) == 1 and f"set qos {qos_uuid} other-config:max-rate=2500000" in second[0]
+           and all(f"set queue {uuid}" in second[0] for uuid in queues.values()),
+           "a shrinking rate resizes QoS and both queues in one call")
+    expect(f"set queue {queues[1]} other-config:min-rate=2000000" in second[0]
+           and f"set queue {queues[0]} other-config:min-rate=500000" in second[0],
+           "video keeps 80% of 2.5 Mbps guaranteed, the default class the rest")
+
+    # OVS lost the records: the failed update is retried as a create
+    open(log + ".fail", "w").close()
+    app.enforce_qos(1500000.0)
+    os.remove(log + ".fail")
+    expect(qos_app.OVS_INTERFACE not in app.qos_backend.records and app.links.default.failures == 1,
+           "a failed resize forgets the QoS records")
+    app.enforce_qos(1000000.0)
+    expect("create qos" in calls()[-1] and "other-config:max-rate=1000000" in calls()[-1],
+           "the next update creates them again")
+
+    # A reconnecting switch gets the queue flows back
+    dp.sent = []
+    app.switch_features_handler(ofp_event.EventOFPSwitchFeatures(parser.OFPSwitchFeatures(dp)))
+    flows = flows_to(receiver)
+    expect(sum(1 for m in flows if queue_of(m) == [1]) == len(app.queue_plan.rules)
+           and sum(1 for m in flows if queue_of(m) == [0]) == 1, "reinstalled flows keep their queues")
+
+    # The queue 0 flow of a video-only host idles out first: the host stays until its class flows go too
+    def remove(cookie):
+        removed = parser.OFPFlowRemoved(dp, cookie=cookie, priority=2 if cookie else 1,
+                                        reason=ofproto.OFPRR_IDLE_TIMEOUT, table_id=0, duration_sec=0,
+                                        duration_nsec=0, idle_timeout=qos_app.FLOW_IDLE_TIMEOUT, hard_timeout=0,
+                                        packet_count=0, byte_count=0,
+                                        match=parser.OFPMatch(in_port=other, eth_dst=receiver))
+        app.flow_removed_handler(ofp_event.EventOFPFlowRemoved(removed))
+
+    remove(0)
+    expect(app.mac_to_port.table(dp.id).lookup(receiver) == egress and (dp.id, receiver) in app.flow_ports,
+           "queue 0 flow expiring while class flows carry the video keeps the host")
+    for cookie in range(1, len(app.queue_plan.rules) + 1):
+        remove(cookie)
+    expect(app.mac_to_port.table(dp.id).lookup(receiver) is None and (dp.id, receiver) not in app.flow_ports,
+           "the host is forgotten once its last class flow expires")
+
+    print("PASS" if not failures else f"FAIL ({len(failures)})")
+    return 1 if failures else 0
+
+
+###########################################################################
+# Latency comparison
+###########################################################################
+
+def bench(updates=2000, switches=1, vsctl=None, vsctl_updates=200):
+    backend = MeterBackend()
+    for dpid in range(1, switches + 1):
+        backend.add_datapath(FakeDatapath(dpid, channel=control_channel()))
+    for i in range(updates):
+        backend.set_policing("s1-eth2", 1000 + i % 5000, 100 + i % 500)
+    print(f"meter ({switches} switch(es), {updates} updates): {backend.latency}")
+
+    if vsctl is None:
+        vsctl = "ovs-vsctl" if shutil.which("ovs-vsctl") else "true"
+    if vsctl != "ovs-vsctl":
+        print(f"ovs-vsctl not used, spawning {vsctl!r} (process cost only)")
+    baseline = VsctlBackend(vsctl)
+    for i in range(vsctl_updates):
+        baseline.set_policing("s1-eth2", 1000 + i, 100)
+    print(f"vsctl ({vsctl_updates} updates): {baseline.latency}")
+
+    if backend.latency.count and baseline.latency.count:
+        speedup = baseline.latency.percentile(50) / max(backend.latency.percentile(50), 1e-9)
+        print(f"median speedup: {speedup:.0f}x")
+    return 0
+
+
+def main():
+    parser = ArgumentParser(description="Fake OpenFlow 1.3 datapath harness for qos_app.py")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("check")
+    sub.add_parser("queues")
+    p = sub.add_parser("bench")
+    p.add_argument("--updates", type=int, default=2000)
+    p.add_argument("--switches", type=int, default=1)
+    p.add_argument("--vsctl", help="ovs-vsctl (or stand-in) to compare against")
+    p.add_argument("--vsctl-updates", type=int, default=200)
+
+    args = parser.parse_args()
+    if args.command == "check":
+        return check()
+    if args.command == "queues":
+        return check_queues()
+    return bench(args.updates, args.switches, args.vsctl, args.vsctl_updates)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
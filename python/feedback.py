@@ -0,0 +1,74 @@
+"""
+Enforced-rate feedback channel: controller -> sender-side encoder agent.
+
+Every rate a controller enforces on a link is published as a
+telemetry_codec frame on topic ENFORCED (rate = policed bps, link = link
+id, seq increments per message). The current rate of every link is also
+re-published periodically, so an agent that (re)connects learns it
+without waiting for the next change.
+
+The controller binds; agents connect. By default it binds only the
+ipc:// endpoint: a file, so it is reachable from inside Mininet hosts
+(separate network namespaces) without routing to the controller, and from
+nothing off the machine. Agents on other machines need a TCP endpoint
+added explicitly (e.g. tcp://127.0.0.1:5556 behind a tunnel, or an
+interface address); nothing is published on all interfaces unless asked.
+"""
+import threading
+
+import zmq
+
+import telemetry_codec
+
+TOPIC = b"ENFORCED"
+DEFAULT_BIND = "ipc:///tmp/sdr_feedback"
+DEFAULT_CONNECT = "ipc:///tmp/sdr_feedback"
+# Seconds between re-publications of every link's current rate
+REPUBLISH_INTERVAL = 1.0
+
+
+class FeedbackPublisher(object):
+    """
+    Args:
+        endpoints: Comma-separated endpoints to bind
+        context: zmq (or eventlet.green.zmq) Context to create the socket from
+    """
+
+    def __init__(self, endpoints=DEFAULT_BIND, context=None):
+        self.context = context or zmq.Context.instance()
+        self.socket = self.context.socket(zmq.PUB)
+        self.socket.setsockopt(zmq.SNDHWM, 1000)
+        for endpoint in endpoints.split(","):
+            self.socket.bind(endpoint.strip())
+        self.endpoints = endpoints
+        self.lock = threading.Lock()  # QoS workers publish from several threads
+        self.seq = 0
+        self.sent = 0
+
+    def publish(self, link_id, rate_kbps):
+        with self.lock:
+            self.seq += 1
+            self.socket.send_multipart(telemetry_codec.message(rate_kbps * 1000.0, self.seq, link_id, topic=TOPIC))
+            self.sent += 1
+
+    def publish_all(self, links):
+        """Current rate of every link that has one, in one frame."""
+        current = [(link.link_id, link.last_kbps) for link in links if link.last_kbps is not None]
+        if not current:
+            return
+        ids, kbps = zip(*current)
+        with self.lock:
+            self.seq += 1
+            payload = telemetry_codec.encode([k * 1000.0 for k in kbps], self.seq, list(ids))
+            self.socket.send_multipart([TOPIC, payload])
+            self.sent += 1
+
+    def close(self):
+        self.socket.close(linger=0)
+
+
+def decode(parts):
+    """{link id: (enforced bps, seq)} from one feedback message; raises telemetry_codec.CodecError."""
+    records = telemetry_codec.decode(parts, topic=TOPIC)
+    return {int(link): (float(rate), int(seq))
+            for link, rate, seq in zip(records["link"], records["rate"], records["seq"])}
@@ -0,0 +1,149 @@
+"""
+L2 learning logic for the controllers, kept free of OpenFlow types so it
+can be driven by a synthetic benchmark (bench_forwarding.py).
+
+Modes:
+  - "reactive":  the original behaviour; an exact (src, dst) flow is
+    installed only when a packet-in is for an already learned destination,
+    so every new host pair goes through the controller.
+  - "proactive": as soon as a MAC is learned (or moves), a per-destination
+    flow for it is installed on its switch, and all known hosts are
+    re-installed when a switch (re)connects. Only the first packet from an
+    unknown host, or to one, reaches the controller.
+
+Flows are returned as plain tuples that the controller turns into
+flow-mods (with an idle timeout, reported back through flow_removed()):
+    ("dst", mac, out_port)            match dl_dst
+    ("pair", src, dst, out_port)      match dl_src + dl_dst
+
+Learned MACs live in bounded, aging MacTables (see mac_table.py). Flows
+still on a switch keep their MACs from aging (flows_active()).
+"""
+import json
+import time
+
+from mac_table import MacTables
+
+FLOOD = None
+MODES = ("reactive", "proactive")
+
+
+class RateCounter(object):
+    """Monotonic event counter that also reports the rate since the last call to rate()."""
+
+    def __init__(self):
+        self.count = 0
+        self._last_count = 0
+        self._last_time = time.monotonic()
+
+    def add(self, n=1):
+        self.count += n
+
+    def rate(self):
+        now = time.monotonic()
+        elapsed = now - self._last_time
+        rate = (self.count - self._last_count) / elapsed if elapsed > 0 else 0.0
+        self._last_count, self._last_time = self.count, now
+        return rate
+
+
+class L2Forwarding(object):
+    """
+    Args:
+        mode: "proactive" or "reactive" (see module docstring)
+        hosts: Initial {dpid: {mac: port}} installed on ConnectionUp
+        capacity: Maximum MACs remembered per datapath (0 = unbounded)
+        max_age: Seconds before a MAC that was not heard from is forgotten (0 = never)
+        compact: Store MACs as ints (less memory with many hosts)
+    """
+
+    def __init__(self, mode="proactive", hosts=None, capacity=100000, max_age=0, compact=False):
+        if mode not in MODES:
+            raise ValueError(f"Unknown forwarding mode {mode!r}, expected one of {MODES}")
+        self.mode = mode
+        self.mac_to_port = MacTables(capacity, max_age, compact)
+        for dpid, hosts_on_dp in (hosts or {}).items():
+            table = self.mac_to_port.table(dpid)
+            for mac, port in hosts_on_dp.items():
+                table.learn(mac, port)
+        self.packet_ins = RateCounter()
+        self.flow_mods = RateCounter()
+        self.flows_removed = RateCounter()
+
+    def connection_up(self, dpid):
+        """Flows to push to a switch that just connected (proactive mode only)."""
+        table = self.mac_to_port.table(dpid)
+        if self.mode != "proactive":
+            return []
+        table.expire()
+        flows = [("dst", mac, port) for mac, port in table.items()]
+        self.flow_mods.add(len(flows))
+        return flows
+
+    def packet_in(self, dpid, in_port, src, dst):
+        """
+        Learn `src` and decide where the packet goes.
+
+        Returns (out_port, flows): out_port is FLOOD (None) for an unknown
+        destination, flows are the flow tuples to install on `dpid`.
+        """
+        self.packet_ins.add()
+        table = self.mac_to_port.table(dpid)
+        flows = []
+
+        if table.learn(src, in_port) and self.mode == "proactive":
+            # New or moved: traffic to src no longer needs the controller, from any port
+            flows.append(("dst", src, in_port))
+
+        out_port = table.lookup(dst)
+        if out_port is not FLOOD and self.mode == "reactive":
+            flows.append(("pair", src, dst, out_port))
+        # Proactive: the dst flow exists already; this packet raced its install
+
+        self.flow_mods.add(len(flows))
+        return out_port, flows
+
+    def flow_removed(self, dpid, src, dst):
+        """
+        A flow expired on the switch. For a per-destination flow the host
+        has gone quiet, so it is forgotten and re-learned (and its flow
+        re-installed) on its next packet-in. Returns True if a MAC was dropped.
+        """
+        self.flows_removed.add()
+        if src is None and dst is not None:
+            return self.mac_to_port.table(dpid).remove(dst) is not None
+        return False
+
+    def flows_active(self, dpid, macs):
+        """
+        `macs` have flows still installed on `dpid` (from a flow stats
+        reply): traffic reached them within the idle timeout, so they do not
+        age out even though it never comes to the controller.
+        """
+        table = self.mac_to_port.table(dpid)
+        now = time.monotonic()
+        for mac in macs:
+            table.refresh(mac, now)
+
+    def expire(self):
+        """Age out MACs on all datapaths; {dpid: [macs]}."""
+        return self.mac_to_port.expire()
+
+    def stats(self):
+        """Counters and rates (per second since the previous call)."""
+        return {
+            "hosts": len(self.mac_to_port),
+            "packet_ins": self.packet_ins.count,
+            "flow_mods": self.flow_mods.count,
+            "flows_removed": self.flows_removed.count,
+            "packet_in_rate": self.packet_ins.rate(),
+            "flow_mod_rate": self.flow_mods.rate(),
+        }
+
+
+def load_hosts(path):
+    """{"<dpid>": {"<mac>": port}} JSON file -> {dpid: {mac: port}}."""
+    with open(path) as f:
+        config = json.load(f)
+    return {int(dpid, 0) if isinstance(dpid, str) else dpid: {mac.lower(): int(port) for mac, port in table.items()}
+            for dpid, table in config.items()}
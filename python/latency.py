@@ -0,0 +1,56 @@
+"""
+Lightweight latency bookkeeping shared by the controllers and tools.
+"""
+import threading
+
+
+class LatencyStats(object):
+    """
+    Running latency statistics with a fixed-size window for percentiles.
+
+    Args:
+        window: Number of most recent samples kept for percentiles
+    """
+
+    def __init__(self, window=1024):
+        self.window = window
+        self.samples = [0.0] * window
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.lock = threading.Lock()
+
+    def record(self, seconds):
+        with self.lock:
+            self.samples[self.count % self.window] = seconds
+            self.count += 1
+            self.total += seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def percentile(self, pct):
+        with self.lock:
+            n = min(self.count, self.window)
+            recent = sorted(self.samples[:n])
+        if not recent:
+            return 0.0
+        idx = min(n - 1, int(round(pct / 100.0 * (n - 1))))
+        return recent[idx]
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def summary(self):
+        """Dict of count/mean/p50/p99/max, all latencies in milliseconds."""
+        return {
+            "count": self.count,
+            "mean_ms": self.mean() * 1e3,
+            "p50_ms": self.percentile(50) * 1e3,
+            "p99_ms": self.percentile(99) * 1e3,
+            "max_ms": self.max * 1e3,
+        }
+
+    def __str__(self):
+        s = self.summary()
+        return (f"n={s['count']} mean={s['mean_ms']:.3f}ms p50={s['p50_ms']:.3f}ms "
+                f"p99={s['p99_ms']:.3f}ms max={s['max_ms']:.3f}ms")
@@ -0,0 +1,189 @@
+"""
+Registry of radio links and the switch ports their telemetry controls.
+
+A link is addressed by its telemetry topic (e.g. b'BITRATE.3') and/or the
+link id carried in telemetry_codec records. Both resolve through dicts,
+so the cost per message does not grow with the number of links. Legacy
+frames (topic b'BITRATE', link 0) resolve to the default link. A record
+for a link id that is not configured is counted in `unknown`, never
+applied to another link.
+
+Links file (JSON):
+
+    {"links": [
+        {"id": 1, "topic": "BITRATE.1", "iface": "s1-eth1", "dpid": 1, "port": 1},
+        {"id": 2, "topic": "BITRATE.2", "iface": "s2-eth1", "dpid": 2, "port": 1,
+         "min_kbps": 500, "max_kbps": 20000, "burst_ratio": 0.1,
+         "ladder": "geometric:500:20000:1.25", "hysteresis": 0.05, "up_delay": 2.0}
+    ]}
+
+`iface` is what the OVSDB/vsctl backends police; `dpid`/`port` is what
+OpenFlow-level QoS (meters) attaches to. A link without dpid matches
+that port on every switch. The first link in the file is the default.
+Any rate_policy option overrides the registry's policy for one link.
+"""
+import json
+
+import numpy as np
+
+import telemetry_codec
+from rate_policy import RatePolicy, RateState, parse_ladder
+
+# The plain policy; see rate_policy.py for ladders, hysteresis and dwell
+LinkPolicy = RatePolicy
+POLICY_OPTIONS = ("min_kbps", "max_kbps", "burst_ratio", "min_burst_kbps", "max_burst_kbps",
+                  "ladder", "hysteresis", "min_dwell", "up_delay", "down_delay")
+
+
+class Link(object):
+    """One radio link and the switch port it is enforced on."""
+
+    def __init__(self, link_id, iface, topic=None, dpid=None, port=None, policy=None):
+        self.link_id = link_id
+        self.iface = iface
+        self.topic = topic
+        self.dpid = dpid
+        self.port = port
+        self.policy = policy  # None: the registry's default policy
+        self.rate_state = RateState()
+
+        # Per-link state; only the pipeline worker owning this link writes it
+        self.last_kbps = None
+        self.last_bitrate = None  # telemetry rate behind last_kbps, re-asserted after a restart
+        self.last_seq = 0         # newest telemetry sequence number (written by the receiver)
+        self.reassert = False     # apply the next rate even if it equals last_kbps
+        self.updates = 0
+        self.failures = 0
+
+        # Written by the controller's port statistics handler (port_stats.py)
+        self.headroom = 1.0       # factor on the telemetry rate, > 1 once the path has proven spare capacity
+        self.measured_bps = None  # throughput entering the switch from the link's port
+        self.dropped_pps = None
+        self.forwarded_bps = None  # of that, what the flows entering from the port forwarded
+        self.lost_bps = None       # the rest: policer/meter drops (None if flows lack in_port)
+
+    def __repr__(self):
+        return f"Link({self.link_id}, {self.iface!r}, dpid={self.dpid}, port={self.port})"
+
+
+class LinkRegistry(object):
+    """
+    Args:
+        policy: Default LinkPolicy for links added without one
+    """
+
+    def __init__(self, policy=None):
+        self.policy = policy or LinkPolicy()
+        self.by_id = {}
+        self.by_topic = {}
+        self.by_port = {}   # (dpid or None, port) -> Link
+        self.by_iface = {}
+        self.default = None
+        self.unknown = 0    # records that matched no link
+
+    def __len__(self):
+        return len(self.by_id)
+
+    def __iter__(self):
+        return iter(self.by_id.values())
+
+    def add(self, link):
+        if link.link_id in self.by_id:
+            raise ValueError(f"Duplicate link id {link.link_id}")
+        if link.policy is None:
+            link.policy = self.policy
+        self.by_id[link.link_id] = link
+        if link.topic is not None:
+            self.by_topic[link.topic] = link
+        if link.port is not None:
+            self.by_port[(link.dpid, link.port)] = link
+        self.by_iface[link.iface] = link
+        if self.default is None:
+            self.default = link
+        return link
+
+    def get(self, link_id):
+        return self.by_id.get(link_id)
+
+    def for_port(self, dpid, port):
+        """Link enforced on `port` of switch `dpid`, or None."""
+        return self.by_port.get((dpid, port)) or self.by_port.get((None, port))
+
+    def for_iface(self, iface):
+        return self.by_iface.get(iface)
+
+    def resolve(self, topic, link_id=0):
+        """
+        A non-zero link id names its link, and matches nothing if no such
+        link is configured. Link 0 goes by the topic, then the default link
+        on b'BITRATE'.
+        """
+        if link_id:
+            return self.by_id.get(link_id)
+        link = self.by_topic.get(topic)
+        if link is None and topic == telemetry_codec.TOPIC:
+            link = self.default
+        return link
+
+    def latest(self, parts):
+        """
+        {Link: newest rate} for one received message. Raises
+        telemetry_codec.CodecError if the message cannot be decoded.
+        """
+        records = telemetry_codec.decode(parts)
+        topic = _topic(parts)
+        if len(records) == 0:
+            return {}
+        if len(records) == 1:
+            triples = [(int(records["link"][0]), float(records["rate"][0]), int(records["seq"][0]))]
+        else:
+            # Newest record per link id, without a Python loop over records
+            ids, first = np.unique(records["link"][::-1], return_index=True)
+            newest = records[len(records) - 1 - first]
+            triples = zip(ids.tolist(), newest["rate"].tolist(), newest["seq"].tolist())
+
+        out = {}
+        for link_id, rate, seq in triples:
+            link = self.resolve(topic, link_id)
+            if link is None:
+                self.unknown += 1
+            else:
+                out[link] = rate
+                link.last_seq = seq
+        return out
+
+
+def _topic(parts):
+    first = parts[0]
+    first = bytes(first.buffer if hasattr(first, "buffer") else first)
+    # Legacy single-frame strings carry the topic as the first word
+    return first.split(None, 1)[0] if len(parts) == 1 else first
+
+
+def single_link(iface, port=None, policy=None):
+    """Registry with one default link on topic BITRATE (the original setup)."""
+    registry = LinkRegistry(policy)
+    registry.add(Link(0, iface, telemetry_codec.TOPIC, port=port, policy=registry.policy))
+    return registry
+
+
+def load_links(path, policy=None):
+    """Build a LinkRegistry from a JSON links file (see module docstring)."""
+    with open(path) as f:
+        config = json.load(f)
+    registry = LinkRegistry(policy)
+    for entry in config["links"]:
+        dpid = entry.get("dpid")
+        if isinstance(dpid, str):
+            dpid = int(dpid, 0)
+        overrides = {k: entry[k] for k in POLICY_OPTIONS if k in entry}
+        if isinstance(overrides.get("ladder"), str):
+            overrides["ladder"] = parse_ladder(overrides["ladder"])
+        link_policy = registry.policy.replace(**overrides) if overrides else registry.policy
+        topic = entry.get("topic")
+        registry.add(Link(int(entry["id"]), entry["iface"],
+                          topic.encode() if topic is not None else None,
+                          dpid, entry.get("port"), link_policy))
+    if not len(registry):
+        raise ValueError(f"{path}: no links defined")
+    return registry
@@ -1,9 +1,36 @@
-import zmq
+"""
+ZMQ telemetry sniffer and stream analyzer.
+
+    python listen.py                                # print every message (debugging)
+    python listen.py --analyze --interval 5         # rolling statistics only
+    python listen.py --analyze --out capture        # ... and keep the decoded series
+
+The analyzer drains the socket in batches, decodes whole envelopes into
+NumPy record arrays (telemetry_codec) and keeps statistics per interval:
+message and record rate, inter-arrival gaps (sender timestamps where the
+frames carry them, receive times otherwise), a rate histogram, rate
+changes and sequence gaps per link. A SUB socket never slows a publisher
+down; if the analyzer falls behind, the publisher drops messages for it
+at the high-water mark and they show up as sequence gaps.
+
+--out writes one .npy file per column (recv_t, seq, ts, rate, link, flags)
+into a directory, appended as batches arrive; load_columns() memory-maps
+them back.
+"""
+import os
 import struct
-import binascii
+import sys
 import time
+import zmq
+import binascii
+from argparse import ArgumentParser
 
-def listen_to_port():
+import numpy as np
+
+import telemetry_codec
+from qos_pipeline import drain_socket
+
+def listen_to_port(target="tcp://127.0.0.1:5555"):
     print("=== ZMQ Sniffer for Port 5555 ===")
     
     # 1. Setup ZMQ Context
@@ -11,7 +38,6 @@ def listen_to_port():
     socket = ctx.socket(zmq.SUB)
     
     # 2. Connect (The 'Sink' binds, so we must connect)
-    target = "tcp://127.0.0.1:5555"
     print(f"Attempting to connect to {target}...")
     try:
         socket.connect(target)
@@ -28,21 +54,21 @@ def listen_to_port():
 
     while True:
         try:
-            # 4. Receive Data (Blocking wait)
-            data = socket.recv()
-            
-            # 5. Decode Logic
-            # Convert binary to hex string for debugging
-            hex_data = binascii.hexlify(data).decode('utf-8')
+            # 4. Receive Data (Blocking wait) - whole [Topic, Data] envelope
+            parts = socket.recv_multipart()
             
-            # Try to interpret as a Float (Standard for GNU Radio)
-            # '<f' = Little Endian Float (4 bytes)
-            decoded_val = "???"
-            if len(data) == 4:
-                decoded_val = f"{struct.unpack('<f', data)[0]:.2f}"
+            # 5. Decode Logic (telemetry frames and both legacy formats)
+            try:
+                records = telemetry_codec.decode(parts)
+            except telemetry_codec.CodecError as e:
+                # Not telemetry: show raw hex for debugging
+                hex_data = " | ".join(binascii.hexlify(p).decode('utf-8') for p in parts)
+                print(f"RECEIVED | {len(parts)} part(s) | Hex: [{hex_data}] | Undecoded: {e}")
+                continue
             
             # 6. Print clearly
-            print(f"RECEIVED | Length: {len(data)} bytes | Hex: [0x{hex_data}] | Float Value: {decoded_val}")
+            for rec in records:
+                print(f"RECEIVED | Link: {rec['link']} | Seq: {rec['seq']} | Rate: {rec['rate']:.2f} bps")
             
         except KeyboardInterrupt:
             print("\nStopping...")
@@ -50,5 +76,233 @@ def listen_to_port():
         except Exception as e:
             print(f"\nError receiving: {e}")
 
+
+###########################################################################
+# Analyzer
+###########################################################################
+
+COLUMNS = [("recv_t", "<f8")] + [(name, telemetry_codec.RECORD[name].str) for name in telemetry_codec.RECORD.names]
+
+
+class NpyAppender(object):
+    """
+    A .npy file that grows: a fixed-size header is rewritten with the
+    final length on flush/close, so the file loads with np.load at any time.
+    """
+
+    HEADER_SIZE = 128
+
+    def __init__(self, path, dtype):
+        self.f = open(path, "wb")
+        self.dtype = np.dtype(dtype)
+        self.count = 0
+        self._header()
+
+    def _header(self):
+        text = repr({"descr": np.lib.format.dtype_to_descr(self.dtype), "fortran_order": False,
+                     "shape": (self.count,)}).encode("latin1")
+        self.f.seek(0)
+        self.f.write(b"\x93NUMPY\x01\x00" + struct.pack("<H", self.HEADER_SIZE - 10)
+                     + text.ljust(self.HEADER_SIZE - 11) + b"\n")
+        self.f.seek(0, os.SEEK_END)
+
+    def append(self, values):
+        self.f.write(np.ascontiguousarray(values, dtype=self.dtype).tobytes())
+        self.count += len(values)
+
+    def flush(self):
+        self._header()
+        self.f.flush()
+
+    def close(self):
+        self.flush()
+        self.f.close()
+
+
+class ColumnWriter(object):
+    """Decoded records + receive time, one NpyAppender per column in `directory`."""
+
+    def __init__(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.columns = {name: NpyAppender(os.path.join(directory, f"{name}.npy"), dtype)
+                        for name, dtype in COLUMNS}
+
+    def write(self, recv_t, records):
+        self.columns["recv_t"].append(recv_t)
+        for name in telemetry_codec.RECORD.names:
+            self.columns[name].append(records[name])
+
+    def flush(self):
+        for column in self.columns.values():
+            column.flush()
+
+    def close(self):
+        for column in self.columns.values():
+            column.close()
+
+
+def load_columns(directory):
+    """{column: memory-mapped array} of a capture written with --out."""
+    return {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r") for name, _ in COLUMNS}
+
+
+class StreamStats(object):
+    """
+    Rolling statistics over decoded record batches.
+
+    Args:
+        hist_step: Rate histogram bin width (bps)
+        hist_max: Upper edge of the last regular bin; above goes to an overflow bin
+    """
+
+    def __init__(self, hist_step=1e6, hist_max=10e6):
+        self.edges = np.append(np.arange(0.0, hist_max + hist_step / 2, hist_step), np.inf)
+        self.hist = np.zeros(len(self.edges) - 1, dtype=np.int64)
+        self.messages = self.records = self.undecoded = 0
+        self.changes = self.seq_lost = self.seq_reordered = 0
+        self.last_rate = {}   # link -> last rate seen
+        self.last_seq = {}    # link -> last sequence number seen
+        self.last_t = None    # timestamp of the previous record, for gaps
+        self.gaps = []        # inter-arrival gap arrays since the last summary
+        self.interval_start = time.monotonic()
+        self.interval_messages = self.interval_records = 0
+
+    def add(self, messages, recv_t, records):
+        """One drained batch: `messages` envelopes decoded into `records`."""
+        self.messages += messages
+        self.interval_messages += messages
+        n = len(records)
+        if n == 0:
+            return
+        self.records += n
+        self.interval_records += n
+
+        # Sender timestamps where present, batch receive time otherwise
+        t = np.where(np.isnan(records["ts"]), recv_t, records["ts"])
+        if self.last_t is not None:
+            self.gaps.append(np.diff(t, prepend=self.last_t))
+        elif n > 1:
+            self.gaps.append(np.diff(t))
+        self.last_t = t[-1]
+
+        rates = records["rate"]
+        self.hist += np.histogram(rates, self.edges)[0]
+
+        links = records["link"]
+        for link in np.unique(links):
+            mask = links == link
+            link = int(link)
+            r = rates[mask]
+            prev = self.last_rate.get(link)
+            self.changes += int(np.count_nonzero(r[1:] != r[:-1])) + int(prev is not None and r[0] != prev)
+            self.last_rate[link] = r[-1]
+
+            # Legacy formats carry no sequence numbers (and no sender timestamp)
+            seq = records["seq"][mask & ~np.isnan(records["ts"])].astype(np.int64)
+            if not len(seq):
+                continue
+            if link in self.last_seq:
+                seq = np.insert(seq, 0, self.last_seq[link])
+            step = np.diff(seq)
+            self.seq_lost += int(np.sum(step[step > 1] - 1))
+            self.seq_reordered += int(np.count_nonzero(step <= 0))
+            self.last_seq[link] = max(int(seq[-1]), self.last_seq.get(link, 0))
+
+    def summary(self):
+        """One-line interval summary; resets the interval counters."""
+        now = time.monotonic()
+        elapsed = max(now - self.interval_start, 1e-9)
+        gaps = np.concatenate(self.gaps) if self.gaps else np.empty(0)
+        if len(gaps):
+            p50, p99, gmax = np.percentile(gaps, 50) * 1e3, np.percentile(gaps, 99) * 1e3, gaps.max() * 1e3
+            gap_text = f"gap p50 {p50:.3f} ms p99 {p99:.3f} ms max {gmax:.1f} ms"
+        else:
+            gap_text = "gap -"
+        line = (f"{self.interval_messages / elapsed:9.0f} msg/s {self.interval_records / elapsed:9.0f} rec/s | "
+                f"{gap_text} | links {len(self.last_rate)} changes {self.changes} | "
+                f"seq lost {self.seq_lost} reordered {self.seq_reordered} | undecoded {self.undecoded}")
+        self.gaps = []
+        self.interval_start = now
+        self.interval_messages = self.interval_records = 0
+        return line
+
+    def histogram(self):
+        """Non-empty histogram bins as 'lo-hi Mbps: pct%'."""
+        total = self.hist.sum()
+        if not total:
+            return "no records"
+        cells = []
+        for lo, hi, count in zip(self.edges[:-1], self.edges[1:], self.hist):
+            if count:
+                label = f"{lo / 1e6:g}-{hi / 1e6:g}" if np.isfinite(hi) else f">{lo / 1e6:g}"
+                cells.append(f"{label}: {100.0 * count / total:.1f}%")
+        return "rate Mbps " + "  ".join(cells)
+
+
+def analyze(target="tcp://127.0.0.1:5555", topic=telemetry_codec.TOPIC, interval=5.0, out=None,
+            duration=None, hist_step=1e6, hist_max=10e6, hwm=100000):
+    """Drain, decode and summarize the stream until Ctrl-C or `duration` seconds."""
+    ctx = zmq.Context()
+    socket = ctx.socket(zmq.SUB)
+    # Generous receive queue: bursts are absorbed here instead of dropped at the publisher
+    socket.setsockopt(zmq.RCVHWM, hwm)
+    socket.connect(target)
+    socket.setsockopt(zmq.SUBSCRIBE, topic)
+    writer = ColumnWriter(out) if out else None
+    stats = StreamStats(hist_step, hist_max)
+    print(f"=== Analyzing {topic.decode()} on {target} (summary every {interval:g} s) ===")
+
+    start = time.monotonic()
+    next_summary = start + interval
+    try:
+        while duration is None or time.monotonic() - start < duration:
+            # Small messages: copying beats zmq.Frame overhead
+            batch = drain_socket(socket, max_batch=10000, timeout_ms=100)
+            if batch:
+                recv_t = time.time()
+                records, undecoded = telemetry_codec.decode_batch(batch, topic)
+                stats.undecoded += undecoded
+                stats.add(len(batch), recv_t, records)
+                if writer is not None and len(records):
+                    writer.write(np.full(len(records), recv_t), records)
+            if time.monotonic() >= next_summary:
+                print(stats.summary())
+                next_summary += interval
+                if writer is not None:
+                    writer.flush()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(stats.summary())
+        print(stats.histogram())
+        print(f"Total: {stats.messages} messages, {stats.records} records")
+        if writer is not None:
+            writer.close()
+            print(f"Decoded series -> {out}/ ({', '.join(name for name, _ in COLUMNS)})")
+        socket.close(linger=0)
+        ctx.term()
+    return stats
+
+
+def main():
+    parser = ArgumentParser(description="ZMQ telemetry sniffer / stream analyzer")
+    parser.add_argument("--address", default="tcp://127.0.0.1:5555")
+    parser.add_argument("--analyze", action="store_true", help="Batch-decode and print rolling statistics")
+    parser.add_argument("--topic", default=telemetry_codec.TOPIC.decode(), help="Topic to analyze")
+    parser.add_argument("--interval", type=float, default=5.0, help="Seconds between summaries")
+    parser.add_argument("--duration", type=float, help="Stop after this many seconds")
+    parser.add_argument("--out", help="Directory for the decoded series (one .npy per column)")
+    parser.add_argument("--hist-step", type=float, default=1e6, help="Rate histogram bin width (bps)")
+    parser.add_argument("--hist-max", type=float, default=10e6, help="Rate histogram upper edge (bps)")
+    args = parser.parse_args()
+
+    if not args.analyze:
+        listen_to_port(args.address)
+        return 0
+    analyze(args.address, args.topic.encode(), args.interval, args.out, args.duration,
+            args.hist_step, args.hist_max)
+    return 0
+
 if __name__ == "__main__":
-    listen_to_port()
\ No newline at end of file
+    sys.exit(main())
@@ -0,0 +1,387 @@
+"""
+High-rate BITRATE telemetry load generator and controller probe.
+
+`run` starts N publisher processes behind an XSUB/XPUB proxy bound where
+the controllers expect GRC (tcp://*:5555). Messages are telemetry_codec
+frames carrying sequence number and send time, with the publisher id in
+the sequence number's top bits. All publishers send link 0, which a
+default single-link controller enforces; --link-per-publisher gives
+publisher i link id i + 1 instead, for a controller with a links file.
+--batch packs several samples per message and --legacy sends GRC-style
+raw float32 frames instead (e.g. for SDRListener.java).
+
+`probe` plays the switch: it serves a fake OVSDB for the controller to
+write to, listens to the same stream, and matches every applied QoS
+update back to the telemetry change that caused it. It also scrapes each
+controller's /metrics before and after, and compares the messages the
+controller received and the samples its QoS pipeline coalesced or applied
+with what the publishers sent.
+
+    # terminal 1
+    python loadgen.py probe --ovsdb tcp:127.0.0.1:6640 --duration 40
+    # terminal 2
+    ./pox.py pox_controller --ovsdb=tcp:127.0.0.1:6640
+    # terminal 3
+    python loadgen.py run --publishers 4 --rate 50000 --pattern sawtooth --duration 30
+"""
+import multiprocessing
+import re
+import sys
+import threading
+import time
+from argparse import ArgumentParser
+from urllib.request import urlopen
+
+import numpy as np
+import zmq
+
+import telemetry_codec
+from links import load_links
+from ovsdb import FakeOvsdbServer
+from qos_pipeline import drain_socket
+
+
+###########################################################################
+# Rate patterns (bps as a function of time in seconds)
+###########################################################################
+
+def make_pattern(name, low=1e6, high=10e6, period=5.0, step=100000.0, seed=0):
+    span = high - low
+    if name == "constant":
+        return lambda t: high
+    if name == "step":
+        return lambda t: high if int(t / period) % 2 == 0 else low
+    if name == "ramp":
+        return lambda t: low + span * min(t / period, 1.0)
+    if name == "sawtooth":
+        return lambda t: low + span * ((t / period) % 1.0)
+    if name == "random_walk":
+        rng = np.random.default_rng(seed)
+        state = {"rate": (low + high) / 2}
+
+        def walk(t):
+            state["rate"] = min(high, max(low, state["rate"] + step * rng.choice((-1, 1))))
+            return state["rate"]
+        return walk
+    raise ValueError(f"Unknown pattern {name!r}")
+
+
+PATTERNS = ("constant", "step", "ramp", "sawtooth", "random_walk")
+# Record seq = publisher id << PUBLISHER_SHIFT | sample number, so publishers sharing a link stay apart
+PUBLISHER_SHIFT = 40
+
+
+###########################################################################
+# Load generator
+###########################################################################
+
+def _publisher(pub_id, link, endpoint, rate_hz, duration, pattern_kwargs, batch, legacy, results):
+    ctx = zmq.Context()
+    socket = ctx.socket(zmq.PUB)
+    socket.setsockopt(zmq.SNDHWM, 1000000)
+    socket.connect(endpoint)
+    time.sleep(0.5)  # Let the proxy subscription propagate
+
+    pattern = make_pattern(**pattern_kwargs)
+    encoder = telemetry_codec.BatchEncoder(batch)
+    seq = 0
+    base = pub_id << PUBLISHER_SHIFT
+    start = time.perf_counter()
+    while True:
+        now = time.perf_counter() - start
+        if now >= duration:
+            break
+        # Send everything that is due; pacing is by count, not per-message sleeps
+        due = min(int(now * rate_hz) + 1, int(duration * rate_hz))
+        while seq < due:
+            rate = pattern(seq / rate_hz)
+            if legacy:
+                socket.send_multipart([telemetry_codec.TOPIC, telemetry_codec.encode_legacy(rate)])
+            elif batch == 1:
+                socket.send_multipart(telemetry_codec.message(rate, base + seq, link))
+            elif encoder.add(rate, base + seq, link):
+                socket.send_multipart([telemetry_codec.TOPIC, encoder.flush()])
+            seq += 1
+        if encoder.count:
+            socket.send_multipart([telemetry_codec.TOPIC, encoder.flush()])
+        wait = due / rate_hz - (time.perf_counter() - start)
+        if wait > 0.001:
+            time.sleep(wait)
+
+    elapsed = time.perf_counter() - start
+    socket.close(linger=2000)
+    ctx.term()
+    results.put((pub_id, seq, elapsed))
+
+
+def run_load(publishers=1, rate=1000.0, duration=10.0, bind="tcp://*:5555",
+             backend="tcp://127.0.0.1:5556", pattern="step", batch=1, legacy=False,
+             link_per_publisher=False, **pattern_kwargs):
+    """
+    Run `publishers` processes at `rate` samples/s each for `duration`
+    seconds, all on link 0 or, with link_per_publisher, publisher i on link i + 1.
+    """
+    ctx = zmq.Context()
+    xsub = ctx.socket(zmq.XSUB)
+    xsub.bind(backend)
+    xpub = ctx.socket(zmq.XPUB)
+    xpub.setsockopt(zmq.SNDHWM, 1000000)
+    xpub.bind(bind)
+    threading.Thread(target=_proxy, args=(xsub, xpub), daemon=True).start()
+
+    results = multiprocessing.Queue()
+    procs = []
+    for pub_id in range(publishers):
+        kwargs = dict(pattern_kwargs, name=pattern, seed=pattern_kwargs.get("seed", 0) + pub_id)
+        link = pub_id + 1 if link_per_publisher else 0
+        p = multiprocessing.Process(target=_publisher,
+                                    args=(pub_id, link, backend, rate, duration, kwargs, batch, legacy, results))
+        p.start()
+        procs.append(p)
+
+    print(f"{publishers} publisher(s) x {rate:.0f} msg/s, pattern={pattern}, on {bind}")
+    stats = sorted(results.get() for _ in procs)
+    for p in procs:
+        p.join()
+    total = 0
+    for pub_id, sent, elapsed in stats:
+        total += sent
+        print(f"  publisher {pub_id}: {sent} msgs in {elapsed:.2f} s ({sent / elapsed:.0f} msg/s)")
+    print(f"  total: {total} msgs")
+    return stats
+
+
+def _proxy(xsub, xpub):
+    try:
+        zmq.proxy(xsub, xpub)
+    except zmq.ContextTerminated:
+        pass
+
+
+###########################################################################
+# Probe
+###########################################################################
+
+_SAMPLE = re.compile(r'^(\w+)(?:\{(.*)\})? (\S+)$')
+_LABEL = re.compile(r'(\w+)="([^"]*)"')
+
+
+def scrape(url, timeout=2.0):
+    """{(controller, metric, outcome or None): value} from a /metrics endpoint; {} if unreachable."""
+    try:
+        text = urlopen(url, timeout=timeout).read().decode()
+    except OSError:
+        return {}
+    values = {}
+    for line in text.splitlines():
+        match = _SAMPLE.match(line)
+        if match is None:
+            continue
+        name, labels, value = match.groups()
+        labels = dict(_LABEL.findall(labels or ""))
+        key = (labels.get("controller"), name, labels.get("outcome"))
+        values[key] = values.get(key, 0.0) + float(value)
+    return values
+
+
+class Probe(object):
+    """
+    Observes the telemetry stream and a fake OVSDB written by a controller.
+
+    Args:
+        ovsdb_endpoint: Where the fake OVSDB listens (point the controller here)
+        stream: Telemetry endpoint to subscribe to
+        interfaces: Interface names the fake OVSDB knows
+        metrics: /metrics URLs of the controllers under test
+        links: The controller's links file, to tell which link an interface
+            enforces (None = the default single link on every interface)
+    """
+
+    def __init__(self, ovsdb_endpoint="tcp:127.0.0.1:6640", stream="tcp://127.0.0.1:5555",
+                 interfaces=("s1-eth1", "s1-eth2"), metrics=("http://127.0.0.1:9109/metrics",), links=None):
+        self.iface_links, self.default_link = {}, 0
+        if links is not None:
+            registry = load_links(links)
+            self.iface_links = {link.iface: link.link_id for link in registry}
+            self.default_link = registry.default.link_id
+            interfaces = tuple(interfaces) + tuple(i for i in self.iface_links if i not in interfaces)
+        self.server = FakeOvsdbServer(ovsdb_endpoint, interfaces)
+        self.stream = stream
+        self.metrics = list(metrics)
+        self.before, self.after = {}, {}  # url -> scrape()
+        self.received = 0
+        self.seqs = {}      # publisher -> (count, max seq)
+        self.messages = {}  # publisher -> messages seen
+        self.last_kbps = {}  # link -> last rate (kbps) sent on it
+        self.changes = {}    # link -> [(send time, rate kbps)], one entry per change of value
+
+    def run(self, duration):
+        self.server.start()
+        ctx = zmq.Context()
+        socket = ctx.socket(zmq.SUB)
+        socket.setsockopt(zmq.RCVHWM, 1000000)
+        socket.connect(self.stream)
+        socket.setsockopt(zmq.SUBSCRIBE, b"BITRATE")
+
+        print(f"Probe: fake OVSDB on {self.server.endpoint}, listening to {self.stream}")
+        self.before = {url: scrape(url) for url in self.metrics}
+        end = time.monotonic() + duration
+        while time.monotonic() < end:
+            for parts in drain_socket(socket, max_batch=10000, timeout_ms=100, copy=False):
+                try:
+                    records = telemetry_codec.decode(parts)
+                except telemetry_codec.CodecError:
+                    continue
+                if len(records):
+                    pub_id = int(records["seq"][0]) >> PUBLISHER_SHIFT
+                    self.messages[pub_id] = self.messages.get(pub_id, 0) + 1
+                for seq, sent_at, rate, link, _ in records.tolist():
+                    self.received += 1
+                    pub_id, seq = seq >> PUBLISHER_SHIFT, seq & ((1 << PUBLISHER_SHIFT) - 1)
+                    count, max_seq = self.seqs.get(pub_id, (0, -1))
+                    self.seqs[pub_id] = (count + 1, max(max_seq, seq))
+                    # Same rounding as the controllers; link 0 is the default link
+                    kbps = max(1, int(rate / 1000))
+                    link = link or self.default_link
+                    if kbps != self.last_kbps.get(link):
+                        self.changes.setdefault(link, []).append((sent_at, kbps))
+                        self.last_kbps[link] = kbps
+
+        self.after = {url: scrape(url) for url in self.metrics}
+        socket.close()
+        ctx.term()
+        self.server.stop()
+
+    def sent_messages(self):
+        """
+        Messages the publishers sent: those the probe saw, scaled up by the
+        samples it missed (a batch flushes early when a publisher waits, so
+        samples per message vary). Exact when the probe missed nothing.
+        """
+        sent = 0.0
+        for pub_id, (count, max_seq) in self.seqs.items():
+            sent += self.messages.get(pub_id, 0) * (max_seq + 1) / count
+        return int(round(sent))
+
+    def report(self):
+        """
+        Per-interface applied count, skipped changes and reaction latency.
+        An interface's updates are matched only against its own link's changes.
+        """
+        total = sum(len(changes) for changes in self.changes.values())
+        print(f"\nStream: {self.received} msgs received by probe, {total} rate changes on "
+              f"{len(self.changes)} link(s)")
+        for pub_id, (count, max_seq) in sorted(self.seqs.items()):
+            sent = max_seq + 1
+            print(f"  publisher {pub_id}: {count}/{sent} seen by probe ({sent - count} dropped before probe)")
+
+        by_rate = {}  # link -> {kbps: sorted send times}
+        for link, changes in self.changes.items():
+            rates = by_rate[link] = {}
+            for sent_at, kbps in changes:
+                rates.setdefault(kbps, []).append(sent_at)
+            for kbps, sends in rates.items():
+                rates[kbps] = np.sort(sends)
+
+        per_iface = {}
+        for ts, iface, row in self.server.transactions:
+            per_iface.setdefault(iface, []).append((ts, row.get("ingress_policing_rate")))
+
+        report = {}
+        for iface, txns in sorted(per_iface.items()):
+            link = self.iface_links.get(iface, self.default_link)
+            changes = self.changes.get(link, [])
+            latencies, matched = [], set()
+            for ts, kbps in txns:
+                sends = by_rate.get(link, {}).get(kbps)
+                if sends is None:
+                    continue
+                idx = np.searchsorted(sends, ts) - 1
+                if idx >= 0:
+                    latencies.append(ts - sends[idx])
+                    matched.add((kbps, idx))
+            lat = np.asarray(latencies) * 1e3
+            pct = np.percentile(lat, [50, 90, 99]) if len(lat) else [np.nan] * 3
+            report[iface] = {"link": link, "applied": len(txns), "skipped": len(changes) - len(matched),
+                             "p50_ms": pct[0], "p90_ms": pct[1], "p99_ms": pct[2]}
+            print(f"  {iface} (link {link}): applied={len(txns)} skipped_changes={len(changes) - len(matched)} "
+                  f"reaction p50={pct[0]:.2f}ms p90={pct[1]:.2f}ms p99={pct[2]:.2f}ms")
+            last = txns[-1][1]
+            final = changes[-1][1] if changes else None
+            print(f"    final rate {last} kbps ({'matches' if last == final else 'differs from'} last telemetry {final})")
+        if not per_iface:
+            print("  No QoS updates reached the fake OVSDB (is the controller pointed at it?)")
+        report.update(self.report_controllers())
+        return report
+
+    def report_controllers(self):
+        """Per controller: messages received and dropped against those sent, and what its pipeline did."""
+        sent = self.sent_messages()
+        report = {}
+        for url in self.metrics:
+            before, after = self.before.get(url, {}), self.after.get(url, {})
+            if not after:
+                print(f"  {url}: no metrics (is the controller's metrics port enabled?)")
+                continue
+            for controller in sorted({key[0] for key in after if key[0] is not None}):
+                def delta(name, outcome=None):
+                    key = (controller, name, outcome)
+                    return int(after.get(key, 0) - before.get(key, 0))
+                received = delta("sdr_zmq_messages_total")
+                undecodable = delta("sdr_zmq_undecodable_total")
+                samples = {o: delta("sdr_qos_samples_total", o) for o in ("received", "coalesced", "applied")}
+                report[controller] = dict(sent=sent, received=received, dropped=sent - received,
+                                          processed=received - undecodable, undecodable=undecodable,
+                                          samples=samples["received"], coalesced=samples["coalesced"],
+                                          applied=samples["applied"])
+                print(f"  {controller}: {received}/{sent} msgs received ({sent - received} dropped before the "
+                      f"controller, {undecodable} undecodable); QoS pipeline: {samples['received']} samples, "
+                      f"{samples['coalesced']} coalesced, {samples['applied']} applied")
+        return report
+
+
+def main():
+    parser = ArgumentParser(description="BITRATE load generator and controller probe")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("run")
+    p.add_argument("--publishers", type=int, default=1)
+    p.add_argument("--rate", type=float, default=1000.0, help="Samples per second per publisher")
+    p.add_argument("--duration", type=float, default=10.0)
+    p.add_argument("--pattern", choices=PATTERNS, default="step")
+    p.add_argument("--low", type=float, default=1e6, help="Low rate in bps")
+    p.add_argument("--high", type=float, default=10e6, help="High rate in bps")
+    p.add_argument("--period", type=float, default=5.0, help="Pattern period in seconds")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--batch", type=int, default=1, help="Samples per message")
+    p.add_argument("--legacy", action="store_true", help="Send raw float32 frames like GRC")
+    p.add_argument("--bind", default="tcp://*:5555")
+    p.add_argument("--link-per-publisher", action="store_true",
+                   help="Publisher i sends link id i + 1 (default: all send link 0, the default link)")
+
+    p = sub.add_parser("probe")
+    p.add_argument("--ovsdb", default="tcp:127.0.0.1:6640")
+    p.add_argument("--stream", default="tcp://127.0.0.1:5555")
+    p.add_argument("--duration", type=float, default=30.0)
+    p.add_argument("--metrics", default="http://127.0.0.1:9109/metrics",
+                   help="Comma-separated /metrics URLs of the controllers (empty = none)")
+    p.add_argument("--links", help="The controller's links file (default: one link on every interface)")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        run_load(args.publishers, args.rate, args.duration, args.bind, pattern=args.pattern,
+                 batch=args.batch, legacy=args.legacy, link_per_publisher=args.link_per_publisher,
+                 low=args.low, high=args.high, period=args.period, seed=args.seed)
+    else:
+        probe = Probe(args.ovsdb, args.stream, metrics=[url for url in args.metrics.split(",") if url],
+                      links=args.links)
+        try:
+            probe.run(args.duration)
+        except KeyboardInterrupt:
+            pass
+        probe.report()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
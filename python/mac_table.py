@@ -0,0 +1,269 @@
+"""
+Bounded MAC learning tables for the controllers.
+
+A MacTable maps MAC -> port for one datapath. It holds at most `capacity`
+entries, evicting those heard from least recently (LRU on learn), and
+forgets entries not heard from for `max_age` seconds. With compact=True
+MACs are stored as 48-bit ints instead of 'aa:bb:..' strings.
+
+The entries are a plain dict {mac: port} kept in last-learned order, so an
+entry costs what it does in a bare dict (ports are small cached ints) and
+a string-keyed lookup is one dict.get. Last-seen times are not stored per
+entry: with aging on, learn() puts a time mark in the dict at most once a
+second, and every entry after a mark was learned at its time or later.
+Expired entries are dropped in bulk by expire() and evictions come in
+batches, so dropping the oldest entries takes one scan from the front.
+
+`changes` counts additions, moves and removals (not refreshes), so a
+caller can tell whether the table is worth snapshotting again.
+"""
+import time
+
+import numpy as np
+
+# A full table evicts this fraction of its capacity at once
+EVICT_FRACTION = 1 / 64
+
+monotonic = time.monotonic
+
+
+def mac_to_int(mac):
+    """'aa:bb:cc:dd:ee:ff' (or EthAddr) -> 48-bit int."""
+    return int(str(mac).replace(":", "").replace("-", ""), 16)
+
+
+def int_to_mac(value):
+    return value.to_bytes(6, "big").hex(":")
+
+
+def macs_to_array(macs):
+    """['aa:bb:cc:dd:ee:ff', ...] -> uint64 array, parsed in one pass."""
+    raw = np.frombuffer(bytes.fromhex("".join(macs).replace(":", "")), dtype=np.uint8).reshape(-1, 6)
+    padded = np.zeros((len(raw), 8), dtype=np.uint8)
+    padded[:, 2:] = raw
+    return padded.view(">u8").ravel().astype(np.uint64)
+
+
+def array_to_macs(values):
+    """uint64 array -> ['aa:bb:cc:dd:ee:ff', ...]."""
+    raw = np.ascontiguousarray(values, dtype=">u8").view(np.uint8).reshape(-1, 8)[:, 2:]
+    return [row.tobytes().hex(":") for row in raw]
+
+
+class _Mark(object):
+    """Dict key opening the entries learned at `time` (whole seconds) or later."""
+
+    __slots__ = ("time",)
+
+    def __init__(self, time):
+        self.time = time
+
+
+class MacTable(object):
+    """
+    Args:
+        capacity: Maximum number of entries (0 = unbounded)
+        max_age: Seconds after which an unrefreshed entry expires (0 = never)
+        compact: Store MACs as ints
+    """
+
+    def __init__(self, capacity=100000, max_age=0, compact=False):
+        self.capacity = capacity
+        self.max_age = max_age
+        self.compact = compact
+        self.entries = {}  # key -> port, oldest first, with _Mark keys in between when aging
+        self.evictions = 0
+        self.expirations = 0
+        self.changes = 0
+        self._marks = 0      # _Mark keys in entries
+        self._second = None  # time of the newest mark
+        self._head = None    # time of the entries before the first mark
+        self._batch = max(1, int(capacity * EVICT_FRACTION))
+        if not compact:
+            # String keys need no conversion: a lookup is the dict's own get
+            self.lookup = self.entries.get
+
+    def _key(self, mac):
+        return mac_to_int(mac) if self.compact else mac
+
+    def _mac(self, key):
+        return int_to_mac(key) if self.compact else key
+
+    def __len__(self):
+        return len(self.entries) - self._marks
+
+    def __contains__(self, mac):
+        return self.lookup(mac) is not None
+
+    def _mark(self, now):
+        second = int(now)
+        if self._second is None or second > self._second:
+            self.entries[_Mark(second)] = None
+            self._marks += 1
+            self._second = second
+
+    def learn(self, mac, port, now=None):
+        """Record `mac` on `port`; returns True if it is new or moved."""
+        key = mac_to_int(mac) if self.compact else mac
+        entries = self.entries
+        old = entries.pop(key, None)
+        if self.max_age and int(monotonic() if now is None else now) != self._second:
+            self._mark(monotonic() if now is None else now)
+        entries[key] = port
+        if old is None:
+            if self.capacity and len(entries) - self._marks > self.capacity:
+                self.evictions += len(self._drop(count=self._batch))
+            self.changes += 1
+            return True
+        if old != port:
+            self.changes += 1
+            return True
+        return False
+
+    def refresh(self, mac, now=None):
+        """Count `mac` as heard from now without a packet-in; returns False if it is not known."""
+        key = mac_to_int(mac) if self.compact else mac
+        port = self.entries.pop(key, None)
+        if port is None:
+            return False
+        if self.max_age:
+            self._mark(monotonic() if now is None else now)
+        self.entries[key] = port
+        return True
+
+    def lookup(self, mac):
+        """Port for `mac`, or None if unknown. Does not refresh the entry."""
+        return self.entries.get(self._key(mac))
+
+    def remove(self, mac):
+        """Forget `mac`; returns its port or None."""
+        port = self.entries.pop(self._key(mac), None)
+        if port is not None:
+            self.changes += 1
+        return port
+
+    def _drop(self, count=0, before=None):
+        """
+        Drop the oldest entries: `count` of them, or all last learned
+        before time `before`; returns their keys.
+        """
+        dropped, marks = [], []
+        head = self._head
+        for key in self.entries:
+            if key.__class__ is _Mark:
+                if before is not None and key.time >= before:
+                    break
+                marks.append(key)
+                head = key.time
+                continue
+            if count and len(dropped) >= count:
+                break
+            if before is not None and head is not None and head >= before:
+                break
+            dropped.append(key)
+        for key in dropped:
+            del self.entries[key]
+        for key in marks:
+            del self.entries[key]
+        if marks:
+            self._marks -= len(marks)
+            self._head = head
+        return dropped
+
+    def expire(self, now=None):
+        """Drop every expired entry; returns their MACs."""
+        if not self.max_age:
+            return []
+        now = time.monotonic() if now is None else now
+        expired = [self._mac(key) for key in self._drop(before=now - self.max_age)]
+        self.expirations += len(expired)
+        self.changes += len(expired)
+        return expired
+
+    def items(self):
+        """(mac, port) pairs, oldest first."""
+        return [(self._mac(key), port) for key, port in self.entries.items() if key.__class__ is not _Mark]
+
+    def export(self, now=None):
+        """
+        Arrays (macs as uint64, ports, seconds since last seen) of every
+        entry, oldest first. Ages are to the whole second below, and 0
+        without aging.
+        """
+        now = time.monotonic() if now is None else now
+        n = len(self)
+        keys, ports = [], np.empty(n, dtype=np.uint32)
+        learned = np.full(n, now)
+        i, seen = 0, self._head
+        for key, port in self.entries.items():
+            if key.__class__ is _Mark:
+                seen = key.time
+                continue
+            keys.append(key)
+            ports[i] = port
+            if seen is not None:
+                learned[i] = seen
+            i += 1
+        macs = np.array(keys, dtype=np.uint64) if self.compact else macs_to_array(keys)
+        ages = np.maximum(now - learned, 0.0)
+        return macs, ports, ages.astype(np.float32)
+
+    def restore(self, macs, ports, ages, now=None):
+        """
+        Add exported entries (oldest first) as if they had been learned
+        `ages` seconds ago; returns how many were kept. Entries older than
+        max_age are skipped, the capacity bound still applies. Entries
+        restored after newer ones count as learned with those.
+        """
+        now = time.monotonic() if now is None else now
+        if self.max_age:
+            fresh = ages <= self.max_age
+            macs, ports, ages = macs[fresh], ports[fresh], ages[fresh]
+        keys = macs.tolist() if self.compact else array_to_macs(macs)
+        learned = np.floor(now - ages).tolist()
+        entries = self.entries
+        for key, port, seen in zip(keys, ports.tolist(), learned):
+            entries.pop(key, None)
+            if self.max_age:
+                self._mark(seen)
+            entries[key] = port
+        excess = len(self) - self.capacity if self.capacity else 0
+        if excess > 0:
+            self.evictions += len(self._drop(count=excess))
+        self.changes += len(keys)
+        return len(keys)
+
+
+class MacTables(object):
+    """One MacTable per datapath, created on first use with shared settings."""
+
+    def __init__(self, capacity=100000, max_age=0, compact=False):
+        self.capacity = capacity
+        self.max_age = max_age
+        self.compact = compact
+        self.tables = {}
+
+    def table(self, dpid):
+        table = self.tables.get(dpid)
+        if table is None:
+            table = self.tables[dpid] = MacTable(self.capacity, self.max_age, self.compact)
+        return table
+
+    def __len__(self):
+        return sum(len(t) for t in self.tables.values())
+
+    @property
+    def changes(self):
+        return sum(t.changes for t in self.tables.values())
+
+    def __iter__(self):
+        return iter(self.tables)
+
+    def expire(self, now=None):
+        """{dpid: [expired macs]} across all datapaths."""
+        out = {}
+        for dpid, table in self.tables.items():
+            expired = table.expire(now)
+            if expired:
+                out[dpid] = expired
+        return out
@@ -0,0 +1,317 @@
+"""
+Low-overhead metrics for the controllers, exported in Prometheus text format.
+
+Counters and histograms accumulate per thread (threading.local, green-
+thread local under eventlet), so the hot path takes no lock: an
+increment is a thread-local lookup and an add, an observation a
+thread-local lookup and a list append. Histograms sort observations into
+their fixed buckets in batches. Per-thread values are only summed when the
+endpoint is scraped. A gauge holds one value, set by whoever owns it; a
+CounterFunc reads a count some other object already keeps.
+
+    registry = Registry()
+    received = registry.counter("sdr_zmq_messages_total", "Telemetry messages received")
+    received.inc(len(batch))
+    serve(registry, 9109)   # http://127.0.0.1:9109/metrics
+
+bench_metrics.py measures the cost per event.
+"""
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+DEFAULT_PORT = 9109
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Seconds, 1 us .. 1 s: parse and policy decisions sit at the low end, ovs-vsctl at the top
+LATENCY_BUCKETS = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4,
+                   1e-3, 2.5e-3, 5e-3, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+# Observations a thread buffers before sorting them into the buckets
+FOLD = 1024
+
+
+def _label_text(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{str(v)}"' for k, v in sorted(labels.items())) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric(object):
+    kind = "untyped"
+
+    def __init__(self, name, help="", labels=None):
+        self.name = name
+        self.help = help
+        self.labels = dict(labels or {})
+
+
+class _Cells(object):
+    """Per-thread accumulation cells of one metric."""
+
+    def __init__(self, size, initial=0):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._size = size
+        self._initial = initial
+        self.cells = []
+
+    def new(self):
+        cell = [self._initial] * self._size
+        with self._lock:
+            self.cells.append(cell)
+        self._local.cell = cell
+        return cell
+
+    def total(self):
+        with self._lock:
+            cells = list(self.cells)
+        return [sum(column) for column in zip(*cells)] if cells else [self._initial] * self._size
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name, help="", labels=None):
+        super(Counter, self).__init__(name, help, labels)
+        self._cells = _Cells(1)
+        self._local = self._cells._local
+
+    def inc(self, n=1):
+        try:
+            self._local.cell[0] += n
+        except AttributeError:
+            self._cells.new()[0] += n
+
+    @property
+    def value(self):
+        return self._cells.total()[0]
+
+    def samples(self):
+        yield self.name, self.labels, self.value
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, name, help="", labels=None):
+        super(Gauge, self).__init__(name, help, labels)
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+    def samples(self):
+        yield self.name, self.labels, self.value
+
+
+class CounterFunc(Metric):
+    """A counter kept elsewhere (e.g. a plain int attribute), read when scraped."""
+
+    kind = "counter"
+
+    def __init__(self, name, help="", labels=None, read=None):
+        super(CounterFunc, self).__init__(name, help, labels)
+        self.read = read
+
+    @property
+    def value(self):
+        return self.read()
+
+    def samples(self):
+        yield self.name, self.labels, self.value
+
+
+class Histogram(Metric):
+    """
+    Observations are appended to a per-thread list and folded into the
+    bucket counts FOLD at a time with NumPy, by the observing thread; a
+    scrape adds whatever is not folded yet.
+
+    Args:
+        buckets: Upper bounds (inclusive); a +Inf bucket is added
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name, help="", labels=None, buckets=LATENCY_BUCKETS):
+        super(Histogram, self).__init__(name, help, labels)
+        self.bounds = np.array(sorted(buckets), dtype=float)
+        self._counts = np.zeros(len(self.bounds) + 1, dtype=np.int64)  # last = +Inf
+        self._sum = 0.0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._pending = []  # every thread's list of observations not folded yet
+
+    def observe(self, value):
+        try:
+            values = self._local.values
+        except AttributeError:
+            values = self._local.values = []
+            with self._lock:
+                self._pending.append(values)
+        values.append(value)
+        if len(values) >= FOLD:
+            self._fold(values)
+
+    def _fold(self, values):
+        with self._lock:
+            self._counts, self._sum = self._add(self._counts, self._sum, values)
+            del values[:]
+
+    def _add(self, counts, total, values):
+        observed = np.array(values, dtype=float)
+        counts = counts + np.bincount(np.searchsorted(self.bounds, observed), minlength=len(counts))
+        return counts, total + float(observed.sum())
+
+    def totals(self):
+        """(bucket counts with +Inf last, sum) including unfolded observations."""
+        with self._lock:
+            counts, total = self._counts, self._sum
+            for values in self._pending:
+                if values:
+                    counts, total = self._add(counts, total, list(values))
+        return counts, total
+
+    @property
+    def count(self):
+        return int(self.totals()[0].sum())
+
+    def samples(self):
+        counts, total = self.totals()
+        cumulative = np.cumsum(counts)
+        for bound, count in zip(self.bounds.tolist() + [float("inf")], cumulative.tolist()):
+            yield self.name + "_bucket", dict(self.labels, le=_number(bound)), count
+        yield self.name + "_sum", self.labels, total
+        yield self.name + "_count", self.labels, int(cumulative[-1])
+
+
+class Registry(object):
+    """Metrics by (name, labels); asking twice returns the same metric."""
+
+    def __init__(self):
+        self.metrics = {}
+
+    def _get(self, cls, name, help, labels, **kwargs):
+        key = (name, _label_text(labels))
+        metric = self.metrics.get(key)
+        if metric is None:
+            metric = self.metrics[key] = cls(name, help, labels, **kwargs)
+        elif not isinstance(metric, cls):
+            raise ValueError(f"{name} is already a {metric.kind}")
+        return metric
+
+    def counter(self, name, help="", labels=None):
+        return self._get(Counter, name, help, labels)
+
+    def gauge(self, name, help="", labels=None):
+        return self._get(Gauge, name, help, labels)
+
+    def histogram(self, name, help="", labels=None, buckets=LATENCY_BUCKETS):
+        return self._get(Histogram, name, help, labels, buckets=buckets)
+
+    def counter_func(self, name, help="", labels=None, read=None):
+        return self._get(CounterFunc, name, help, labels, read=read)
+
+    def expose(self):
+        """All metrics in Prometheus text format (0.0.4)."""
+        families = {}
+        for metric in list(self.metrics.values()):
+            families.setdefault(metric.name, []).append(metric)
+        lines = []
+        for name, metrics in families.items():
+            lines.append(f"# HELP {name} {metrics[0].help}")
+            lines.append(f"# TYPE {name} {metrics[0].kind}")
+            for metric in metrics:
+                for sample, labels, value in metric.samples():
+                    lines.append(f"{sample}{_label_text(labels)} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    registry = None
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = self.registry.expose().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(registry, port=DEFAULT_PORT, host="127.0.0.1"):
+    """Serve /metrics on a daemon thread; returns the server. Raises OSError if the port is taken."""
+    handler = type("MetricsHandler", (_Handler,), {"registry": registry})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
+
+
+def wsgi_app(registry):
+    """/metrics as a WSGI application, for servers on an event loop (OS-Ken's hub.WSGIServer)."""
+
+    def app(environ, start_response):
+        if environ.get("PATH_INFO", "/") not in ("/metrics", "/"):
+            start_response("404 Not Found", [("Content-Type", "text/plain")])
+            return [b"Not Found\n"]
+        body = registry.expose().encode()
+        start_response("200 OK", [("Content-Type", CONTENT_TYPE), ("Content-Length", str(len(body)))])
+        return [body]
+    return app
+
+
+class ControllerMetrics(object):
+    """
+    The instruments both controllers record, labelled with the controller name.
+
+    Args:
+        registry: Registry the metrics live in
+        controller: Value of the `controller` label ("pox", "osken")
+    """
+
+    def __init__(self, registry, controller):
+        labels = {"controller": controller}
+        self.registry = registry
+        self.labels = labels
+        self.zmq_messages = registry.counter("sdr_zmq_messages_total", "Telemetry messages received", labels)
+        self.zmq_batches = registry.counter("sdr_zmq_batches_total", "Socket drains that returned messages", labels)
+        self.undecodable = registry.counter("sdr_zmq_undecodable_total", "Telemetry messages that failed to decode",
+                                            labels)
+        self.parse = registry.histogram("sdr_parse_seconds", "Decode of one telemetry message", labels)
+        self.decide = registry.histogram("sdr_policy_decide_seconds", "Rate policy decision per sample", labels)
+        self.changes = registry.counter("sdr_policy_decisions_total", "Rate policy decisions",
+                                        dict(labels, outcome="change"))
+        self.holds = registry.counter("sdr_policy_decisions_total", "Rate policy decisions",
+                                      dict(labels, outcome="hold"))
+        self.apply = registry.histogram("sdr_qos_apply_seconds", "QoS backend update (OVSDB, ovs-vsctl or meter)",
+                                        labels)
+        self.apply_failures = registry.counter("sdr_qos_apply_failures_total", "Failed QoS backend updates", labels)
+        self.packet_in = registry.histogram("sdr_packet_in_seconds", "Packet-in handling", labels)
+        self.rates = {}  # link id -> Gauge
+
+    def watch_pipeline(self, pipeline):
+        """Export a (Sharded)QosPipeline's own sample counts, which cost nothing extra to keep."""
+        for outcome in ("received", "coalesced", "applied"):
+            self.registry.counter_func("sdr_qos_samples_total", "Rate samples handed to the QoS pipeline",
+                                       dict(self.labels, outcome=outcome),
+                                       lambda outcome=outcome: getattr(pipeline, outcome))
+
+    def link_rate(self, link, rate_kbps):
+        gauge = self.rates.get(link.link_id)
+        if gauge is None:
+            gauge = self.rates[link.link_id] = self.registry.gauge(
+                "sdr_link_rate_kbps", "Enforced policing rate", dict(self.labels, link=link.link_id, iface=link.iface))
+        gauge.set(rate_kbps)
@@ -0,0 +1,598 @@
+"""
+Discrete-event data-plane simulator: a Mininet/OVS stand-in for QoS policy evaluation.
+
+Each flow is one path of the real setup:
+
+    sender host --access link--> switch port (ingress policer) --> egress port (queue) --radio--> receiver
+
+- Sender hosts run a video-like source: one frame per 1/fps seconds, an
+  I-frame every `gop` frames `i_ratio` times the size of a P-frame, sizes
+  lognormally spread by `vbr`. A frame leaves the host as a back-to-back
+  packet train at the access link rate.
+- The ingress policer is a token bucket with the semantics of OVS
+  `ingress_policing_rate` / `ingress_policing_burst`: rate and bucket in
+  kb, a packet passes whole if the bucket holds its size and is dropped
+  otherwise, rate 0 turns policing off, burst 0 means 8000 kb.
+- The egress port sends at the radio link's capacity (a time-varying
+  trace) from a drop-tail buffer of `buffer_packets` packets.
+- Optionally (`--bulk-mbps`) the sender host also pushes constant-rate
+  bulk traffic through the same ports. With `--qos police` (the default)
+  the policer and the egress FIFO treat both alike. With `--qos queues` the
+  enforced rate is instead the ceiling of HTB queues on the egress port
+  (queues.py, the controllers' "htb" backend): each traffic class has
+  its own buffer and guaranteed share, and spare rate goes to the
+  lower priority number first. Both traffic kinds are then modelled as
+  fluid arrivals spread over the frame interval.
+
+Control is event driven: telemetry samples, QoS updates reaching the
+switch after the backend's apply delay and feedback to adaptive sources
+are events on one heap. The data plane is advanced frame by frame with
+all flows in lockstep as NumPy arrays (policer and queue in closed form
+per packet train), so hundreds of flows over thousands of simulated
+seconds take seconds of wall time. A policer change takes effect from the
+flow's next frame.
+
+The controllers plug in unchanged: SimBackend is a QosBackend, so
+`enforce_qos` sees a backend like ovsdb, vsctl or meter.
+`--controller qos` runs qos_app.py's own enforce_qos (OS-Ken imported,
+no switch connection); `--controller policy` runs the same decision with
+the rate policy alone. POX needs its core running and is not driven.
+
+    python netsim.py --links 200 --duration 1000
+    python netsim.py --links 50 --controller qos --source adaptive --apply-delay 0.05
+    python netsim.py --trace field.brt --links 20 --csv flows.csv
+    python netsim.py --bulk-mbps 4 --qos queues   # compare with --qos police
+"""
+import heapq
+import os
+import sys
+import time
+from argparse import ArgumentParser
+
+import numpy as np
+
+from links import Link, LinkRegistry
+from qos_backends import QosBackend
+from queues import QueuePlan, load_plan
+from rate_policy import make_policy, parse_ladder
+
+# OVS uses an 8000 kb bucket when ingress_policing_burst is 0
+DEFAULT_BURST_KB = 8000
+# Stands in for "not policed" without inf arithmetic
+UNLIMITED = 1e18
+# Queueing delay histogram edges (s) for per-flow percentiles
+DELAY_EDGES = np.concatenate([[0.0], np.logspace(-5, 1, 61)])
+# What the traffic looks like to the queue classifier: the README's video stream, an iperf-like TCP transfer
+VIDEO_FIELDS = {"ip_proto": 17, "tp_dst": 1234}
+BULK_FIELDS = {"ip_proto": 6, "tp_dst": 5001}
+
+
+class Network(object):
+    """
+    Flows, their policers and queues, and the event heap.
+
+    Args:
+        fps: Video frames per second (also the data-plane step)
+        access_mbps: Host access link rate: a frame's packets arrive this fast
+        packet_bytes: Packet size; the policer passes or drops whole packets
+        buffer_packets: Egress buffer per flow (drop-tail), per queue with HTB queues
+        seed: Random seed for frame sizes
+        bulk_mbps: Constant-rate bulk traffic next to every video flow (0 = none)
+        plan: QueuePlan; the video and bulk traffic are classified with it for set_queues()
+    """
+
+    def __init__(self, fps=25.0, access_mbps=100.0, packet_bytes=1500, buffer_packets=100, seed=0,
+                 bulk_mbps=0.0, plan=None):
+        self.fps = fps
+        self.dt = 1.0 / fps
+        self.access_bps = access_mbps * 1e6
+        self.packet_bits = packet_bytes * 8
+        self.buffer_bits = buffer_packets * self.packet_bits
+        self.rng = np.random.default_rng(seed)
+        self.now = 0.0
+        self.events = []
+        self.seq = 0
+        self.flows = []      # (src host, iface, dst host) per flow
+        self.by_iface = {}   # iface -> flow index
+        self.switches = {}   # dpid -> {port: flow index}
+        self.listeners = []  # fn(flow, rate_kbps, burst_kb) after a policer change
+        self._source = []    # (kbps, gop, i_ratio, vbr) per flow until start()
+        self.bulk_bps = bulk_mbps * 1e6
+        self.plan = plan or QueuePlan()
+        self.video_queue = self.plan.classify(VIDEO_FIELDS)
+        self.bulk_queue = self.plan.classify(BULK_FIELDS)
+
+    def add_flow(self, iface, dpid=1, port=1, kbps=3000, gop=25, i_ratio=5.0, vbr=0.15, src=None, dst=None):
+        """A sender behind `iface` (port `port` of switch `dpid`); returns the flow index."""
+        index = len(self.flows)
+        self.flows.append((src or f"h{2 * index + 1}", iface, dst or f"h{2 * index + 2}"))
+        self.by_iface[iface] = index
+        self.switches.setdefault(dpid, {})[port] = index
+        self._source.append((kbps, gop, i_ratio, vbr))
+        return index
+
+    def start(self, capacity, hz):
+        """
+        Allocate flow state. capacity: (flows, samples) radio capacity in
+        bps, one sample per 1/hz seconds (the last one holds).
+        """
+        n = len(self.flows)
+        source = np.array(self._source, dtype=float).reshape(n, 4)
+        self.kbps, self.gop, self.i_ratio, self.vbr = source.T
+        self.gop = self.gop.astype(np.int64)
+        self.phase = self.rng.integers(0, self.gop)
+        self.capacity = np.asarray(capacity, dtype=float)
+        self.hz = hz
+        self.rate = np.full(n, UNLIMITED)    # policer rate (bps)
+        self.bucket = np.full(n, UNLIMITED)  # policer bucket (bits)
+        self.tokens = np.full(n, UNLIMITED)
+        self.queue = np.zeros(n)
+        self.frame = 0
+        zeros = lambda: np.zeros(n)
+        self.offered, self.policed, self.overflow, self.delivered, self.good = (zeros() for _ in range(5))
+        self.frames = np.zeros(n, dtype=np.int64)
+        self.broken = np.zeros(n, dtype=np.int64)
+        self.delay_sum = zeros()
+        self.delay_hist = np.zeros((n, len(DELAY_EDGES)), dtype=np.int64)
+        self.updates = np.zeros(n, dtype=np.int64)
+        # Bulk traffic and HTB queues (step_mixed)
+        self.mixed = False
+        self.queue_bulk = zeros()
+        self.bulk_offered, self.bulk_delivered = zeros(), zeros()
+        self.shaped = np.zeros(n, dtype=bool)  # HTB QoS on the egress port
+        self.shaper = np.full(n, UNLIMITED)    # its ceiling (bps)
+        self.min_video, self.min_bulk = zeros(), zeros()
+        self.video_first = True
+
+    # Events
+
+    def schedule(self, at, fn, *args):
+        heapq.heappush(self.events, (at, self.seq, fn, args))
+        self.seq += 1
+
+    def set_policer(self, iface, rate_kbps, burst_kb):
+        """Apply ingress_policing_rate/burst to `iface` now (the switch side of a QoS update)."""
+        index = self.by_iface[iface]
+        if rate_kbps <= 0:
+            self.rate[index] = self.bucket[index] = self.tokens[index] = UNLIMITED
+        else:
+            self.rate[index] = rate_kbps * 1000.0
+            self.bucket[index] = (burst_kb or DEFAULT_BURST_KB) * 1000.0
+            # A new policer starts full, a changed one keeps its level up to the new size
+            self.tokens[index] = min(self.tokens[index], self.bucket[index])
+        self.updates[index] += 1
+        for fn in self.listeners:
+            fn(index, rate_kbps, burst_kb)
+
+    def set_queues(self, iface, rates):
+        """Apply HTB queues to the egress of `iface`: rates as from QueuePlan.queue_rates()."""
+        index = self.by_iface[iface]
+        self.mixed = True
+        mins = {queue_id: min_kbps * 1000.0 for queue_id, min_kbps, _, _ in rates}
+        priority = {queue_id: prio for queue_id, _, _, prio in rates}
+        ceiling = max(max_kbps for _, _, max_kbps, _ in rates)
+        self.shaped[index] = True
+        self.shaper[index] = ceiling * 1000.0
+        self.min_video[index] = mins[self.video_queue]
+        self.min_bulk[index] = mins[self.bulk_queue]
+        self.video_first = priority[self.video_queue] <= priority[self.bulk_queue]
+        self.updates[index] += 1
+        for fn in self.listeners:
+            fn(index, ceiling, 0)
+
+    def run(self, duration):
+        """Process events and frames until `duration` simulated seconds."""
+        frames = int(round(duration * self.fps))
+        chunk = 256
+        for first in range(0, frames, chunk):
+            count = min(chunk, frames - first)
+            # Frame-size noise and delays are handled a chunk at a time
+            # (lognormal with sigma vbr per flow, scaled to mean 1)
+            noise = self.rng.lognormal(0.0, 1.0, (count, len(self.flows))) ** self.vbr / np.exp(self.vbr ** 2 / 2)
+            delays = np.empty((count, len(self.flows)))
+            for k in range(count):
+                t = (first + k) * self.dt
+                while self.events and self.events[0][0] <= t:
+                    at, _, fn, args = heapq.heappop(self.events)
+                    self.now = at
+                    fn(*args)
+                self.now = t
+                delays[k] = self.step_mixed(noise[k]) if self.mixed or self.bulk_bps else self.step(noise[k])
+            self.delay_sum += delays.sum(axis=0)
+            bins = np.searchsorted(DELAY_EDGES, delays, side="right") - 1
+            flat = (np.arange(len(self.flows)) * len(DELAY_EDGES) + bins).ravel()
+            self.delay_hist += np.bincount(flat, minlength=self.delay_hist.size).reshape(self.delay_hist.shape)
+        self.now = frames * self.dt
+
+    def step(self, noise):
+        """One frame of every flow; returns each frame's queueing delay (s)."""
+        dt, P = self.dt, self.packet_bits
+        i_frame = (self.frame + self.phase) % self.gop == 0
+        p_size = self.kbps * 1000.0 / self.fps * self.gop / (self.gop - 1 + self.i_ratio)
+        size = p_size * np.where(i_frame, self.i_ratio, 1.0) * noise
+        train = np.minimum(size / self.access_bps, dt)
+
+        # Policer: whole packets pass while the bucket (refilled during the train) holds them
+        allowance = self.tokens + self.rate * train
+        passed = np.minimum(size, np.floor(allowance / P) * P)
+        tokens = np.minimum(self.bucket, allowance - passed)
+        self.tokens = np.minimum(self.bucket, tokens + self.rate * (dt - train))
+
+        # Egress: the train is queued while the radio drains the buffer
+        capacity = self.capacity[:, min(int(self.now * self.hz), self.capacity.shape[1] - 1)]
+        peak = np.maximum(0.0, self.queue + passed - capacity * train)
+        overflow = np.maximum(0.0, peak - self.buffer_bits)
+        peak -= overflow
+        self.queue = np.maximum(0.0, peak - capacity * (dt - train))
+
+        self.offered += size
+        self.policed += size - passed
+        self.overflow += overflow
+        self.delivered += passed - overflow
+        intact = (passed >= size) & (overflow <= 0.0)
+        self.good += np.where(intact, size, 0.0)
+        self.broken += ~intact
+        self.frames += 1
+        self.frame += 1
+        return peak / capacity
+
+    def step_mixed(self, noise):
+        """One frame of every flow with bulk traffic and/or HTB queues (fluid model); returns video delays (s)."""
+        dt, P = self.dt, self.packet_bits
+        i_frame = (self.frame + self.phase) % self.gop == 0
+        p_size = self.kbps * 1000.0 / self.fps * self.gop / (self.gop - 1 + self.i_ratio)
+        size = p_size * np.where(i_frame, self.i_ratio, 1.0) * noise
+        bulk = self.bulk_bps * dt
+
+        # Ingress policer on the aggregate: drops hit video and bulk in proportion
+        total = size + bulk
+        allowance = self.tokens + self.rate * dt
+        passed = np.minimum(total, np.floor(allowance / P) * P)
+        self.tokens = np.minimum(self.bucket, allowance - passed)
+        kept = passed / np.maximum(total, 1.0)
+        in_video, in_bulk = size * kept, bulk * kept
+
+        capacity = self.capacity[:, min(int(self.now * self.hz), self.capacity.shape[1] - 1)]
+        service = np.minimum(capacity, self.shaper) * dt
+        want_video, want_bulk = self.queue + in_video, self.queue_bulk + in_bulk
+
+        # One FIFO: served in proportion to the backlog
+        backlog = want_video + want_bulk
+        fifo_video = np.minimum(backlog, service) * want_video / np.maximum(backlog, 1.0)
+        fifo_bulk = np.minimum(backlog, service) - fifo_video
+
+        # HTB: guaranteed minimums (scaled down if the radio is slower than the ceiling), then spare by priority
+        floor = np.minimum(1.0, service / np.maximum((self.min_video + self.min_bulk) * dt, 1.0))
+        htb_video = np.minimum(want_video, self.min_video * dt * floor)
+        htb_bulk = np.minimum(want_bulk, self.min_bulk * dt * floor)
+        spare = np.maximum(0.0, service - htb_video - htb_bulk)
+        if self.video_first:
+            extra = np.minimum(want_video - htb_video, spare)
+            htb_video += extra
+            htb_bulk += np.minimum(want_bulk - htb_bulk, spare - extra)
+        else:
+            extra = np.minimum(want_bulk - htb_bulk, spare)
+            htb_bulk += extra
+            htb_video += np.minimum(want_video - htb_video, spare - extra)
+
+        separate = self.shaped & (self.video_queue != self.bulk_queue)
+        sent_video = np.where(separate, htb_video, fifo_video)
+        sent_bulk = np.where(separate, htb_bulk, fifo_bulk)
+        left_video, left_bulk = want_video - sent_video, want_bulk - sent_bulk
+
+        # Drop-tail: one buffer for the FIFO, one per queue with HTB
+        shared_over = np.maximum(0.0, left_video + left_bulk - self.buffer_bits)
+        shared_video = shared_over * left_video / np.maximum(left_video + left_bulk, 1.0)
+        over_video = np.where(separate, np.maximum(0.0, left_video - self.buffer_bits), shared_video)
+        over_bulk = np.where(separate, np.maximum(0.0, left_bulk - self.buffer_bits), shared_over - shared_video)
+        self.queue, self.queue_bulk = left_video - over_video, left_bulk - over_bulk
+
+        self.offered += size
+        self.policed += size - in_video
+        self.overflow += over_video
+        self.delivered += in_video - over_video
+        intact = (in_video >= size) & (over_video <= 0.0)
+        self.good += np.where(intact, size, 0.0)
+        self.broken += ~intact
+        self.frames += 1
+        self.frame += 1
+        self.bulk_offered += bulk
+        self.bulk_delivered += in_bulk - over_bulk
+        # Time to clear what is queued ahead of the frame's last bit
+        ahead = np.where(separate, want_video - over_video, backlog - shared_over)
+        rate = np.where(separate, sent_video, np.minimum(backlog, service)) / dt
+        return ahead / np.maximum(rate, 1.0)
+
+    # Results
+
+    def report(self):
+        """Per-flow metrics as arrays."""
+        seconds = max(self.now, self.dt)
+        offered = np.maximum(self.offered, 1.0)
+        cumulative = np.cumsum(self.delay_hist, axis=1)
+        upper = np.append(DELAY_EDGES[1:], np.inf)
+
+        def percentile(q):
+            return upper[np.argmax(cumulative >= q * cumulative[:, -1:], axis=1)]
+
+        return {
+            "offered_mbps": self.offered / seconds / 1e6,
+            "throughput_mbps": self.delivered / seconds / 1e6,
+            "goodput_mbps": self.good / seconds / 1e6,
+            "policer_loss_pct": 100.0 * self.policed / offered,
+            "queue_loss_pct": 100.0 * self.overflow / offered,
+            "broken_pct": 100.0 * self.broken / np.maximum(self.frames, 1),
+            "delay_mean_ms": 1e3 * self.delay_sum / np.maximum(self.frames, 1),
+            "delay_p99_ms": 1e3 * percentile(0.99),
+            "updates": self.updates,
+            "bulk_mbps": self.bulk_delivered / seconds / 1e6,
+        }
+
+
+class SimBackend(QosBackend):
+    """
+    QoS backend that polices a simulated switch port. The update reaches
+    the switch `apply_delay` simulated seconds after the call (ovs-vsctl
+    or OVSDB round trip, meter mod in flight).
+
+    Args:
+        network: Network the interfaces belong to
+        apply_delay: Seconds from set_policing() to the policer changing
+    """
+
+    name = "sim"
+
+    def __init__(self, network, apply_delay=0.02):
+        super(SimBackend, self).__init__()
+        self.network = network
+        self.apply_delay = apply_delay
+
+    def _apply(self, iface, rate_kbps, burst_kbps):
+        if iface not in self.network.by_iface:
+            raise KeyError(f"no simulated interface {iface!r}")
+        self.network.schedule(self.network.now + self.apply_delay, self.network.set_policer,
+                              iface, rate_kbps, burst_kbps)
+
+
+class SimQueueBackend(SimBackend):
+    """SimBackend for queue mode: the rate becomes HTB queues on the simulated egress port."""
+
+    name = "sim-htb"
+
+    def _apply(self, iface, rate_kbps, burst_kbps):
+        if iface not in self.network.by_iface:
+            raise KeyError(f"no simulated interface {iface!r}")
+        self.network.schedule(self.network.now + self.apply_delay, self.network.set_queues,
+                              iface, self.network.plan.queue_rates(rate_kbps))
+
+
+class PolicyController(object):
+    """The controllers' enforce_qos without OpenFlow: rate policy + backend, no OS-Ken needed."""
+
+    def __init__(self, links, backend):
+        self.links = links
+        self.qos_backend = backend
+
+    def enforce_qos(self, bitrate, link=None, now=None):
+        if link is None:
+            link = self.links.default
+        decision = link.policy.decide(link.rate_state, link.last_kbps, bitrate * link.headroom, now)
+        if decision is None:
+            return
+        rate_kbps, burst = decision
+        if self.qos_backend.set_policing(link.iface, rate_kbps, burst):
+            link.last_kbps = rate_kbps
+            link.last_bitrate = bitrate
+            link.updates += 1
+        else:
+            link.failures += 1
+
+
+def qos_app_controller(links, backend):
+    """qos_app.py's SDRQoSOrchestrator driving `backend`, with no switch, snapshot or feedback."""
+    for name, value in (("SDR_FEEDBACK", ""), ("SDR_SNAPSHOT", ""), ("SDR_STATS_INTERVAL", "0"),
+                        ("SDR_METRICS_PORT", "0")):
+        os.environ.setdefault(name, value)
+    import qos_app
+    app = qos_app.SDRQoSOrchestrator()
+    for link in links:
+        link.policy = qos_app.QOS_POLICY
+    app.links = links
+    app.qos_backend = backend
+    return app
+
+
+###########################################################################
+# Channels and telemetry
+###########################################################################
+
+CHANNELS = ("static", "steps", "fading")
+
+
+def channel(name, samples, hz, rng):
+    """Radio capacity (bps) of one link, one value per 1/hz seconds."""
+    t = np.arange(samples) / hz
+    if name == "static":
+        return np.full(samples, rng.uniform(3e6, 9e6))
+    if name == "steps":
+        # Interference switching on and off every 30-90 s
+        out = np.empty(samples)
+        i = 0
+        while i < samples:
+            n = max(1, int(rng.uniform(30, 90) * hz))
+            out[i:i + n] = rng.choice((2e6, 5e6, 8e6))
+            i += n
+        return out
+    if name == "fading":
+        # Slow fade with a 40 s period
+        return 5.5e6 + 3.5e6 * np.sin(2 * np.pi * t / 40.0 + rng.uniform(0, 2 * np.pi))
+    raise ValueError(f"Unknown channel {name!r}")
+
+
+def estimate(capacity, error, rng):
+    """Telemetry for a capacity trace: noisy, rounded down to 100 kbps, 1-10 Mbps like the GRC blocks."""
+    noisy = capacity * (1.0 + rng.normal(0.0, error, capacity.shape))
+    return np.clip(np.floor(noisy / 100000) * 100000, 1e6, 10e6)
+
+
+def trace_capacity(path, links, samples, hz, rng):
+    """Capacity from a bitrate_trace.py recording, each link starting at a random offset (looped)."""
+    from bitrate_trace import load_trace
+    trace = load_trace(path)
+    t = np.asarray(trace["t"], dtype=float) - float(trace["t"][0])
+    rate = np.asarray(trace["rate"], dtype=float)
+    span = max(t[-1], 1.0 / hz)
+    grid = np.arange(samples) / hz
+    return np.stack([np.interp((grid + rng.uniform(0, span)) % span, t, rate) for _ in range(links)])
+
+
+###########################################################################
+# Driver
+###########################################################################
+
+def simulate(args):
+    """Build the network and controller from CLI args, run, return (network, wall seconds)."""
+    rng = np.random.default_rng(args.seed)
+    plan = load_plan(args.queue_classes) if args.queue_classes else QueuePlan()
+    network = Network(args.fps, args.access_mbps, args.packet_bytes, args.buffer_packets, args.seed,
+                      args.bulk_mbps, plan)
+    registry = LinkRegistry(make_policy(ladder=parse_ladder(args.ladder), hysteresis=args.hysteresis,
+                                        up_delay=args.up_delay, burst_ratio=args.burst_ratio,
+                                        min_burst_kbps=args.min_burst_kbps))
+    for i in range(args.links):
+        dpid, port = 1 + i % args.switches, 1 + i // args.switches
+        iface = f"s{dpid}-eth{port}"
+        network.add_flow(iface, dpid, port, args.kbps, args.gop, args.i_ratio, args.vbr)
+        registry.add(Link(i, iface, dpid=dpid, port=port))
+
+    samples = int(np.ceil(args.duration * args.hz)) + 1
+    if args.trace:
+        capacity = trace_capacity(args.trace, args.links, samples, args.hz, rng)
+        telemetry = capacity
+    else:
+        names = args.channel or list(CHANNELS)
+        capacity = np.stack([channel(names[i % len(names)], samples, args.hz, rng) for i in range(args.links)])
+        telemetry = estimate(capacity, args.error, rng)
+    network.start(capacity, args.hz)
+
+    backend = (SimQueueBackend if args.qos == "queues" else SimBackend)(network, args.apply_delay)
+    controller = (qos_app_controller if args.controller == "qos" else PolicyController)(registry, backend)
+    links = list(registry)
+
+    def deliver(j):
+        # One telemetry sample per link, as the controller's ZMQ loop would hand them over
+        now = network.now
+        for link, bitrate in zip(links, telemetry[:, j].tolist()):
+            controller.enforce_qos(bitrate, link, now)
+        if j + 1 < samples:
+            network.schedule((j + 1) / args.hz, deliver, j + 1)
+
+    network.schedule(0.0, deliver, 0)
+
+    if args.source == "adaptive":
+        # encoder_agent.py's rung selection on the enforced rate, `feedback_delay` later
+        from encoder_agent import RungSelector
+        selectors = [RungSelector(up_hold=args.up_hold, initial=args.kbps) for _ in links]
+
+        def feedback(index, rate_kbps, burst_kb):
+            network.schedule(network.now + args.feedback_delay, adapt, index, rate_kbps)
+
+        def adapt(index, rate_kbps):
+            rung = selectors[index].update(rate_kbps * 1000.0 if rate_kbps > 0 else 1e12, network.now)
+            if rung is not None:
+                network.kbps[index] = rung
+
+        network.listeners.append(feedback)
+
+    start = time.perf_counter()
+    network.run(args.duration)
+    return network, time.perf_counter() - start
+
+
+def print_report(network, wall, per_flow=0, csv=None):
+    r = network.report()
+    n = len(network.flows)
+    frames = int(network.frames.sum())
+    print(f"{n} flows x {network.now:.0f} s simulated in {wall:.2f} s wall "
+          f"({network.now * n / max(wall, 1e-9):.0f} flow-s/s, {frames / max(wall, 1e-9) / 1e3:.0f}k frames/s)")
+    columns = [("offered_mbps", "offered Mbps", "{:.2f}"), ("throughput_mbps", "thru Mbps", "{:.2f}"),
+               ("goodput_mbps", "good Mbps", "{:.2f}"), ("policer_loss_pct", "policer %", "{:.2f}"),
+               ("queue_loss_pct", "queue %", "{:.2f}"), ("broken_pct", "broken fr %", "{:.1f}"),
+               ("delay_mean_ms", "delay ms", "{:.1f}"), ("delay_p99_ms", "p99 ms", "{:.1f}"),
+               ("updates", "updates", "{:.0f}")]
+    if network.bulk_bps:
+        columns.insert(3, ("bulk_mbps", "bulk Mbps", "{:.2f}"))
+    print(f"{'':>8} " + " ".join(f"{label:>12}" for _, label, _ in columns))
+    for name, fn in (("mean", np.mean), ("p10", lambda a: np.percentile(a, 10)),
+                     ("median", np.median), ("p90", lambda a: np.percentile(a, 90)), ("worst", None)):
+        cells = []
+        for key, _, fmt in columns:
+            values = r[key]
+            if fn is None:
+                # Worst: least goodput / most loss, delay, updates
+                value = values.min() if key.endswith("mbps") else values.max()
+            else:
+                value = fn(values)
+            cells.append(fmt.format(value).rjust(12))
+        print(f"{name:>8} " + " ".join(cells))
+
+    for i in range(min(per_flow, n)):
+        src, iface, dst = network.flows[i]
+        print(f"  {src}->{dst} via {iface}: " + ", ".join(f"{label} {fmt.format(r[key][i])}"
+                                                        for key, label, fmt in columns))
+    if csv:
+        with open(csv, "w") as f:
+            f.write("src,iface,dst," + ",".join(key for key, _, _ in columns) + "\n")
+            for i, (src, iface, dst) in enumerate(network.flows):
+                f.write(f"{src},{iface},{dst}," + ",".join(str(r[key][i]) for key, _, _ in columns) + "\n")
+        print(f"Per-flow results -> {csv}")
+
+
+def main():
+    parser = ArgumentParser(description="Discrete-event data-plane simulator for QoS policy evaluation")
+    parser.add_argument("--links", type=int, default=100, help="Flows, one policed port each")
+    parser.add_argument("--switches", type=int, default=1, help="Switches the ports are spread over")
+    parser.add_argument("--duration", type=float, default=1000.0, help="Simulated seconds")
+    parser.add_argument("--controller", choices=["policy", "qos"], default="policy",
+                        help="policy: rate policy alone; qos: qos_app.py's enforce_qos (needs OS-Ken)")
+    parser.add_argument("--qos", choices=["police", "queues"], default="police",
+                        help="police: ingress policing of the whole port; queues: per-class HTB queues on egress")
+    parser.add_argument("--queue-classes", help="queues.py classes file [default: video on UDP 1234 / AF41]")
+    parser.add_argument("--apply-delay", type=float, default=0.02, help="QoS update to policer change (s)")
+    parser.add_argument("--hz", type=float, default=2.0, help="Telemetry samples per second and link")
+    parser.add_argument("--channel", action="append", choices=CHANNELS,
+                        help="Radio channel(s), assigned round-robin [default: all]")
+    parser.add_argument("--trace", help="bitrate_trace.py recording as every link's capacity")
+    parser.add_argument("--error", type=float, default=0.05, help="Telemetry error (fraction, 1 sigma)")
+    # Rate policy (--controller policy; qos_app takes its SDR_* environment)
+    parser.add_argument("--up-delay", type=float, default=3.0)
+    parser.add_argument("--hysteresis", type=float, default=0.0)
+    parser.add_argument("--ladder")
+    parser.add_argument("--burst-ratio", type=float, default=0.1, help="Burst in seconds at the rate")
+    parser.add_argument("--min-burst-kbps", type=int, default=0)
+    # Source and data plane
+    parser.add_argument("--source", choices=["cbr", "adaptive"], default="cbr",
+                        help="cbr: fixed --kbps; adaptive: encoder_agent rung selection on the enforced rate")
+    parser.add_argument("--kbps", type=int, default=3000, help="Video bitrate (starting rung if adaptive)")
+    parser.add_argument("--bulk-mbps", type=float, default=0.0, help="Bulk traffic sharing each video flow's ports")
+    parser.add_argument("--up-hold", type=float, default=5.0, help="Adaptive source: seconds before a rung up")
+    parser.add_argument("--feedback-delay", type=float, default=0.02, help="Enforced rate to source (s)")
+    parser.add_argument("--fps", type=float, default=25.0)
+    parser.add_argument("--gop", type=int, default=25)
+    parser.add_argument("--i-ratio", type=float, default=5.0, help="I-frame size / P-frame size")
+    parser.add_argument("--vbr", type=float, default=0.15, help="Frame size spread (lognormal sigma)")
+    parser.add_argument("--access-mbps", type=float, default=100.0)
+    parser.add_argument("--packet-bytes", type=int, default=1500)
+    parser.add_argument("--buffer-packets", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--per-flow", type=int, default=0, help="Print this many flows individually")
+    parser.add_argument("--csv", help="Write per-flow results here")
+    args = parser.parse_args()
+
+    network, wall = simulate(args)
+    print_report(network, wall, args.per_flow, args.csv)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
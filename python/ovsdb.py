@@ -0,0 +1,320 @@
+"""
+Minimal OVSDB JSON-RPC (RFC 7047) client for QoS updates.
+
+Keeps a persistent connection to ovsdb-server instead of forking
+`ovs-vsctl` for every setting, and writes ingress policing rate and burst
+in a single transaction so the two never disagree on the switch.
+
+Also contains FakeOvsdbServer, a small in-process stand-in that speaks
+enough of the protocol to exercise the client without Open vSwitch:
+
+    python ovsdb.py serve unix:/tmp/ovsdb.sock
+"""
+import json
+import queue
+import socket
+import socketserver
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_ENDPOINT = "unix:/var/run/openvswitch/db.sock"
+DB_NAME = "Open_vSwitch"
+
+
+class OvsdbError(Exception):
+    """Raised when ovsdb-server rejects a request."""
+
+
+class OvsdbConnectionError(OvsdbError):
+    """Raised when ovsdb-server cannot be reached or the connection drops."""
+
+
+def parse_endpoint(endpoint):
+    """Turn 'unix:/path' or 'tcp:host:port' into (family, address)."""
+    kind, _, rest = endpoint.partition(":")
+    if kind == "unix" and rest:
+        return socket.AF_UNIX, rest
+    if kind == "tcp" and rest:
+        host, _, port = rest.rpartition(":")
+        return socket.AF_INET, (host or "127.0.0.1", int(port))
+    raise ValueError(f"Unsupported OVSDB endpoint: {endpoint!r}")
+
+
+class _JsonStream(object):
+    """Splits a byte stream into JSON values (OVSDB has no framing)."""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.decoder = json.JSONDecoder()
+        self.buf = ""
+
+    def send(self, obj):
+        self.sock.sendall(json.dumps(obj, separators=(",", ":")).encode())
+
+    def recv(self):
+        while True:
+            text = self.buf.lstrip()
+            if text:
+                try:
+                    obj, end = self.decoder.raw_decode(text)
+                    self.buf = text[end:]
+                    return obj
+                except ValueError:
+                    pass  # Incomplete value, read more
+            chunk = self.sock.recv(65536)
+            if not chunk:
+                raise OvsdbConnectionError("Connection closed by peer")
+            self.buf = text + chunk.decode()
+
+
+class OvsdbClient(object):
+    """
+    One persistent JSON-RPC connection to ovsdb-server.
+
+    Not thread-safe: share connections through OvsdbPool instead.
+
+    Args:
+        endpoint: 'unix:/path/db.sock' or 'tcp:host:port'
+        timeout: Socket timeout in seconds for connect and each reply
+    """
+
+    def __init__(self, endpoint=DEFAULT_ENDPOINT, timeout=5.0):
+        self.endpoint = endpoint
+        family, address = parse_endpoint(endpoint)
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        try:
+            sock.connect(address)
+        except OSError as e:
+            sock.close()
+            raise OvsdbConnectionError(f"Cannot connect to {endpoint}: {e}")
+        if family == socket.AF_INET:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sock = sock
+        self.stream = _JsonStream(sock)
+        self.next_id = 0
+
+    def call(self, method, params):
+        self.next_id += 1
+        req_id = self.next_id
+        try:
+            self.stream.send({"method": method, "params": params, "id": req_id})
+            while True:
+                msg = self.stream.recv()
+                # Server-side keepalive: must be answered or we get dropped
+                if msg.get("method") == "echo":
+                    self.stream.send({"result": msg.get("params", []),
+                                      "error": None, "id": msg.get("id")})
+                    continue
+                if msg.get("id") == req_id:
+                    break
+        except (OSError, ValueError) as e:
+            raise OvsdbConnectionError(f"OVSDB {method} failed: {e}")
+
+        if msg.get("error") is not None:
+            raise OvsdbError(f"OVSDB {method} error: {msg['error']}")
+        return msg.get("result")
+
+    def transact(self, *ops):
+        results = self.call("transact", [DB_NAME] + list(ops))
+        # Per-operation errors are reported inside the result array
+        for res in results:
+            if isinstance(res, dict) and res.get("error"):
+                raise OvsdbError(f"{res['error']}: {res.get('details', '')}")
+        return results
+
+    def set_policing(self, iface, rate_kbps, burst_kbps):
+        """Set ingress_policing_rate and _burst on `iface` atomically."""
+        results = self.transact({
+            "op": "update",
+            "table": "Interface",
+            "where": [["name", "==", iface]],
+            "row": {"ingress_policing_rate": int(rate_kbps),
+                    "ingress_policing_burst": int(burst_kbps)},
+        })
+        if not results or results[0].get("count", 0) == 0:
+            raise OvsdbError(f"Interface {iface} not found")
+
+    def echo(self):
+        return self.call("echo", [])
+
+    def close(self):
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class OvsdbPool(object):
+    """
+    Small pool of lazily-opened OvsdbClient connections.
+
+    A connection that fails is closed and replaced on next use, so a
+    restarted ovsdb-server is picked up without restarting the controller.
+    """
+
+    def __init__(self, endpoint=DEFAULT_ENDPOINT, size=2, timeout=5.0):
+        self.endpoint = endpoint
+        self.timeout = timeout
+        self.free = queue.LifoQueue()
+        for _ in range(size):
+            self.free.put(None)
+
+    @contextmanager
+    def connection(self):
+        client = self.free.get()
+        try:
+            if client is None:
+                client = OvsdbClient(self.endpoint, self.timeout)
+            yield client
+        except OvsdbConnectionError:
+            if client is not None:
+                client.close()
+            client = None
+            raise
+        finally:
+            self.free.put(client)
+
+    def close(self):
+        while not self.free.empty():
+            client = self.free.get_nowait()
+            if client is not None:
+                client.close()
+
+
+###########################################################################
+# Stand-in server
+###########################################################################
+
+class _FakeOvsdbHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        stream = _JsonStream(self.request)
+        while True:
+            try:
+                msg = stream.recv()
+            except (OvsdbError, OSError, ValueError):
+                return
+            reply = self.server.owner.dispatch(msg)
+            if reply is not None:
+                try:
+                    stream.send(reply)
+                except OSError:
+                    return
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class _TcpServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class FakeOvsdbServer(object):
+    """
+    In-process OVSDB stand-in holding only the Interface table.
+
+    Supports 'transact' with update/select operations, 'echo' and
+    'list_dbs'. Every applied update is recorded in `transactions` as
+    (time.time(), iface, row) for later inspection.
+
+    Args:
+        endpoint: Where to listen; 'tcp:127.0.0.1:0' picks a free port
+        interfaces: Interface names that exist in the table
+        delay: Artificial per-transaction delay in seconds
+    """
+
+    def __init__(self, endpoint="tcp:127.0.0.1:0", interfaces=("s1-eth1", "s1-eth2"), delay=0.0):
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.interfaces = {name: {"name": name, "ingress_policing_rate": 0,
+                                  "ingress_policing_burst": 0} for name in interfaces}
+        self.transactions = []
+
+        family, address = parse_endpoint(endpoint)
+        server_cls = _UnixServer if family == socket.AF_UNIX else _TcpServer
+        self.server = server_cls(address, _FakeOvsdbHandler)
+        self.server.owner = self
+        if family == socket.AF_UNIX:
+            self.endpoint = endpoint
+        else:
+            host, port = self.server.server_address[:2]
+            self.endpoint = f"tcp:{host}:{port}"
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def interface(self, name):
+        with self.lock:
+            return dict(self.interfaces[name])
+
+    def dispatch(self, msg):
+        method = msg.get("method")
+        if method is None:
+            return None  # A reply to something we never send
+        reply = {"result": None, "error": None, "id": msg.get("id")}
+        if method == "echo":
+            reply["result"] = msg.get("params", [])
+        elif method == "list_dbs":
+            reply["result"] = [DB_NAME]
+        elif method == "transact":
+            reply["result"] = self.transact(msg.get("params", []))
+        else:
+            reply["error"] = {"error": "unknown method", "details": method}
+        return reply
+
+    def transact(self, params):
+        if not params or params[0] != DB_NAME:
+            return [{"error": "unknown database"}]
+        if self.delay:
+            time.sleep(self.delay)
+        results = []
+        with self.lock:
+            for op in params[1:]:
+                if op.get("table") != "Interface":
+                    results.append({"error": "unknown table", "details": op.get("table")})
+                    break
+                rows = [row for row in self.interfaces.values() if self._matches(row, op.get("where", []))]
+                if op.get("op") == "update":
+                    for row in rows:
+                        row.update(op.get("row", {}))
+                        self.transactions.append((time.time(), row["name"], dict(op["row"])))
+                    results.append({"count": len(rows)})
+                elif op.get("op") == "select":
+                    results.append({"rows": [dict(row) for row in rows]})
+                else:
+                    results.append({"error": "not supported", "details": op.get("op")})
+                    break
+        return results
+
+    @staticmethod
+    def _matches(row, where):
+        for column, func, value in where:
+            if func != "==" or row.get(column) != value:
+                return False
+        return True
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) != 3 or sys.argv[1] != "serve":
+        print("Usage: python ovsdb.py serve <unix:/path|tcp:host:port>")
+        sys.exit(1)
+
+    server = FakeOvsdbServer(sys.argv[2]).start()
+    print(f"Fake OVSDB listening on {server.endpoint}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,215 @@
+"""
+Measured throughput and drops from OpenFlow port/flow statistics.
+
+Both controllers poll every connected switch for port statistics (and
+flow statistics) on a jittered interval: one request per switch per tick,
+replies handled like any other event. Rates come from counter deltas
+between two replies, so a poll costs O(ports) and nothing is stored but
+the previous counters. A counter going backwards (switch restart, port
+re-added) restarts the baseline instead of producing a negative rate.
+Port rates are per second of controller time between replies. Flow
+rates use the flows' own duration_sec/duration_nsec, so they do not
+depend on when the replies arrive.
+
+The rates feed QoS through Headroom. The SDR estimate is conservative by
+construction (rounded down, ladders, lower confidence bounds), so a
+link can be throttled below what its path actually carries. Loss on the
+link is what its port received minus what the installed flows entering
+from that port forwarded. That gap is where policer (or meter) drops show
+up, since the switch counts them as neither received by a flow nor
+dropped. While those flows carry at least `busy` of the enforced rate
+without loss, a link's telemetry rate is scaled up by a growing headroom
+factor. Any loss, or transmit drops on the switch, puts it back to 1.
+Saturation alone never raises a rate: a sender offering more than the
+policer passes shows up as loss. Links whose flows do not match on the
+ingress port (POX's per-destination flows) cannot be measured this way
+and keep a factor of 1. max_headroom=1.0 (the default) only measures.
+"""
+import random
+
+
+def jittered(interval, jitter):
+    """`interval` spread by +/- `jitter` (fraction), so switches are not polled in lockstep."""
+    return interval * random.uniform(1.0 - jitter, 1.0 + jitter)
+
+
+class CounterRates(object):
+    """
+    Per-second rates of monotonically increasing counters, per key.
+
+    Args:
+        alpha: Smoothing of successive rates (1 = last interval only)
+    """
+
+    def __init__(self, alpha=1.0):
+        self.alpha = alpha
+        self.last = {}   # key -> (time, counters)
+        self.rates = {}  # key -> rates, same order as the counters
+        self.resets = 0
+
+    def update(self, key, now, counters):
+        """Fold in one reading; returns the key's rates, or None until two readings exist."""
+        prev = self.last.get(key)
+        self.last[key] = (now, counters)
+        if prev is None or now <= prev[0]:
+            return self.rates.get(key)
+        dt = now - prev[0]
+        deltas = [c - p for c, p in zip(counters, prev[1])]
+        if min(deltas) < 0:
+            # Counters restarted: this reading is the new baseline
+            self.resets += 1
+            self.rates.pop(key, None)
+            return None
+        rates = [d / dt for d in deltas]
+        old = self.rates.get(key)
+        if old is not None and self.alpha < 1.0:
+            rates = [self.alpha * r + (1 - self.alpha) * o for r, o in zip(rates, old)]
+        self.rates[key] = rates
+        return rates
+
+    def get(self, key):
+        return self.rates.get(key)
+
+    def forget(self, dpid):
+        """Drop every key of switch `dpid` (keys are tuples starting with the dpid)."""
+        for key in [k for k in self.last if k[0] == dpid]:
+            del self.last[key]
+            self.rates.pop(key, None)
+
+
+# Port counters in the order CounterRates sees them
+PORT_COUNTERS = ("rx_bytes", "tx_bytes", "rx_packets", "tx_packets", "rx_dropped", "tx_dropped")
+RX_BYTES, TX_BYTES, RX_PACKETS, TX_PACKETS, RX_DROPPED, TX_DROPPED = range(len(PORT_COUNTERS))
+
+
+def port_counters(stat):
+    """Counter tuple from an OF1.0 (POX) or OF1.3 (OS-Ken) port stats entry."""
+    return tuple(getattr(stat, name) for name in PORT_COUNTERS)
+
+
+class Headroom(object):
+    """
+    Args:
+        max_headroom: Largest factor on the telemetry rate (1.0 = measure only)
+        step: Increase per poll while the link's flows run close to its rate without loss
+        busy: Fraction of the enforced rate the forwarded traffic must reach
+        loss: Fraction of the received traffic that may go unforwarded (counter timing) before it is loss
+    """
+
+    def __init__(self, max_headroom=1.0, step=0.05, busy=0.9, loss=0.05):
+        self.max_headroom = max_headroom
+        self.step = step
+        self.busy = busy
+        self.loss = loss
+
+    def update(self, link, forwarded_bps, lost_bps, congested):
+        """
+        Adjust link.headroom from one poll; returns True if it changed.
+        forwarded_bps/lost_bps are None when the link's flows cannot be told apart.
+        """
+        old = link.headroom
+        if congested or (lost_bps is not None and lost_bps > self.loss * (forwarded_bps + lost_bps)):
+            link.headroom = 1.0
+        elif (forwarded_bps is not None and link.last_kbps is not None
+              and forwarded_bps >= self.busy * link.last_kbps * 1000):
+            link.headroom = min(self.max_headroom, link.headroom + self.step)
+        return link.headroom != old
+
+
+class TrafficStats(object):
+    """
+    Port and flow rates of all switches, and the headroom they imply per link.
+
+    Args:
+        max_headroom, step, busy: Headroom options
+        alpha: Rate smoothing (see CounterRates)
+    """
+
+    def __init__(self, max_headroom=1.0, step=0.05, busy=0.9, alpha=1.0):
+        self.ports = CounterRates(alpha)
+        self.flows = CounterRates(alpha)
+        self.headroom = Headroom(max_headroom, step, busy)
+        self.forwarded = {}  # dpid -> {in_port: bytes/s of its flows}, None if flows lack in_port
+        self.polls = 0
+        self.replies = 0
+
+    def port_reply(self, dpid, now, entries):
+        """entries: iterable of (port_no, counter tuple) from one reply."""
+        self.replies += 1
+        for port_no, counters in entries:
+            self.ports.update((dpid, port_no), now, counters)
+
+    def flow_reply(self, dpid, entries):
+        """
+        entries: iterable of (flow key, in_port or None, byte_count,
+        packet_count, seconds installed) from one reply. The key must tell
+        apart flows that share a match prefix (e.g. include the cookie).
+        Flows missing from the reply have left the switch and are dropped.
+        """
+        forwarded, attributed, seen = {}, True, set()
+        for key, in_port, byte_count, packet_count, duration in entries:
+            key = (dpid,) + tuple(key)
+            seen.add(key)
+            # A re-added flow starts a shorter duration and lower counters: a new baseline
+            rates = self.flows.update(key, duration, (byte_count, packet_count))
+            if in_port is None:
+                attributed = False
+            elif rates is not None:
+                forwarded[in_port] = forwarded.get(in_port, 0.0) + rates[0]
+        self.forwarded[dpid] = forwarded if attributed else None
+        for key in [k for k in self.flows.last if k[0] == dpid and k not in seen]:
+            del self.flows.last[key]
+            self.flows.rates.pop(key, None)
+
+    def port_rate(self, dpid, port_no):
+        """Rates of one port (PORT_COUNTERS order, per second), or None."""
+        return self.ports.get((dpid, port_no))
+
+    def congested(self, dpid):
+        """True if any port of switch `dpid` dropped packets on transmit last interval."""
+        return any(rates[TX_DROPPED] > 0 for key, rates in self.ports.rates.items() if key[0] == dpid)
+
+    def adjust(self, links, dpid, port_of):
+        """
+        Update headroom of the links on `dpid` once a poll's port and flow
+        replies are in; returns the links whose factor changed. port_of(link)
+        gives a link's port number on that switch (None = unknown).
+        """
+        changed = []
+        congested = self.congested(dpid)
+        forwarded = self.forwarded.get(dpid)
+        for link in links:
+            if link.dpid not in (None, dpid):
+                continue
+            port_no = port_of(link)
+            rates = self.port_rate(dpid, port_no) if port_no is not None else None
+            if rates is None:
+                continue
+            link.measured_bps = rates[RX_BYTES] * 8
+            link.dropped_pps = rates[RX_DROPPED]
+            if forwarded is None:
+                link.forwarded_bps = link.lost_bps = None
+            else:
+                link.forwarded_bps = forwarded.get(port_no, 0.0) * 8
+                link.lost_bps = max(0.0, link.measured_bps - link.forwarded_bps)
+            if self.headroom.update(link, link.forwarded_bps, link.lost_bps, congested):
+                changed.append(link)
+        return changed
+
+    def forget(self, dpid):
+        self.ports.forget(dpid)
+        self.flows.forget(dpid)
+        self.forwarded.pop(dpid, None)
+
+    def summary(self):
+        port_rates = list(self.ports.rates.values())
+        flow_rates = [r[0] * 8 for r in self.flows.rates.values()]
+        return {
+            "ports": len(port_rates),
+            "rx_bps": sum(r[RX_BYTES] for r in port_rates) * 8,
+            "tx_bps": sum(r[TX_BYTES] for r in port_rates) * 8,
+            "drop_pps": sum(r[RX_DROPPED] + r[TX_DROPPED] for r in port_rates),
+            "flows": sum(1 for r in flow_rates if r > 0),
+            "top_flow_bps": max(flow_rates, default=0.0),
+            "resets": self.ports.resets + self.flows.resets,
+        }
@@ -1,86 +1,344 @@
 from pox.core import core
 import pox.openflow.libopenflow_01 as of
+from pox.lib.recoco import Timer
+import os
 import threading
+import time
 import zmq
-import os
-import struct
+import telemetry_codec
+from ovsdb import DEFAULT_ENDPOINT
+from qos_backends import HtbBackend, make_backend
+from forwarding import FLOOD, L2Forwarding, load_hosts
+from links import LinkPolicy, load_links, single_link
+from rate_policy import parse_ladder
+from qos_pipeline import ShardedQosPipeline, drain_socket
+from port_stats import TrafficStats, jittered, port_counters
+from queues import QueuePlan, load_plan, of10_match
+from metrics import DEFAULT_PORT as DEFAULT_METRICS_PORT, ControllerMetrics, Registry, serve
+import feedback
+import snapshot
 
 log = core.getLogger()
+perf_counter = time.perf_counter
+
+OVS_INTERFACE = "s1-eth1"
+# Queue mode shapes what leaves towards the video receiver (h2) instead
+QUEUE_INTERFACE, QUEUE_PORT = "s1-eth2", 2
+# Seconds between packet-in / flow-mod rate log lines (and MAC aging sweeps)
+STATS_INTERVAL = 10
+# Burst = rate for video stability, never below 2 Mb
+QOS_POLICY = LinkPolicy(min_kbps=1, burst_ratio=1.0, min_burst_kbps=2000)
+
+def flow_key(dpid, match):
+    """(dpid, src, dst) of a learned flow's match, addresses as strings or None."""
+    src = str(match.dl_src) if match.dl_src is not None else None
+    dst = str(match.dl_dst) if match.dl_dst is not None else None
+    return dpid, src, dst
 
 class SDRQoSController(object):
-    def __init__(self):
-        self.mac_to_port = {}
-        self.last_rate = 0 
+    def __init__(self, backend="ovsdb", ovsdb_endpoint=DEFAULT_ENDPOINT, max_qos_rate=20.0,
+                 links=None, qos_workers=4, forwarding="proactive", hosts=None,
+                 flow_idle_timeout=300, mac_capacity=100000, mac_max_age=600, mac_compact=False,
+                 snapshot_path=None, snapshot_interval=5.0, rate_ladder=None, hysteresis=0.0,
+                 min_dwell=0.0, up_delay=3.0, down_delay=0.0, feedback_endpoints=feedback.DEFAULT_BIND,
+                 stats_interval=5.0, stats_jitter=0.2, max_headroom=1.0, metrics_port=DEFAULT_METRICS_PORT,
+                 queue_classes=None):
+        # MACs age only while flow statistics can refresh them: traffic through installed
+        # flows never reaches the controller. Without polling, FlowRemoved alone forgets hosts
+        self.forwarding = L2Forwarding(forwarding, load_hosts(hosts) if hosts else None,
+                                       mac_capacity, mac_max_age if stats_interval > 0 else 0, mac_compact)
+        self.mac_to_port = self.forwarding.mac_to_port
+        # Idle flows leave the switch and come back as FlowRemoved (0 = permanent)
+        self.flow_idle_timeout = flow_idle_timeout
+        self.flow_groups = {}  # (dpid, src, dst) -> cookies of its queue flows still on the switch
+        # Rate changes go through the policy engine: drops apply at once, rises once sustained
+        policy = QOS_POLICY.replace(ladder=parse_ladder(rate_ladder), hysteresis=hysteresis,
+                                    min_dwell=min_dwell, up_delay=up_delay, down_delay=down_delay)
+        # Without a links file: one link, topic BITRATE -> OVS_INTERFACE (QUEUE_INTERFACE with htb)
+        self.queue_plan = None
+        if backend == "htb":
+            # A link's iface/port is then its egress port; flows out of it are steered into queues
+            self.queue_plan = load_plan(queue_classes) if queue_classes else QueuePlan()
+            self.links = load_links(links, policy) if links else single_link(QUEUE_INTERFACE, QUEUE_PORT, policy)
+            self.qos_backend = HtbBackend(self.queue_plan)
+        else:
+            self.links = load_links(links, policy) if links else single_link(OVS_INTERFACE, 1, policy)
+            self.qos_backend = make_backend(backend, ovsdb_endpoint, pool_size=qos_workers)
+        # Receive and enforce run on separate threads; only the newest rate per link is
+        # applied, links are spread over `qos_workers` threads, each link stays on one
+        self.qos_pipeline = ShardedQosPipeline(self.apply_link, workers=qos_workers,
+                                               max_rate=max_qos_rate)
+        # Warm restart: learned hosts and per-link QoS come back from the last snapshot
+        self.snapshot = snapshot.SnapshotWriter(snapshot_path) if snapshot_path else None
+        if self.snapshot and os.path.exists(snapshot_path):
+            self.load_snapshot(snapshot_path)
+        # Enforced rates go back to the sender's encoder agent
+        self.feedback = None
+        if feedback_endpoints:
+            try:
+                self.feedback = feedback.FeedbackPublisher(feedback_endpoints)
+            except zmq.ZMQError as e:
+                log.warning(f"Enforced-rate feedback disabled, cannot bind {feedback_endpoints}: {e}")
+        # Port/flow statistics: measured throughput, and headroom above telemetry (port_stats.py)
+        self.traffic = TrafficStats(max_headroom)
+        if max_headroom > 1.0:
+            log.warning("max_headroom has no effect here: the learned flows do not match in_port, "
+                        "so loss on a link cannot be measured (OS-Ken's qos_app can)")
+        self.stats_interval = stats_interval
+        self.stats_jitter = stats_jitter
+        # Hot-path counters and latency histograms at http://127.0.0.1:<metrics_port>/metrics
+        self.metrics = ControllerMetrics(Registry(), "pox")
+        self.metrics.watch_pipeline(self.qos_pipeline)
+        if metrics_port:
+            try:
+                serve(self.metrics.registry, metrics_port)
+            except OSError as e:
+                log.warning(f"Metrics endpoint disabled, cannot bind port {metrics_port}: {e}")
         core.openflow.addListeners(self)
+        Timer(STATS_INTERVAL, self.log_stats, recurring=True)
+        if self.snapshot:
+            Timer(snapshot_interval, self.save_snapshot, recurring=True)
+            core.addListenerByName("GoingDownEvent", lambda event: self.save_snapshot())
+        if self.feedback:
+            # Late-joining agents learn the current rates without waiting for a change
+            Timer(feedback.REPUBLISH_INTERVAL, self.feedback.publish_all, args=[self.links], recurring=True)
+        if self.stats_interval > 0:
+            Timer(jittered(self.stats_interval, self.stats_jitter), self.poll_stats)
         
         self.zmq_thread = threading.Thread(target=self.zmq_listener, daemon=True)
         self.zmq_thread.start()
         
-        log.info("=== Controller Ready: Waiting for GRC (Multipart Binary) ===")
+        log.info(f"=== Controller Ready: Waiting for BITRATE telemetry on {len(self.links)} link(s) ===")
 
     def parse_zmq_message(self, parts):
-        # 1. Validation: Must be multipart [Topic, Data]
-        if len(parts) != 2:
-            return None
-
-        topic, data = parts
-        
-        # 2. Validation: Topic must match
-        if topic != b'BITRATE':
-            return None
-
-        # 3. Validation: Data must be at least 4 bytes (one float)
-        if len(data) < 4:
-            return None
-
+        # Telemetry frames, GRC float32 buffers and "BITRATE <n>" strings are all
+        # handled by the shared codec; a batch yields its newest sample per link
         try:
-            # 4. Parsing: Unpack first 4 bytes as Little Endian Float
-            # We ignore extra bytes if GRC sends a large buffer
-            bitrate = struct.unpack('<f', data[:4])[0]
-            return bitrate
-        except struct.error:
-            return None
+            return self.links.latest(parts)
+        except telemetry_codec.CodecError:
+            self.metrics.undecodable.inc()
+            return {}
 
     def zmq_listener(self):
         ctx = zmq.Context()
         socket = ctx.socket(zmq.SUB)
         socket.connect("tcp://127.0.0.1:5555")
         socket.setsockopt(zmq.SUBSCRIBE, b"BITRATE")
+        metrics = self.metrics
         
         while True:
             try:
-                # Use recv_multipart to receive [Topic, Data] envelopes together
-                parts = socket.recv_multipart()
-                
-                # Delegate parsing to helper function
-                bitrate = self.parse_zmq_message(parts)
-                
-                # Only proceed if parsing was successful
-                if bitrate is not None:
-                    self.enforce_qos(bitrate)
+                # Drain every queued [Topic, Data] envelope in one go
+                batch = drain_socket(socket, copy=False)
+                if batch:
+                    metrics.zmq_batches.inc()
+                    metrics.zmq_messages.inc(len(batch))
+                for parts in batch:
+                    # Delegate parsing to helper function; stale values get coalesced
+                    start = perf_counter()
+                    latest = self.parse_zmq_message(parts)
+                    metrics.parse.observe(perf_counter() - start)
+                    for link, bitrate in latest.items():
+                        self.qos_pipeline.submit(link.link_id, bitrate)
                         
             except Exception:
                 pass
 
-    def enforce_qos(self, bitrate):
-        rate_kbps = int(bitrate / 1000)
-        
-        if rate_kbps < 1: rate_kbps = 1
-        
-        # Anti-Thrashing
-        if rate_kbps == self.last_rate: return
+    def apply_link(self, link_id, bitrate):
+        self.enforce_qos(bitrate, self.links.get(link_id))
 
-        # Burst Optimization: burst = rate for video stability
-        burst = rate_kbps 
-        if burst < 2000: burst = 2000 
+    def enforce_qos(self, bitrate, link=None, now=None):
+        # `now` is the policy's clock (default: time.monotonic(); netsim.py passes simulated time)
+        if link is None:
+            link = self.links.default
+        # Anti-Thrashing: the link's policy decides whether this sample is worth a change
+        # (headroom > 1 only once port statistics show the path carries more)
+        metrics = self.metrics
+        start = perf_counter()
+        decision = link.policy.decide(link.rate_state, link.last_kbps, bitrate * link.headroom, now)
+        metrics.decide.observe(perf_counter() - start)
+        if decision is None:
+            metrics.holds.inc()
+            # ...unless a reconnected switch needs the current rate again
+            if not link.reassert or link.last_kbps is None: return
+            decision = (link.last_kbps, link.policy.burst_kbps(link.last_kbps))
+        else:
+            metrics.changes.inc()
+        rate_kbps, burst = decision
 
-        os.system(f"ovs-vsctl set interface s1-eth1 ingress_policing_rate={rate_kbps}")
-        os.system(f"ovs-vsctl set interface s1-eth1 ingress_policing_burst={burst}")
-        
-        log.info(f"*** QoS UPDATE: Rate={rate_kbps} kbps ***")
-        self.last_rate = rate_kbps
+        # Rate and burst go out together as one OVSDB transaction
+        start = perf_counter()
+        applied = self.qos_backend.set_policing(link.iface, rate_kbps, burst)
+        metrics.apply.observe(perf_counter() - start)
+        if not applied:
+            metrics.apply_failures.inc()
+            link.failures += 1
+            return
+        metrics.link_rate(link, rate_kbps)
+
+        log.info(f"*** QoS UPDATE {link.iface}: Rate={rate_kbps} kbps ({self.qos_backend.latency}) ***")
+        log.debug(f"QoS pipeline: {self.qos_pipeline.summary()}")
+        link.last_kbps = rate_kbps
+        link.last_bitrate = bitrate
+        link.reassert = False
+        link.updates += 1
+        if self.feedback:
+            self.feedback.publish(link.link_id, rate_kbps)
+
+    def reassert_qos(self, dpid):
+        """Re-apply the last enforced rate of every link on switch `dpid`."""
+        for link in self.links:
+            if link.last_bitrate is None or link.dpid not in (None, dpid):
+                continue
+            link.reassert = True
+            # Newer telemetry already pending wins over the remembered rate
+            self.qos_pipeline.submit(link.link_id, link.last_bitrate, replace=False)
+
+    def poll_stats(self):
+        # Port and flow requests go out as one write per switch
+        request = (of.ofp_stats_request(body=of.ofp_port_stats_request()).pack()
+                   + of.ofp_stats_request(body=of.ofp_flow_stats_request()).pack())
+        for connection in core.openflow.connections:
+            connection.send(request)
+        self.traffic.polls += 1
+        # Re-armed with fresh jitter each time, so switches drift apart instead of lining up
+        Timer(jittered(self.stats_interval, self.stats_jitter), self.poll_stats)
+
+    def port_of(self, connection, link):
+        """Port number of `link` on this switch (configured, else by name), or None."""
+        if link.port is not None:
+            return link.port
+        try:
+            return connection.ports[link.iface].port_no
+        except (KeyError, IndexError):
+            return None
+
+    def _handle_PortStatsReceived(self, event):
+        dpid = event.connection.dpid
+        self.traffic.port_reply(dpid, time.monotonic(), ((s.port_no, port_counters(s)) for s in event.stats))
+
+    def _handle_FlowStatsReceived(self, event):
+        # Follows the port reply of the same poll. Per-destination flows do not match
+        # in_port, so loss (and headroom) cannot be measured per link from them
+        dpid = event.connection.dpid
+        flows = (((str(s.match.dl_src), str(s.match.dl_dst), s.cookie), s.match.in_port, s.byte_count,
+                  s.packet_count, s.duration_sec + s.duration_nsec / 1e9) for s in event.stats)
+        self.traffic.flow_reply(dpid, flows)
+        for link in self.traffic.adjust(self.links, dpid, lambda link: self.port_of(event.connection, link)):
+            log.info(f"{link.iface}: {link.measured_bps / 1e3:.0f} kbps measured, headroom now {link.headroom:.2f}")
+            if link.last_bitrate is not None:
+                # Re-decide on the last telemetry rate; newer telemetry pending wins
+                self.qos_pipeline.submit(link.link_id, link.last_bitrate, replace=False)
+        # Hosts the installed flows still forward to (and from, for pair flows) stay learned
+        macs = [str(mac) for s in event.stats for mac in (s.match.dl_src, s.match.dl_dst) if mac is not None]
+        self.forwarding.flows_active(event.connection.dpid, macs)
+
+    def _handle_ConnectionDown(self, event):
+        self.traffic.forget(event.dpid)
+
+    def load_snapshot(self, path):
+        try:
+            state = snapshot.load(path)
+        except snapshot.SnapshotError as e:
+            log.warning(f"Ignoring snapshot: {e}")
+            return
+        restored = snapshot.restore(state, self.mac_to_port, self.links)
+        log.info(f"Snapshot {path}: {restored} hosts restored, QoS for "
+                 f"{sum(l.last_kbps is not None for l in self.links)} link(s)")
+
+    def save_snapshot(self):
+        # Skipped unless hosts or enforced rates changed since the last write
+        version = (self.mac_to_port.changes, sum(l.updates for l in self.links))
+        try:
+            if self.snapshot.save_if_changed(version, self.mac_to_port, self.links):
+                log.debug(f"Snapshot saved ({self.snapshot.size} bytes, {self.snapshot.latency})")
+        except Exception as e:
+            log.error(f"Snapshot to {self.snapshot.path} failed: {e}")
+
+    def log_stats(self):
+        expired = sum(len(macs) for macs in self.forwarding.expire().values())
+        s = self.forwarding.stats()
+        log.info(f"Forwarding ({self.forwarding.mode}): {s['hosts']} hosts ({expired} aged out), "
+                 f"packet-in {s['packet_in_rate']:.1f}/s ({s['packet_ins']}), "
+                 f"flow-mod {s['flow_mod_rate']:.1f}/s ({s['flow_mods']}), "
+                 f"flow-removed {s['flows_removed']}")
+        log.info(f"QoS: {sum(l.updates for l in self.links)} updates, "
+                 f"{sum(l.rate_state.avoided for l in self.links)} avoided by policy, "
+                 f"{sum(l.failures for l in self.links)} failed")
+        if self.traffic.polls:
+            t = self.traffic.summary()
+            log.info(f"Traffic: {t['ports']} ports rx {t['rx_bps'] / 1e6:.2f} Mbps tx {t['tx_bps'] / 1e6:.2f} Mbps, "
+                     f"{t['drop_pps']:.1f} drops/s, {t['flows']} active flows (top {t['top_flow_bps'] / 1e6:.2f} Mbps), "
+                     f"headroom {', '.join(f'{l.iface} {l.headroom:.2f}' for l in self.links)}")
+
+    def queued_ports(self, connection):
+        """Ports of this switch with HTB queues (queue mode), else an empty set."""
+        if self.queue_plan is None:
+            return set()
+        ports = (self.port_of(connection, link) for link in self.links if link.dpid in (None, connection.dpid))
+        return {port for port in ports if port is not None}
+
+    def install_flows(self, connection, flows):
+        # Packed and sent as one write: a reconnect may push thousands of flows
+        msgs = []
+        queued = self.queued_ports(connection)
+        for flow in flows:
+            if flow[0] == "dst":
+                _, dst, outport = flow
+                fields = {"dl_dst": dst}
+            else:
+                _, src, dst, outport = flow
+                fields = {"dl_src": src, "dl_dst": dst}
+            msg = of.ofp_flow_mod()
+            msg.match = of.ofp_match(**fields)
+            msg.idle_timeout = self.flow_idle_timeout
+            msg.hard_timeout = 0
+            msg.flags = of.OFPFF_SEND_FLOW_REM
+            key = flow_key(connection.dpid, msg.match)
+            if outport in queued:
+                # Unclassified traffic goes to queue 0; each class rule gets a more specific flow.
+                # They expire as one group (cookie 0, rule i -> i + 1): a video-only host may
+                # leave its queue 0 flow idle while a class flow carries all the traffic
+                msg.actions.append(of.ofp_action_enqueue(port=outport, queue_id=0))
+                for cookie, (queue_id, match) in enumerate(self.queue_plan.rules, 1):
+                    rule = of.ofp_flow_mod()
+                    rule.match = of.ofp_match(**dict(fields, **of10_match(match)))
+                    rule.priority = of.OFP_DEFAULT_PRIORITY + 1
+                    rule.cookie = cookie
+                    rule.idle_timeout = self.flow_idle_timeout
+                    rule.flags = of.OFPFF_SEND_FLOW_REM
+                    rule.actions.append(of.ofp_action_enqueue(port=outport, queue_id=queue_id))
+                    msgs.append(rule.pack())
+                self.flow_groups[key] = set(range(len(self.queue_plan.rules) + 1))
+            else:
+                msg.actions.append(of.ofp_action_output(port=outport))
+                self.flow_groups.pop(key, None)
+            msgs.append(msg.pack())
+        if msgs:
+            connection.send(b"".join(msgs))
+
+    def _handle_ConnectionUp(self, event):
+        # Known hosts get their flows before the first packet arrives
+        flows = self.forwarding.connection_up(event.dpid)
+        self.install_flows(event.connection, flows)
+        self.reassert_qos(event.dpid)
+        log.info(f"Switch {event.dpid} connected, {len(flows)} host flows pre-installed")
+
+    def _handle_FlowRemoved(self, event):
+        # Keep the MAC table in step with what is left on the switch
+        key = flow_key(event.dpid, event.ofp.match)
+        group = self.flow_groups.get(key)
+        if group is not None:
+            group.discard(event.ofp.cookie)
+            if group:
+                return  # Other flows of the queue group still forward to dst
+            del self.flow_groups[key]
+        _, src, dst = key
+        if self.forwarding.flow_removed(event.dpid, src, dst):
+            log.debug(f"Flow to {dst} on {event.dpid} expired, host forgotten")
 
     def _handle_PacketIn(self, event):
+        start = perf_counter()
         try:
             packet = event.parsed
             if not packet or not packet.parsed: return
@@ -90,27 +348,41 @@ class SDRQoSController(object):
         dpid = event.dpid
         inport = event.port
         
-        if dpid not in self.mac_to_port: self.mac_to_port[dpid] = {}
-        self.mac_to_port[dpid][packet.src] = inport
-        
-        if packet.dst in self.mac_to_port[dpid]:
-            outport = self.mac_to_port[dpid][packet.dst]
-        else:
+        # Learn src; flows for it (proactive) or for this pair (reactive) come back
+        outport, flows = self.forwarding.packet_in(dpid, inport, str(packet.src), str(packet.dst))
+        if outport is FLOOD:
             outport = of.OFPP_FLOOD
-            
-        if outport != of.OFPP_FLOOD:
-            msg = of.ofp_flow_mod()
-            msg.match = of.ofp_match(dl_src=packet.src, dl_dst=packet.dst)
-            msg.idle_timeout = 0
-            msg.hard_timeout = 0
-            msg.actions.append(of.ofp_action_output(port=outport))
-            event.connection.send(msg)
+        self.install_flows(event.connection, flows)
 
         msg = of.ofp_packet_out()
         msg.data = event.ofp
         msg.actions.append(of.ofp_action_output(port=outport))
         msg.in_port = inport
         event.connection.send(msg)
+        self.metrics.packet_in.observe(perf_counter() - start)
 
-def launch():
-    core.registerNew(SDRQoSController)
\ No newline at end of file
+def launch(backend="ovsdb", ovsdb=DEFAULT_ENDPOINT, max_qos_rate=20, links=None, qos_workers=4,
+           forwarding="proactive", hosts=None, flow_idle_timeout=300, mac_capacity=100000,
+           mac_max_age=600, mac_compact=False, snapshot=None, snapshot_interval=5, rate_ladder=None,
+           hysteresis=0.0, min_dwell=0.0, up_delay=3.0, down_delay=0.0, feedback=feedback.DEFAULT_BIND,
+           stats_interval=5, stats_jitter=0.2, max_headroom=1.0, metrics_port=DEFAULT_METRICS_PORT,
+           queue_classes=None):
+    # e.g. ./pox.py pox_controller --backend=vsctl --max_qos_rate=10 --links=links.json
+    #      ./pox.py pox_controller --forwarding=reactive --hosts=hosts.json
+    #      ./pox.py pox_controller --flow_idle_timeout=60 --mac_capacity=200000 --mac_compact
+    #      ./pox.py pox_controller --snapshot=/var/lib/sdr/pox.npz --snapshot_interval=5
+    #      ./pox.py pox_controller --rate_ladder=geometric:1000:10000:1.25 --hysteresis=0.05 --up_delay=3
+    #      ./pox.py pox_controller --feedback=ipc:///tmp/sdr_feedback,tcp://127.0.0.1:5556   (--feedback= turns it off)
+    #      ./pox.py pox_controller --stats_interval=2   (--stats_interval=0 turns polling off)
+    #      ./pox.py pox_controller --metrics_port=9109   (Prometheus /metrics; --metrics_port= turns it off)
+    #      ./pox.py pox_controller --backend=htb --queue_classes=classes.json   (per-class egress queues)
+    core.registerNew(SDRQoSController, backend, ovsdb, float(max_qos_rate), links, int(qos_workers),
+                     forwarding, hosts, flow_idle_timeout=int(flow_idle_timeout),
+                     mac_capacity=int(mac_capacity), mac_max_age=float(mac_max_age),
+                     mac_compact=str(mac_compact).lower() in ("1", "true", "yes"),
+                     snapshot_path=snapshot, snapshot_interval=float(snapshot_interval),
+                     rate_ladder=rate_ladder, hysteresis=float(hysteresis), min_dwell=float(min_dwell),
+                     up_delay=float(up_delay), down_delay=float(down_delay),
+                     feedback_endpoints=feedback, stats_interval=float(stats_interval),
+                     stats_jitter=float(stats_jitter), max_headroom=float(max_headroom),
+                     metrics_port=int(metrics_port) if metrics_port else None, queue_classes=queue_classes)
\ No newline at end of file
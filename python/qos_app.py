@@ -1,47 +1,353 @@
 import eventlet
 eventlet.monkey_patch()
-import zmq
+# Green ZMQ: a blocking recv parks only this green thread, not the hub
+from eventlet.green import zmq
+import logging
 import os
+import struct
+import time
 from os_ken.base import app_manager
 from os_ken.controller import ofp_event
-from os_ken.controller.handler import MAIN_DISPATCHER, CONFIG_DISPATCHER, set_ev_cls
+from os_ken.controller.handler import MAIN_DISPATCHER, CONFIG_DISPATCHER, DEAD_DISPATCHER, set_ev_cls
 from os_ken.ofproto import ofproto_v1_3
 from os_ken.lib.packet import packet, ethernet
 from os_ken.lib import hub
+from ovsdb import DEFAULT_ENDPOINT
+from qos_backends import HtbBackend, MeterBackend, make_backend
+from qos_pipeline import ShardedQosPipeline
+from links import LinkPolicy, load_links, single_link
+from rate_policy import parse_ladder
+from mac_table import MacTables
+from port_stats import TrafficStats, jittered, port_counters
+from queues import QueuePlan, load_plan, of13_match
+from metrics import DEFAULT_PORT as DEFAULT_METRICS_PORT, ControllerMetrics, Registry, wsgi_app
+import feedback
+import snapshot
+import telemetry_codec
+
+OVS_INTERFACE = "s1-eth2"
+# "ovsdb" (persistent JSON-RPC, falls back to ovs-vsctl), "vsctl", or
+# "meter" (OpenFlow meter on flows entering from each link's port)
+QOS_BACKEND = os.environ.get("SDR_QOS_BACKEND", "ovsdb")
+OVSDB_ENDPOINT = os.environ.get("SDR_OVSDB_ENDPOINT", DEFAULT_ENDPOINT)
+# JSON links file (see links.py); unset = one link, topic BITRATE -> OVS_INTERFACE
+LINKS_FILE = os.environ.get("SDR_LINKS")
+# Traffic classes for SDR_QOS_BACKEND=htb (queues.py; default: the video stream on UDP 1234 / AF41)
+QUEUE_CLASSES = os.environ.get("SDR_QUEUE_CLASSES")
+QOS_WORKERS = int(os.environ.get("SDR_QOS_WORKERS", "4"))
+# Burst = 10% of the rate; drops apply at once, rises once sustained for SDR_UP_DELAY s
+QOS_POLICY = LinkPolicy(min_kbps=1, burst_ratio=0.1).replace(
+    ladder=parse_ladder(os.environ.get("SDR_RATE_LADDER")),
+    hysteresis=float(os.environ.get("SDR_HYSTERESIS", "0")),
+    min_dwell=float(os.environ.get("SDR_MIN_DWELL", "0")),
+    up_delay=float(os.environ.get("SDR_UP_DELAY", "3")),
+    down_delay=float(os.environ.get("SDR_DOWN_DELAY", "0")))
+# Messages drained per wakeup before yielding to OpenFlow handlers
+ZMQ_MAX_BATCH = 1000
+# Read MACs straight from the Ethernet header instead of building a packet.Packet
+PACKET_IN_FAST_PATH = os.environ.get("SDR_PACKET_IN_FAST_PATH", "1") != "0"
+ETH_HEADER = struct.Struct("!6s6sH")  # dst, src, ethertype
+# Learned flows expire after this many idle seconds (0 = permanent) and come back as FlowRemoved
+FLOW_IDLE_TIMEOUT = int(os.environ.get("SDR_FLOW_IDLE_TIMEOUT", "300"))
+# MAC table per switch: size bound (LRU eviction), aging in seconds, int keys
+MAC_CAPACITY = int(os.environ.get("SDR_MAC_CAPACITY", "100000"))
+MAC_MAX_AGE = float(os.environ.get("SDR_MAC_MAX_AGE", "600"))
+MAC_COMPACT = os.environ.get("SDR_MAC_COMPACT", "0") == "1"
+# Warm restart: learned hosts, flows and per-link QoS are saved here (unset = off)
+SNAPSHOT_PATH = os.environ.get("SDR_SNAPSHOT")
+SNAPSHOT_INTERVAL = float(os.environ.get("SDR_SNAPSHOT_INTERVAL", "5"))
+# Enforced rates are published here for the sender's encoder agent ("" = off)
+FEEDBACK_ENDPOINTS = os.environ.get("SDR_FEEDBACK", feedback.DEFAULT_BIND)
+# Port/flow statistics polled every SDR_STATS_INTERVAL s (+/- SDR_STATS_JITTER, 0 = off);
+# SDR_MAX_HEADROOM > 1 lets measured spare capacity raise rates above telemetry (port_stats.py)
+STATS_INTERVAL = float(os.environ.get("SDR_STATS_INTERVAL", "5"))
+STATS_JITTER = float(os.environ.get("SDR_STATS_JITTER", "0.2"))
+MAX_HEADROOM = float(os.environ.get("SDR_MAX_HEADROOM", "1.0"))
+# Prometheus text endpoint for the hot-path metrics (SDR_METRICS_PORT=0 turns it off)
+METRICS_PORT = int(os.environ.get("SDR_METRICS_PORT", str(DEFAULT_METRICS_PORT)))
+
+perf_counter = time.perf_counter
+
+
+def eth_addresses(data):
+    """(src, dst) as 'aa:bb:cc:dd:ee:ff' strings, or None if data is not an Ethernet frame."""
+    if len(data) < ETH_HEADER.size:
+        return None
+    dst, src, _ = ETH_HEADER.unpack_from(data)
+    return src.hex(":"), dst.hex(":")
+
+
+def eth_addresses_full(data):
+    """Same as eth_addresses() through the full OS-Ken packet parser."""
+    try:
+        eths = packet.Packet(data).get_protocols(ethernet.ethernet)
+    except Exception:
+        return None
+    return (eths[0].src, eths[0].dst) if eths else None
+
 
 class SDRQoSOrchestrator(app_manager.OSKenApp):
     OFP_VERSIONS = [ofproto_v1_3.OFP_VERSION]
     
     def __init__(self, *args, **kwargs):
         super(SDRQoSOrchestrator, self).__init__(*args, **kwargs)
-        self.mac_to_port = {}
+        # MACs age only while flow statistics can refresh them: traffic through installed
+        # flows never reaches the controller. Without polling, FlowRemoved alone forgets hosts
+        self.mac_to_port = MacTables(MAC_CAPACITY, MAC_MAX_AGE if STATS_INTERVAL > 0 else 0, MAC_COMPACT)
+        self.flow_ports = {}  # (dpid, dst) -> in_ports with a learned flow to dst
+        self.flow_groups = {}  # (dpid, dst, in_port) -> cookies of its queue flows still installed
+        self.flow_changes = 0
         self.zmq_ctx = zmq.Context()
+        self.port_names = {}  # dpid -> {port number: port name}
+        self.dp_cache = {}    # dpid -> (ofproto, parser, OFPP_FLOOD, OFP_NO_BUFFER)
+        self.datapaths = {}   # dpid -> connected datapath, polled for statistics
+        self.traffic = TrafficStats(MAX_HEADROOM)
+        self.flow_parts = {}  # dpid -> flow stats entries of a multipart reply so far
+        self.links = load_links(LINKS_FILE, QOS_POLICY) if LINKS_FILE else single_link(OVS_INTERFACE, policy=QOS_POLICY)
+        self.queue_plan = None
+        if QOS_BACKEND == "meter":
+            self.qos_backend = MeterBackend()
+        elif QOS_BACKEND == "htb":
+            # A link's iface is then its egress port; flows out of it are steered into queues
+            self.queue_plan = load_plan(QUEUE_CLASSES) if QUEUE_CLASSES else QueuePlan()
+            self.qos_backend = HtbBackend(self.queue_plan)
+        else:
+            self.qos_backend = make_backend(QOS_BACKEND, OVSDB_ENDPOINT, pool_size=QOS_WORKERS)
+        # Links are spread over QOS_WORKERS green threads, each link stays on one (ordered)
+        self.qos_pipeline = ShardedQosPipeline(self.apply_link, workers=QOS_WORKERS, max_rate=0)
+        self.zmq_received = 0
+        self.metrics = ControllerMetrics(Registry(), "osken")
+        self.metrics.watch_pipeline(self.qos_pipeline)
+        if METRICS_PORT:
+            try:
+                self.serve_metrics(METRICS_PORT)
+            except OSError as e:
+                self.logger.warning(f"Metrics endpoint disabled, cannot bind port {METRICS_PORT}: {e}")
+        self.feedback = None
+        if FEEDBACK_ENDPOINTS:
+            try:
+                self.feedback = feedback.FeedbackPublisher(FEEDBACK_ENDPOINTS, self.zmq_ctx)
+            except zmq.ZMQError as e:
+                self.logger.warning(f"Enforced-rate feedback disabled, cannot bind {FEEDBACK_ENDPOINTS}: {e}")
+        self.snapshot = snapshot.SnapshotWriter(SNAPSHOT_PATH) if SNAPSHOT_PATH else None
+        if self.snapshot and os.path.exists(SNAPSHOT_PATH):
+            self.load_snapshot(SNAPSHOT_PATH)
         # Use OS-Ken native hub instead of threading
         hub.spawn(self.zmq_listener)
+        if self.snapshot:
+            hub.spawn(self.snapshot_loop)
+        if self.feedback:
+            hub.spawn(self.feedback_loop)
+        if STATS_INTERVAL > 0:
+            hub.spawn(self.stats_loop)
+
+    def serve_metrics(self, port):
+        # On the hub like everything else here: a native server thread would block it
+        server = hub.WSGIServer(("127.0.0.1", port), wsgi_app(self.metrics.registry))
+        hub.spawn(server.serve_forever)
+        return server
+
+    def load_snapshot(self, path):
+        try:
+            state = snapshot.load(path)
+        except snapshot.SnapshotError as e:
+            self.logger.warning(f"Ignoring snapshot: {e}")
+            return
+        restored = snapshot.restore(state, self.mac_to_port, self.links)
+        self.flow_ports = state["flows"]
+        self.logger.info(f"Snapshot {path}: {restored} hosts, {len(self.flow_ports)} flow destinations, "
+                         f"QoS for {sum(l.last_kbps is not None for l in self.links)} link(s) restored")
+
+    def save_snapshot(self):
+        # Skipped unless hosts, flows or enforced rates changed since the last write
+        version = (self.mac_to_port.changes, self.flow_changes, sum(l.updates for l in self.links))
+        try:
+            if self.snapshot.save_if_changed(version, self.mac_to_port, self.links, self.flow_ports):
+                self.logger.debug(f"Snapshot saved ({self.snapshot.size} bytes, {self.snapshot.latency})")
+        except Exception as e:
+            self.logger.error(f"Snapshot to {self.snapshot.path} failed: {e}")
+
+    def snapshot_loop(self):
+        while True:
+            hub.sleep(SNAPSHOT_INTERVAL)
+            self.save_snapshot()
+
+    def feedback_loop(self):
+        # Late-joining agents learn the current rates without waiting for a change
+        while True:
+            hub.sleep(feedback.REPUBLISH_INTERVAL)
+            self.feedback.publish_all(self.links)
+
+    def stats_loop(self):
+        while True:
+            hub.sleep(jittered(STATS_INTERVAL, STATS_JITTER))
+            self.expire_hosts()
+            self.poll_stats()
+
+    def poll_stats(self):
+        # Requests are queued per datapath; replies arrive as events like any other
+        for datapath in list(self.datapaths.values()):
+            parser = datapath.ofproto_parser
+            datapath.send_msg(parser.OFPPortStatsRequest(datapath, 0, datapath.ofproto.OFPP_ANY))
+            datapath.send_msg(parser.OFPFlowStatsRequest(datapath))
+        self.traffic.polls += 1
+
+    def port_of(self, dpid, link):
+        """Port number of `link` on switch `dpid` (configured, else by name), or None."""
+        if link.port is not None:
+            return link.port
+        return next((no for no, name in self.port_names.get(dpid, {}).items() if name == link.iface), None)
+
+    def update_port_stats(self, dpid, stats, now):
+        self.traffic.port_reply(dpid, now, ((s.port_no, port_counters(s)) for s in stats))
+
+    def update_flow_stats(self, dpid, stats, now):
+        """One poll's flow entries, after its port reply: flow rates, headroom, MAC refresh."""
+        # Learned flows only (priority 1, and 2 for queue classes); the cookie tells a group's flows apart
+        body = [s for s in stats if s.priority > 0]
+        flows = (((s.match.get('in_port'), s.match.get('eth_dst'), s.cookie), s.match.get('in_port'),
+                  s.byte_count, s.packet_count, s.duration_sec + s.duration_nsec / 1e9) for s in body)
+        self.traffic.flow_reply(dpid, flows)
+        for link in self.traffic.adjust(self.links, dpid, lambda link: self.port_of(dpid, link)):
+            self.logger.info(f"{link.iface}: {link.measured_bps / 1e3:.0f} kbps measured, "
+                             f"{link.lost_bps / 1e3:.0f} kbps lost, headroom now {link.headroom:.2f}")
+            if link.last_bitrate is not None:
+                # Re-decide on the last telemetry rate; newer telemetry pending wins
+                self.qos_pipeline.submit(link.link_id, link.last_bitrate, replace=False)
+        # Hosts the installed flows still forward to stay learned
+        table = self.mac_to_port.table(dpid)
+        for dst in {s.match.get('eth_dst') for s in body} - {None}:
+            table.refresh(dst, now)
+
+    @set_ev_cls(ofp_event.EventOFPPortStatsReply, MAIN_DISPATCHER)
+    def port_stats_reply_handler(self, ev):
+        self.update_port_stats(ev.msg.datapath.id, ev.msg.body, time.monotonic())
+        self.logger.debug(f"Port stats: {self.traffic.summary()}")
+
+    @set_ev_cls(ofp_event.EventOFPFlowStatsReply, MAIN_DISPATCHER)
+    def flow_stats_reply_handler(self, ev):
+        # Large tables come in several parts: handle the whole reply at once
+        msg = ev.msg
+        dpid = msg.datapath.id
+        parts = self.flow_parts.setdefault(dpid, [])
+        parts.extend(msg.body)
+        if msg.flags & msg.datapath.ofproto.OFPMPF_REPLY_MORE:
+            return
+        del self.flow_parts[dpid]
+        self.update_flow_stats(dpid, parts, time.monotonic())
+
+    def expire_hosts(self):
+        """Age out MACs no flow has refreshed, with whatever is left of their flows."""
+        for dpid, macs in self.mac_to_port.expire().items():
+            for mac in macs:
+                for in_port in self.flow_ports.pop((dpid, mac), ()):
+                    self.flow_groups.pop((dpid, mac, in_port), None)
+                    self.flow_changes += 1
+
+    def close(self):
+        if self.snapshot:
+            self.save_snapshot()
+        if self.feedback:
+            self.feedback.close()
+        super(SDRQoSOrchestrator, self).close()
     
     def zmq_listener(self):
         socket = self.zmq_ctx.socket(zmq.SUB)
         socket.connect("tcp://127.0.0.1:5555")
         socket.setsockopt_string(zmq.SUBSCRIBE, "BITRATE")
         self.logger.info("ZeroMQ listener started, waiting for bitrate messages...")
+        metrics = self.metrics
         
         while True:
             try:
-                msg = socket.recv_string()
-                topic, bitrate_str = msg.split()
-                bitrate = float(bitrate_str)
-                self.enforce_qos(bitrate)
+                # Green wait: other green threads run while the socket is idle
+                batch = [socket.recv_multipart(copy=False)]
+                received_at = time.monotonic()
+
+                # Drain whatever else is already queued without waiting
+                try:
+                    while len(batch) < ZMQ_MAX_BATCH:
+                        batch.append(socket.recv_multipart(zmq.NOBLOCK, copy=False))
+                        received_at = time.monotonic()
+                except zmq.Again:
+                    pass
+                self.zmq_received += len(batch)
+                metrics.zmq_batches.inc()
+                metrics.zmq_messages.inc(len(batch))
+
+                # Binary frames and both legacy formats go through the shared codec;
+                # only the newest rate per link of the batch is worth enforcing
+                latest = {}
+                for parts in batch:
+                    start = perf_counter()
+                    try:
+                        latest.update(self.links.latest(parts))
+                    except telemetry_codec.CodecError:
+                        metrics.undecodable.inc()
+                        self.logger.warning("Ignoring undecodable telemetry message")
+                    metrics.parse.observe(perf_counter() - start)
+
+                for link, bitrate in latest.items():
+                    self.qos_pipeline.submit(link.link_id, bitrate, received_at)
+                if self.zmq_received % 1000 < len(batch):
+                    self.logger.debug(f"ZMQ: {self.zmq_received} msgs, {self.qos_pipeline.summary()}, "
+                                      f"{sum(l.rate_state.avoided for l in self.links)} avoided by policy")
+
+                # Socket still busy: green recv would return at once, so yield explicitly
+                if len(batch) == ZMQ_MAX_BATCH:
+                    hub.sleep(0)
             except Exception as e:
                 self.logger.error(f"ZMQ Error: {e}")
-            hub.sleep(0.1)  # Yield to other green threads
+                hub.sleep(0.1)  # Back off on persistent socket errors
     
-    def enforce_qos(self, bitrate):
-        rate_kbps = int(bitrate / 1000)
-        burst = int(rate_kbps / 10)
-        self.logger.info(f"SDR Telemetry -> Rate: {rate_kbps}kbps, Burst: {burst}kb")
-        # OVS commands to enforce physical layer constraints on the data plane
-        os.system(f"ovs-vsctl set interface s1-eth2 ingress_policing_rate={rate_kbps}")
-        os.system(f"ovs-vsctl set interface s1-eth2 ingress_policing_burst={burst}")
+    def apply_link(self, link_id, bitrate):
+        self.enforce_qos(bitrate, self.links.get(link_id))
+
+    def enforce_qos(self, bitrate, link=None, now=None):
+        # `now` is the policy's clock (default: time.monotonic(); netsim.py passes simulated time)
+        if link is None:
+            link = self.links.default
+        # The link's policy decides whether this sample is worth a reconfiguration
+        # (headroom > 1 only once port statistics show the path carries more)
+        metrics = self.metrics
+        start = perf_counter()
+        decision = link.policy.decide(link.rate_state, link.last_kbps, bitrate * link.headroom, now)
+        metrics.decide.observe(perf_counter() - start)
+        if decision is None:
+            metrics.holds.inc()
+            # ...unless a reconnected switch needs the current rate again
+            if not link.reassert or link.last_kbps is None:
+                return
+            decision = (link.last_kbps, link.policy.burst_kbps(link.last_kbps))
+        else:
+            metrics.changes.inc()
+        rate_kbps, burst = decision
+        self.logger.info(f"SDR Telemetry -> {link.iface} Rate: {rate_kbps}kbps, Burst: {burst}kb")
+        # Enforce physical layer constraints on the data plane (one OVSDB transaction)
+        start = perf_counter()
+        applied = self.qos_backend.set_policing(link.iface, rate_kbps, burst)
+        metrics.apply.observe(perf_counter() - start)
+        if applied:
+            metrics.link_rate(link, rate_kbps)
+            link.last_kbps = rate_kbps
+            link.last_bitrate = bitrate
+            link.reassert = False
+            link.updates += 1
+            if self.feedback:
+                self.feedback.publish(link.link_id, rate_kbps)
+            self.logger.debug(f"QoS applied via {self.qos_backend.name}: {self.qos_backend.latency}")
+        else:
+            metrics.apply_failures.inc()
+            link.failures += 1
+
+    def reassert_qos(self, dpid):
+        """Re-apply the last enforced rate of every link on switch `dpid`."""
+        for link in self.links:
+            if link.last_bitrate is None or link.dpid not in (None, dpid):
+                continue
+            link.reassert = True
+            # Newer telemetry already pending wins over the remembered rate
+            self.qos_pipeline.submit(link.link_id, link.last_bitrate, replace=False)
     
     @set_ev_cls(ofp_event.EventOFPSwitchFeatures, CONFIG_DISPATCHER)
     def switch_features_handler(self, ev):
@@ -55,51 +361,193 @@ class SDRQoSOrchestrator(app_manager.OSKenApp):
                                          ofproto.OFPCML_NO_BUFFER)]
         self.add_flow(datapath, 0, match, actions)
         self.logger.info("Switch connected - table-miss flow installed")
+        self.datapaths[datapath.id] = datapath
+
+        if isinstance(self.qos_backend, MeterBackend):
+            self.qos_backend.add_datapath(datapath)
+        if isinstance(self.qos_backend, MeterBackend) or self.queue_plan or STATS_INTERVAL > 0:
+            # Port names map a flow's in_port or out_port (or a port's statistics) to its link
+            datapath.send_msg(parser.OFPPortDescStatsRequest(datapath, 0))
+
+        installed = self.reinstall_flows(datapath)
+        self.reassert_qos(datapath.id)
+        if installed:
+            self.logger.info(f"Switch {datapath.id}: {installed} learned flows re-installed")
+
+    def reinstall_flows(self, datapath):
+        """Push the learned flows of a (re)connected switch again; returns how many."""
+        dpid = datapath.id
+        table = self.mac_to_port.table(dpid)
+        parser = datapath.ofproto_parser
+        installed = 0
+        for key in [k for k in self.flow_ports if k[0] == dpid]:
+            dst = key[1]
+            out_port = table.lookup(dst)
+            if out_port is None:
+                # Host aged out while the switch was away
+                for in_port in self.flow_ports.pop(key):
+                    self.flow_groups.pop((dpid, dst, in_port), None)
+                self.flow_changes += 1
+                continue
+            for in_port in self.flow_ports[key]:
+                match = parser.OFPMatch(in_port=in_port, eth_dst=dst)
+                actions = self.forward_actions(datapath, in_port, dst, out_port)
+                self.add_flow(datapath, 1, match, actions, meter=self.meter_for(datapath, in_port),
+                              idle_timeout=FLOW_IDLE_TIMEOUT)
+                installed += 1
+        return installed
+
+    @set_ev_cls(ofp_event.EventOFPStateChange, DEAD_DISPATCHER)
+    def state_change_handler(self, ev):
+        datapath = ev.datapath
+        self.dp_cache.pop(datapath.id, None)
+        if self.datapaths.get(datapath.id) is datapath:
+            del self.datapaths[datapath.id]
+            self.traffic.forget(datapath.id)
+            self.flow_parts.pop(datapath.id, None)
+        # Learned MACs and flow_ports are kept: the flows are re-installed on reconnect
+        if datapath.id is not None and isinstance(self.qos_backend, MeterBackend):
+            self.qos_backend.remove_datapath(datapath.id)
+
+    def datapath_consts(self, datapath):
+        """Per-datapath (ofproto, parser, OFPP_FLOOD, OFP_NO_BUFFER), looked up once."""
+        consts = self.dp_cache.get(datapath.id)
+        if consts is None or consts[1] is not datapath.ofproto_parser:
+            ofproto = datapath.ofproto
+            consts = (ofproto, datapath.ofproto_parser, ofproto.OFPP_FLOOD, ofproto.OFP_NO_BUFFER)
+            self.dp_cache[datapath.id] = consts
+        return consts
+
+    @set_ev_cls(ofp_event.EventOFPPortDescStatsReply, MAIN_DISPATCHER)
+    def port_desc_stats_reply_handler(self, ev):
+        datapath = ev.msg.datapath
+        self.port_names[datapath.id] = {p.port_no: p.name.decode(errors="replace") for p in ev.msg.body}
+
+    def meter_for(self, datapath, in_port):
+        """Meter instruction for flows entering from a link's port, else None."""
+        if not isinstance(self.qos_backend, MeterBackend):
+            return None
+        link = self.links.for_port(datapath.id, in_port)
+        if link is None:
+            link = self.links.for_iface(self.port_names.get(datapath.id, {}).get(in_port))
+        if link is None:
+            return None
+        return self.qos_backend.meter_instruction(datapath, link.iface)
     
-    def add_flow(self, datapath, priority, match, actions):
-        ofproto = datapath.ofproto
+    def queued(self, dpid, port):
+        """True if `port` of switch `dpid` is a link's port with HTB queues (queue mode)."""
+        if self.queue_plan is None:
+            return False
+        return any(self.port_of(dpid, link) == port for link in self.links if link.dpid in (None, dpid))
+
+    def forward_actions(self, datapath, in_port, dst, out_port):
+        """
+        Actions of the learned flow (in_port, dst) -> out_port. Towards a queued
+        port they pick queue 0, and each class rule gets a more specific flow
+        into its own queue, installed here. The flows (cookie 0 for queue 0,
+        i + 1 for rule i) expire as one group: a video-only host may leave
+        its queue 0 flow idle while its class flow carries all the traffic.
+        """
         parser = datapath.ofproto_parser
+        output = parser.OFPActionOutput(out_port)
+        if not self.queued(datapath.id, out_port):
+            self.flow_groups.pop((datapath.id, dst, in_port), None)
+            return [output]
+        for cookie, (queue_id, rule) in enumerate(self.queue_plan.rules, 1):
+            match = parser.OFPMatch(in_port=in_port, eth_dst=dst, **of13_match(rule))
+            self.add_flow(datapath, 2, match, [parser.OFPActionSetQueue(queue_id), output],
+                          idle_timeout=FLOW_IDLE_TIMEOUT, cookie=cookie)
+        if FLOW_IDLE_TIMEOUT:
+            self.flow_groups[(datapath.id, dst, in_port)] = set(range(len(self.queue_plan.rules) + 1))
+        return [parser.OFPActionSetQueue(0), output]
+
+    def add_flow(self, datapath, priority, match, actions, meter=None, idle_timeout=0, cookie=0):
+        ofproto, parser, _, _ = self.datapath_consts(datapath)
         inst = [parser.OFPInstructionActions(ofproto.OFPIT_APPLY_ACTIONS, actions)]
-        mod = parser.OFPFlowMod(datapath=datapath, priority=priority,
-                               match=match, instructions=inst)
+        if meter is not None:
+            inst.insert(0, meter)
+        # Flows that can expire report back so the MAC table stays in sync
+        flags = ofproto.OFPFF_SEND_FLOW_REM if idle_timeout else 0
+        mod = parser.OFPFlowMod(datapath=datapath, cookie=cookie, priority=priority,
+                               match=match, instructions=inst,
+                               idle_timeout=idle_timeout, flags=flags)
         datapath.send_msg(mod)
+
+    @set_ev_cls(ofp_event.EventOFPFlowRemoved, MAIN_DISPATCHER)
+    def flow_removed_handler(self, ev):
+        msg = ev.msg
+        dpid = msg.datapath.id
+        dst = msg.match.get('eth_dst')
+        in_port = msg.match.get('in_port')
+        group = self.flow_groups.get((dpid, dst, in_port))
+        if group is not None:
+            group.discard(msg.cookie)
+            if group:
+                return  # Other flows of the (in_port, dst) queue group are still installed
+            del self.flow_groups[(dpid, dst, in_port)]
+        ports = self.flow_ports.get((dpid, dst))
+        if ports is None:
+            return
+        if in_port in ports:
+            ports.discard(in_port)
+            self.flow_changes += 1
+        if not ports:
+            # Nothing forwards to dst any more: forget it until it is heard from again
+            del self.flow_ports[(dpid, dst)]
+            self.flow_changes += 1
+            self.mac_to_port.table(dpid).remove(dst)
     
     @set_ev_cls(ofp_event.EventOFPPacketIn, MAIN_DISPATCHER)
     def _packet_in_handler(self, ev):
+        start = perf_counter()
         msg = ev.msg
         datapath = msg.datapath
-        ofproto = datapath.ofproto
-        parser = datapath.ofproto_parser
+        ofproto, parser, flood, no_buffer = self.datapath_consts(datapath)
         in_port = msg.match['in_port']
         
-        pkt = packet.Packet(msg.data)
-        eth = pkt.get_protocols(ethernet.ethernet)[0]
-        dst = eth.dst
-        src = eth.src
+        # Only the Ethernet addresses are needed: slice them out of the header and
+        # use the full parser only if that fails (or the fast path is switched off)
+        addrs = eth_addresses(msg.data) if PACKET_IN_FAST_PATH else None
+        if addrs is None:
+            addrs = eth_addresses_full(msg.data)
+            if addrs is None:
+                return
+        src, dst = addrs
         dpid = datapath.id
         
-        self.mac_to_port.setdefault(dpid, {})
+        table = self.mac_to_port.table(dpid)
         
         # Learn MAC address to avoid future packet_ins
-        self.mac_to_port[dpid][src] = in_port
+        table.learn(src, in_port)
         
-        if dst in self.mac_to_port[dpid]:
-            out_port = self.mac_to_port[dpid][dst]
-        else:
-            out_port = ofproto.OFPP_FLOOD
+        out_port = table.lookup(dst)
+        if out_port is None:
+            out_port = flood
         
         actions = [parser.OFPActionOutput(out_port)]
         
         # If we know the port, install a flow to stay in the data plane
-        if out_port != ofproto.OFPP_FLOOD:
+        if out_port != flood:
+            if self.queue_plan is not None:
+                actions = self.forward_actions(datapath, in_port, dst, out_port)
             match = parser.OFPMatch(in_port=in_port, eth_dst=dst)
-            self.add_flow(datapath, 1, match, actions)
-            self.logger.info(f"Flow installed: {src} -> {dst} via port {out_port}")
+            self.add_flow(datapath, 1, match, actions, meter=self.meter_for(datapath, in_port),
+                          idle_timeout=FLOW_IDLE_TIMEOUT)
+            if FLOW_IDLE_TIMEOUT:
+                ports = self.flow_ports.get((dpid, dst))
+                if ports is None:
+                    ports = self.flow_ports[(dpid, dst)] = set()
+                if in_port not in ports:
+                    ports.add(in_port)
+                    self.flow_changes += 1
+            if self.logger.isEnabledFor(logging.DEBUG):
+                self.logger.debug(f"Flow installed: {src} -> {dst} via port {out_port}")
         
         data = None
-        if msg.buffer_id == ofproto.OFP_NO_BUFFER:
+        if msg.buffer_id == no_buffer:
             data = msg.data
         
         out = parser.OFPPacketOut(datapath=datapath, buffer_id=msg.buffer_id,
                                  in_port=in_port, actions=actions, data=data)
-        datapath.send_msg(out)
\ No newline at end of file
+        datapath.send_msg(out)
+        self.metrics.packet_in.observe(perf_counter() - start)
\ No newline at end of file
@@ -0,0 +1,246 @@
+"""
+QoS enforcement backends shared by the POX and OS-Ken controllers.
+
+Each backend applies an ingress policing (rate, burst) pair to a switch
+interface and records how long every update took.
+
+- "ovsdb": persistent JSON-RPC connection, rate and burst in one
+  transaction (falls back to "vsctl" if ovsdb-server is unreachable)
+- "vsctl": shells out to `ovs-vsctl`, the original behaviour
+- "meter": OpenFlow 1.3 meters sent over the controller's own channel
+  (OS-Ken only, POX speaks OpenFlow 1.0)
+- "htb": no policing; the rate is the ceiling of HTB queues on the
+  interface, split by traffic class (queues.py)
+"""
+import logging
+import subprocess
+import time
+
+from latency import LatencyStats
+from ovsdb import DEFAULT_ENDPOINT, OvsdbConnectionError, OvsdbPool
+from queues import QueuePlan
+
+log = logging.getLogger("sdr.qos")
+
+
+class QosBackend(object):
+    """Base class: subclasses implement _apply(iface, rate_kbps, burst_kbps)."""
+
+    name = "base"
+
+    def __init__(self):
+        self.latency = LatencyStats()
+        self.updates = 0
+        self.failures = 0
+
+    def set_policing(self, iface, rate_kbps, burst_kbps):
+        """Apply the pair; returns True on success and never raises."""
+        start = time.perf_counter()
+        try:
+            self._apply(iface, int(rate_kbps), int(burst_kbps))
+        except Exception as e:
+            self.failures += 1
+            log.warning(f"{self.name}: QoS update on {iface} failed: {e}")
+            return False
+        self.latency.record(time.perf_counter() - start)
+        self.updates += 1
+        return True
+
+    def _apply(self, iface, rate_kbps, burst_kbps):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class VsctlBackend(QosBackend):
+    """Fork `ovs-vsctl`; both columns go in one invocation (one transaction)."""
+
+    name = "vsctl"
+
+    def __init__(self, vsctl="ovs-vsctl"):
+        super(VsctlBackend, self).__init__()
+        self.vsctl = vsctl
+
+    def _apply(self, iface, rate_kbps, burst_kbps):
+        subprocess.run([self.vsctl, "set", "interface", iface,
+                        f"ingress_policing_rate={rate_kbps}",
+                        f"ingress_policing_burst={burst_kbps}"],
+                       check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+
+class OvsdbBackend(QosBackend):
+    """
+    Talk to ovsdb-server directly over a pooled persistent connection.
+
+    Args:
+        endpoint: ovsdb-server socket, e.g. 'unix:/var/run/openvswitch/db.sock'
+        pool_size: Number of connections kept open
+        fallback: Backend used for an update when OVSDB is unreachable
+    """
+
+    name = "ovsdb"
+
+    def __init__(self, endpoint=DEFAULT_ENDPOINT, pool_size=2, fallback=None):
+        super(OvsdbBackend, self).__init__()
+        self.pool = OvsdbPool(endpoint, size=pool_size)
+        self.fallback = fallback
+        self.fallbacks = 0
+
+    def _apply(self, iface, rate_kbps, burst_kbps):
+        try:
+            with self.pool.connection() as client:
+                client.set_policing(iface, rate_kbps, burst_kbps)
+        except OvsdbConnectionError:
+            if self.fallback is None:
+                raise
+            self.fallbacks += 1
+            if not self.fallback.set_policing(iface, rate_kbps, burst_kbps):
+                raise
+
+    def close(self):
+        self.pool.close()
+
+
+class MeterBackend(QosBackend):
+    """
+    Rate limit with OpenFlow 1.3 meters instead of interface policing.
+
+    Every key (an interface name or any per-flow label) gets its own meter
+    id. An update is one OFPMeterMod per connected switch; flows opt in by
+    carrying meter_instruction(). Recorded latency is the time to build
+    and queue the messages, not the switch's apply time.
+
+    Args:
+        initial_kbps: Rate a meter is created with before the first update
+        initial_burst: Burst size (kb) for that initial rate
+    """
+
+    name = "meter"
+
+    def __init__(self, initial_kbps=10000000, initial_burst=1000000):
+        super(MeterBackend, self).__init__()
+        self.datapaths = {}   # dpid -> datapath
+        self.meter_ids = {}   # key -> meter id
+        self.rates = {}       # key -> (rate_kbps, burst_kbps) last requested
+        self.installed = set()  # (dpid, meter id) already added on the switch
+        self.initial = (initial_kbps, initial_burst)
+
+    def meter_id(self, key):
+        if key not in self.meter_ids:
+            self.meter_ids[key] = len(self.meter_ids) + 1
+        return self.meter_ids[key]
+
+    def add_datapath(self, datapath):
+        """Register a switch and (re)create every known meter on it."""
+        self.datapaths[datapath.id] = datapath
+        self.installed = {m for m in self.installed if m[0] != datapath.id}
+        for key in self.meter_ids:
+            self._send(datapath, key, *self.rates.get(key, self.initial))
+
+    def remove_datapath(self, dpid):
+        self.datapaths.pop(dpid, None)
+        self.installed = {m for m in self.installed if m[0] != dpid}
+
+    def meter_instruction(self, datapath, key):
+        """OFPInstructionMeter for `key`, creating the meter on this switch if needed."""
+        meter_id = self.meter_id(key)
+        if (datapath.id, meter_id) not in self.installed:
+            self._send(datapath, key, *self.rates.get(key, self.initial))
+        return datapath.ofproto_parser.OFPInstructionMeter(meter_id, datapath.ofproto.OFPIT_METER)
+
+    def _send(self, datapath, key, rate_kbps, burst_kbps):
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+        meter_id = self.meter_id(key)
+        installed = (datapath.id, meter_id) in self.installed
+        mod = parser.OFPMeterMod(datapath,
+                                 command=ofproto.OFPMC_MODIFY if installed else ofproto.OFPMC_ADD,
+                                 flags=ofproto.OFPMF_KBPS | ofproto.OFPMF_BURST,
+                                 meter_id=meter_id,
+                                 bands=[parser.OFPMeterBandDrop(rate=rate_kbps, burst_size=burst_kbps)])
+        datapath.send_msg(mod)
+        self.installed.add((datapath.id, meter_id))
+
+    def _apply(self, key, rate_kbps, burst_kbps):
+        self.rates[key] = (rate_kbps, burst_kbps)
+        if not self.datapaths:
+            raise RuntimeError("no switch connected")
+        for datapath in list(self.datapaths.values()):
+            self._send(datapath, key, rate_kbps, burst_kbps)
+
+
+class HtbBackend(QosBackend):
+    """
+    Egress HTB queues instead of ingress policing, through `ovs-vsctl`.
+
+    The first update of an interface creates its linux-htb QoS and one
+    Queue per plan entry and turns ingress policing off; the UUIDs
+    ovs-vsctl prints are kept. Every later update resizes the QoS ceiling
+    and all queues in one invocation, so one OVSDB transaction. An update
+    that fails drops the UUIDs, so the next one creates the records again
+    (OVS restarted). Burst is the queues' HTB burst.
+
+    Args:
+        plan: QueuePlan splitting the rate over queues
+        vsctl: ovs-vsctl binary
+    """
+
+    name = "htb"
+
+    def __init__(self, plan=None, vsctl="ovs-vsctl"):
+        super(HtbBackend, self).__init__()
+        self.plan = plan or QueuePlan()
+        self.vsctl = vsctl
+        self.records = {}  # iface -> (QoS UUID, {queue id: Queue UUID})
+
+    def _queue_config(self, min_kbps, max_kbps, priority, burst_kbps):
+        return [f"other-config:min-rate={min_kbps * 1000}", f"other-config:max-rate={max_kbps * 1000}",
+                f"other-config:priority={priority}", f"other-config:burst={burst_kbps * 1000}"]
+
+    def _apply(self, iface, rate_kbps, burst_kbps):
+        rates = self.plan.queue_rates(rate_kbps)
+        record = self.records.get(iface)
+        if record is None:
+            args = ["--", "set", "interface", iface, "ingress_policing_rate=0", "ingress_policing_burst=0",
+                    "--", "set", "port", iface, "qos=@qos",
+                    "--", "--id=@qos", "create", "qos", "type=linux-htb", f"other-config:max-rate={rate_kbps * 1000}"]
+            args += [f"queues:{queue_id}=@q{queue_id}" for queue_id, _, _, _ in rates]
+            for queue_id, min_kbps, max_kbps, priority in rates:
+                args += ["--", f"--id=@q{queue_id}", "create", "queue"]
+                args += self._queue_config(min_kbps, max_kbps, priority, burst_kbps)
+            # One UUID per created record, in command order
+            uuids = self._run(args).split()
+            if len(uuids) != len(rates) + 1:
+                raise RuntimeError(f"expected {len(rates) + 1} UUIDs from {self.vsctl}, got {uuids!r}")
+            self.records[iface] = (uuids[0], {queue_id: uuid for (queue_id, _, _, _), uuid in zip(rates, uuids[1:])})
+            return
+        qos, queues = record
+        args = ["--", "set", "qos", qos, f"other-config:max-rate={rate_kbps * 1000}"]
+        for queue_id, min_kbps, max_kbps, priority in rates:
+            args += ["--", "set", "queue", queues[queue_id]]
+            args += self._queue_config(min_kbps, max_kbps, priority, burst_kbps)
+        try:
+            self._run(args)
+        except subprocess.CalledProcessError:
+            # Records gone (OVS restarted, port reconfigured): recreate on the next update
+            del self.records[iface]
+            raise
+
+    def _run(self, args):
+        return subprocess.run([self.vsctl] + args, check=True, stdout=subprocess.PIPE,
+                              stderr=subprocess.PIPE, universal_newlines=True).stdout
+
+
+def make_backend(name="ovsdb", endpoint=DEFAULT_ENDPOINT, pool_size=2, **kwargs):
+    """
+    Build a backend by name; 'ovsdb' keeps 'vsctl' as its fallback.
+    pool_size should match the number of threads applying updates.
+    """
+    if name == "vsctl":
+        return VsctlBackend(**kwargs)
+    if name == "ovsdb":
+        return OvsdbBackend(endpoint, pool_size, fallback=VsctlBackend(), **kwargs)
+    if name == "htb":
+        return HtbBackend(**kwargs)
+    raise ValueError(f"Unknown QoS backend: {name!r}")
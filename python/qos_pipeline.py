@@ -0,0 +1,169 @@
+"""
+Latest-value-wins QoS update pipeline.
+
+    ZMQ socket --(drain_socket)--> CoalescingSlot --(worker)--> apply(key, value)
+
+The receive stage empties the socket in bulk and never waits on OVS. The
+slot keeps only the newest value per key (interface), so a burst of
+telemetry collapses into one update. A single worker applies whatever is
+pending at no more than `max_rate` rounds per second.
+
+ShardedQosPipeline runs several such pipelines for many links: a key
+always hashes to the same worker, so updates to one link stay in order
+while different links are applied concurrently.
+"""
+import threading
+import time
+
+import zmq
+
+from latency import LatencyStats
+
+
+class CoalescingSlot(object):
+    """Holds at most one pending (value, received_at) per key."""
+
+    def __init__(self):
+        self.pending = {}
+        self.cond = threading.Condition()
+
+    def put(self, key, value, received_at=None, replace=True):
+        """
+        Store `value`; returns True if it overwrote an unapplied value.
+        With replace=False a value already pending for `key` is kept instead.
+        """
+        if received_at is None:
+            received_at = time.monotonic()
+        with self.cond:
+            replaced = key in self.pending
+            if replaced and not replace:
+                return False
+            self.pending[key] = (value, received_at)
+            self.cond.notify()
+        return replaced
+
+    def take(self, timeout=None):
+        """Wait for pending values and return them all as {key: (value, ts)}."""
+        with self.cond:
+            if not self.pending:
+                self.cond.wait(timeout)
+            batch, self.pending = self.pending, {}
+        return batch
+
+
+def drain_socket(socket, max_batch=1000, timeout_ms=1000, copy=True):
+    """
+    Receive every message currently queued on `socket`.
+
+    Blocks up to `timeout_ms` for the first message, then keeps reading
+    with NOBLOCK until the queue is empty or `max_batch` is reached.
+    ZMQ_CONFLATE cannot be used here because it drops multipart frames.
+    With copy=False the parts are zmq.Frame objects (zero-copy).
+    """
+    if not socket.poll(timeout_ms, zmq.POLLIN):
+        return []
+    messages = []
+    try:
+        while len(messages) < max_batch:
+            messages.append(socket.recv_multipart(zmq.NOBLOCK, copy=copy))
+    except zmq.Again:
+        pass
+    return messages
+
+
+class QosPipeline(object):
+    """
+    Decouples telemetry reception from QoS enforcement.
+
+    Args:
+        apply: Callable(key, value) doing the (slow) enforcement
+        max_rate: Maximum apply rounds per second (0 = unlimited)
+        age: LatencyStats to record into (lets several pipelines share one)
+    """
+
+    def __init__(self, apply, max_rate=20.0, age=None):
+        self.apply = apply
+        self.min_interval = 1.0 / max_rate if max_rate > 0 else 0.0
+        self.slot = CoalescingSlot()
+
+        # Counters
+        self.received = 0
+        self.coalesced = 0
+        self.applied = 0
+        self.age = age if age is not None else LatencyStats()  # received -> applied, per applied value
+
+        self.running = True
+        self.worker = threading.Thread(target=self._worker, daemon=True)
+        self.worker.start()
+
+    def submit(self, key, value, received_at=None, replace=True):
+        self.received += 1
+        if self.slot.put(key, value, received_at, replace):
+            self.coalesced += 1
+
+    def _worker(self):
+        while self.running:
+            batch = self.slot.take(timeout=1.0)
+            if not batch:
+                continue
+            round_start = time.monotonic()
+            for key, (value, received_at) in batch.items():
+                try:
+                    self.apply(key, value)
+                except Exception:
+                    pass  # apply() logs its own failures; keep the worker alive
+                self.applied += 1
+                self.age.record(time.monotonic() - received_at)
+
+            # Rate limit: values arriving meanwhile coalesce in the slot
+            delay = round_start + self.min_interval - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+    def stop(self):
+        self.running = False
+        with self.slot.cond:
+            self.slot.cond.notify()
+        self.worker.join(timeout=2.0)
+
+    def summary(self):
+        return (f"received={self.received} coalesced={self.coalesced} "
+                f"applied={self.applied} age[{self.age}]")
+
+
+class ShardedQosPipeline(object):
+    """
+    Bounded pool of QosPipeline workers, one key always on the same worker.
+
+    Args:
+        apply: Callable(key, value); must be safe to call from several threads
+        workers: Number of worker threads (and coalescing slots)
+        max_rate: Maximum apply rounds per second per worker (0 = unlimited)
+    """
+
+    def __init__(self, apply, workers=4, max_rate=20.0):
+        self.age = LatencyStats()
+        self.shards = [QosPipeline(apply, max_rate, self.age) for _ in range(max(1, workers))]
+
+    def submit(self, key, value, received_at=None, replace=True):
+        self.shards[hash(key) % len(self.shards)].submit(key, value, received_at, replace)
+
+    def stop(self):
+        for shard in self.shards:
+            shard.stop()
+
+    @property
+    def received(self):
+        return sum(s.received for s in self.shards)
+
+    @property
+    def coalesced(self):
+        return sum(s.coalesced for s in self.shards)
+
+    @property
+    def applied(self):
+        return sum(s.applied for s in self.shards)
+
+    def summary(self):
+        return (f"workers={len(self.shards)} received={self.received} "
+                f"coalesced={self.coalesced} applied={self.applied} age[{self.age}]")
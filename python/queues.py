@@ -0,0 +1,157 @@
+"""
+Queue-based QoS: HTB queues on a link's egress port instead of ingress policing.
+
+Policing drops every flow entering the port alike, so when the radio link
+degrades the video is cut as hard as bulk traffic. In queue mode the
+enforced rate becomes the ceiling of a linux-htb QoS on the egress port,
+split into queues:
+
+- queue 0 takes whatever matches no class (the default class);
+- every configured class gets its own queue with a guaranteed share of
+  the rate, and borrows up to the whole rate when the others are idle;
+- lower priority numbers are served first when spare rate is shared out.
+
+Flows are steered into queues by class rules (IP protocol, transport
+port, DSCP). The controllers turn every learned flow towards a queued
+port into one flow per rule (enqueue / set-queue) plus the flow to
+queue 0. Like forwarding.py this module has no OpenFlow types in it.
+
+Classes file (JSON):
+
+    {"classes": [
+        {"name": "video", "queue": 1, "share": 0.8, "priority": 0,
+         "match": [{"ip_proto": 17, "tp_dst": 1234}, {"dscp": 34}]},
+        {"name": "voice", "queue": 2, "share": 0.1, "match": [{"dscp": 46}]}
+    ], "default_priority": 2}
+"""
+import json
+
+IPV4 = 0x0800
+TCP = 6
+UDP = 17
+MATCH_FIELDS = ("ip_proto", "tp_src", "tp_dst", "dscp")
+
+
+class TrafficClass(object):
+    """
+    One class of flows and the queue it is steered into.
+
+    Args:
+        name: Label for logs
+        queue_id: OVS queue number (> 0; 0 is the default class)
+        share: Fraction of the link rate guaranteed to the class
+        priority: HTB priority when spare rate is shared (lower first)
+        matches: Match dicts over MATCH_FIELDS; a flow matching any is in the class
+        ceil: Fraction of the link rate the class may borrow up to
+    """
+
+    def __init__(self, name, queue_id, share, priority=0, matches=(), ceil=1.0):
+        if queue_id <= 0:
+            raise ValueError(f"Class {name!r}: queue 0 is the default class")
+        if not 0.0 <= share <= ceil <= 1.0:
+            raise ValueError(f"Class {name!r}: need 0 <= share <= ceil <= 1")
+        self.name = name
+        self.queue_id = int(queue_id)
+        self.share = float(share)
+        self.priority = int(priority)
+        self.ceil = float(ceil)
+        self.matches = [_check_match(name, m) for m in matches]
+
+    def __repr__(self):
+        return f"TrafficClass({self.name!r}, queue={self.queue_id}, share={self.share})"
+
+
+def _check_match(name, match):
+    unknown = set(match) - set(MATCH_FIELDS)
+    if unknown or not match:
+        raise ValueError(f"Class {name!r}: bad match {match!r} (fields: {', '.join(MATCH_FIELDS)})")
+    if ("tp_src" in match or "tp_dst" in match) and match.get("ip_proto") not in (TCP, UDP):
+        raise ValueError(f"Class {name!r}: a transport port needs ip_proto 6 (TCP) or 17 (UDP)")
+    if not 0 <= match.get("dscp", 0) < 64:
+        raise ValueError(f"Class {name!r}: DSCP is 0-63")
+    return {field: int(match[field]) for field in MATCH_FIELDS if field in match}
+
+
+# The README's video experiment: MPEG-TS over UDP to port 1234, or anything marked AF41
+DEFAULT_CLASSES = (TrafficClass("video", 1, share=0.8, priority=0, matches=[{"ip_proto": UDP, "tp_dst": 1234},
+                                                                            {"dscp": 34}]),)
+
+
+class QueuePlan(object):
+    """
+    Queue layout of a queued port and how a link rate is split over it.
+
+    Args:
+        classes: TrafficClass list; their shares must leave room for the default class
+        default_priority: HTB priority of queue 0
+    """
+
+    def __init__(self, classes=DEFAULT_CLASSES, default_priority=1):
+        self.classes = sorted(classes, key=lambda c: c.queue_id)
+        ids = [c.queue_id for c in self.classes]
+        if len(set(ids)) != len(ids):
+            raise ValueError(f"Duplicate queue ids in {self.classes}")
+        self.default_share = 1.0 - sum(c.share for c in self.classes)
+        if self.default_share < 0.0:
+            raise ValueError("Class shares add up to more than 1")
+        self.default_priority = int(default_priority)
+        # (queue id, match) in the order flows are installed: one flow per rule
+        self.rules = [(c.queue_id, m) for c in self.classes for m in c.matches]
+
+    @property
+    def queue_ids(self):
+        return [0] + [c.queue_id for c in self.classes]
+
+    def queue_rates(self, rate_kbps):
+        """[(queue id, min kbps, max kbps, priority)] for a link rate, queue 0 first."""
+        rates = [(c.queue_id, int(round(rate_kbps * c.share)), int(round(rate_kbps * c.ceil)), c.priority)
+                 for c in self.classes]
+        # The default class gets what the classes leave, so the minimums add up to the rate
+        leftover = max(0, int(rate_kbps) - sum(r[1] for r in rates))
+        rates.insert(0, (0, leftover, int(rate_kbps), self.default_priority))
+        return rates
+
+    def classify(self, fields):
+        """Queue of a packet or flow described by MATCH_FIELDS values (missing = unknown)."""
+        for queue_id, match in self.rules:
+            if all(fields.get(field) == value for field, value in match.items()):
+                return queue_id
+        return 0
+
+
+def of10_match(match):
+    """ofp_match keyword arguments (OpenFlow 1.0, POX) for a class rule."""
+    fields = {"dl_type": IPV4}
+    if "ip_proto" in match:
+        fields["nw_proto"] = match["ip_proto"]
+    if "dscp" in match:
+        fields["nw_tos"] = match["dscp"] << 2  # OF1.0 matches the whole ToS byte
+    for field in ("tp_src", "tp_dst"):
+        if field in match:
+            fields[field] = match[field]
+    return fields
+
+
+def of13_match(match):
+    """OFPMatch keyword arguments (OpenFlow 1.3, OS-Ken) for a class rule."""
+    fields = {"eth_type": IPV4}
+    if "ip_proto" in match:
+        fields["ip_proto"] = match["ip_proto"]
+    if "dscp" in match:
+        fields["ip_dscp"] = match["dscp"]
+    transport = "tcp" if match.get("ip_proto") == TCP else "udp"
+    for field, name in (("tp_src", "src"), ("tp_dst", "dst")):
+        if field in match:
+            fields[f"{transport}_{name}"] = match[field]
+    return fields
+
+
+def load_plan(path):
+    """Build a QueuePlan from a JSON classes file (see module docstring)."""
+    with open(path) as f:
+        config = json.load(f)
+    classes = [TrafficClass(entry.get("name", f"queue{entry['queue']}"), int(entry["queue"]),
+                            float(entry.get("share", 0.0)), int(entry.get("priority", 0)),
+                            entry.get("match", []), float(entry.get("ceil", 1.0)))
+               for entry in config["classes"]]
+    return QueuePlan(classes, config.get("default_priority", 1))
@@ -0,0 +1,183 @@
+"""
+QoS rate policies: which telemetry changes are worth a reconfiguration.
+
+A policy maps a telemetry bitrate (bps) to the (rate_kbps, burst_kbps) a
+link should be policed at, and decides per sample whether to change the
+enforced rate. Per-link memory lives in a RateState on the Link, so one
+policy object can serve many links.
+
+  - RatePolicy: the original behaviour; any change of the kbps value is
+    applied at once.
+  - HysteresisPolicy: snaps targets to a discrete rate ladder, ignores
+    changes inside a hysteresis band, holds a rate for a minimum dwell
+    time, and reacts to drops and rises with separate delays (the level
+    sustained over the delay is applied, so a one-sample spike is not).
+
+Burst is a function of the rate: `burst_ratio` seconds of traffic,
+clamped to [min_burst_kbps, max_burst_kbps].
+
+make_policy() picks the class from the options given, so controllers
+and links files configure both the same way.
+"""
+import bisect
+import time
+
+
+class RateState(object):
+    """Per-link policy memory and counters."""
+
+    def __init__(self):
+        self.changed_at = None   # when the policy last returned a change
+        self.direction = 0       # +1 / -1 while a rise / drop is pending
+        self.since = 0.0         # when the pending move started
+        self.candidate = None    # level sustained since then (kbps)
+        self.changes = 0         # reconfigurations requested
+        self.avoided = 0         # samples the original policy would have applied
+
+
+class RatePolicy(object):
+    """
+    Args:
+        min_kbps: Lower bound for the enforced rate
+        max_kbps: Upper bound for the enforced rate (None = no cap)
+        burst_ratio: Burst in seconds of traffic at the rate
+        min_burst_kbps: Lower bound for the burst
+        max_burst_kbps: Upper bound for the burst (None = no cap)
+    """
+
+    def __init__(self, min_kbps=1, max_kbps=None, burst_ratio=1.0, min_burst_kbps=0, max_burst_kbps=None):
+        self.min_kbps = min_kbps
+        self.max_kbps = max_kbps
+        self.burst_ratio = burst_ratio
+        self.min_burst_kbps = min_burst_kbps
+        self.max_burst_kbps = max_burst_kbps
+
+    def options(self):
+        """Constructor arguments of this policy, for copies with overrides."""
+        return dict(vars(self))
+
+    def replace(self, **options):
+        """New policy with some options changed; the class follows the options."""
+        merged = self.options()
+        merged.update(options)
+        return make_policy(**merged)
+
+    def kbps(self, bitrate):
+        """Telemetry bps -> rate in kbps, clamped but not otherwise smoothed."""
+        rate_kbps = max(self.min_kbps, int(bitrate / 1000))
+        if self.max_kbps is not None:
+            rate_kbps = min(rate_kbps, self.max_kbps)
+        return rate_kbps
+
+    def burst_kbps(self, rate_kbps):
+        burst = max(int(rate_kbps * self.burst_ratio), self.min_burst_kbps)
+        if self.max_burst_kbps is not None:
+            burst = min(burst, self.max_burst_kbps)
+        return burst
+
+    def target(self, bitrate):
+        rate_kbps = self.kbps(bitrate)
+        return rate_kbps, self.burst_kbps(rate_kbps)
+
+    def decide(self, state, current_kbps, bitrate, now=None):
+        """
+        (rate_kbps, burst_kbps) to enforce for a new sample, or None to keep
+        `current_kbps` (None = nothing enforced yet).
+        """
+        rate_kbps = self.kbps(bitrate)
+        if rate_kbps == current_kbps:
+            return None
+        return self._change(state, rate_kbps, time.monotonic() if now is None else now)
+
+    def _change(self, state, rate_kbps, now):
+        state.changed_at = now
+        state.direction = 0
+        state.candidate = None
+        state.changes += 1
+        return rate_kbps, self.burst_kbps(rate_kbps)
+
+
+class HysteresisPolicy(RatePolicy):
+    """
+    Args:
+        ladder: Ascending rates (kbps) a target is rounded down to (None = any)
+        hysteresis: Changes within this fraction of the current rate are ignored
+        min_dwell: Seconds a rate is held before it may change again
+        up_delay: Seconds a higher level must be sustained before rising
+        down_delay: Seconds a lower level must be sustained before dropping
+        **kwargs: RatePolicy options (bounds, burst sizing)
+    """
+
+    def __init__(self, ladder=None, hysteresis=0.0, min_dwell=0.0, up_delay=0.0, down_delay=0.0, **kwargs):
+        super(HysteresisPolicy, self).__init__(**kwargs)
+        self.ladder = tuple(sorted(ladder)) if ladder else None
+        self.hysteresis = hysteresis
+        self.min_dwell = min_dwell
+        self.up_delay = up_delay
+        self.down_delay = down_delay
+
+    def kbps(self, bitrate):
+        rate_kbps = super(HysteresisPolicy, self).kbps(bitrate)
+        if self.ladder:
+            # Highest step not above the target (never police above capacity);
+            # targets below the first step get the first step
+            i = bisect.bisect_right(self.ladder, rate_kbps)
+            rate_kbps = self.ladder[i - 1] if i else self.ladder[0]
+        return rate_kbps
+
+    def decide(self, state, current_kbps, bitrate, now=None):
+        rate_kbps = self.kbps(bitrate)
+        now = time.monotonic() if now is None else now
+        if current_kbps is None:
+            return self._change(state, rate_kbps, now)
+        raw_changed = RatePolicy.kbps(self, bitrate) != current_kbps
+
+        if abs(rate_kbps - current_kbps) <= self.hysteresis * current_kbps:
+            # Back inside the band: a pending move is called off
+            state.direction = 0
+            state.candidate = None
+            state.avoided += raw_changed
+            return None
+
+        direction = 1 if rate_kbps > current_kbps else -1
+        if direction != state.direction:
+            state.direction, state.since, state.candidate = direction, now, rate_kbps
+        elif direction > 0:
+            state.candidate = min(state.candidate, rate_kbps)
+        else:
+            state.candidate = max(state.candidate, rate_kbps)
+
+        delay = self.up_delay if direction > 0 else self.down_delay
+        dwelling = state.changed_at is not None and now - state.changed_at < self.min_dwell
+        if dwelling or now - state.since < delay:
+            state.avoided += raw_changed
+            return None
+        return self._change(state, state.candidate, now)
+
+
+def make_policy(ladder=None, hysteresis=0.0, min_dwell=0.0, up_delay=0.0, down_delay=0.0, **kwargs):
+    """HysteresisPolicy if any of its options is set, else a plain RatePolicy."""
+    if ladder or hysteresis or min_dwell or up_delay or down_delay:
+        return HysteresisPolicy(ladder, hysteresis, min_dwell, up_delay, down_delay, **kwargs)
+    return RatePolicy(**kwargs)
+
+
+def parse_ladder(spec):
+    """
+    Ladder from a string: "500,1000,2000" (kbps) or "geometric:<min>:<max>:<ratio>",
+    e.g. "geometric:1000:10000:1.25". Empty or None -> None.
+    """
+    if not spec:
+        return None
+    if spec.startswith("geometric:"):
+        low, high, ratio = (float(x) for x in spec.split(":")[1:])
+        if ratio <= 1.0:
+            raise ValueError(f"Ladder ratio must be > 1, got {ratio}")
+        steps = []
+        rate = low
+        while rate < high:
+            steps.append(int(rate))
+            rate *= ratio
+        steps.append(int(high))
+        return tuple(steps)
+    return tuple(sorted(int(x) for x in spec.split(",") if x.strip()))
@@ -0,0 +1,244 @@
+"""
+Binary BITRATE telemetry codec shared by all Python producers and consumers.
+
+Wire format: a ZMQ multipart message [topic, payload] where payload is
+
+    header   magic b'SDRB' | version u8 | reserved u8 | count u16      (8 bytes)
+    records  count x { seq u64 | timestamp f64 | rate f32 | link u16 | flags u16 }
+                                                                      (24 bytes each)
+
+all little-endian. One message can carry many samples (and links).
+Decoding returns a NumPy structured array that is a zero-copy view of
+the payload.
+
+Two legacy formats are still decoded:
+  - GRC zeromq.pub_sink: [b'BITRATE', float32 * n]
+  - trans.py (old):      b'BITRATE <number>' as a single frame
+Legacy records get seq 0, link 0 and a NaN timestamp.
+"""
+import struct
+import time
+
+import numpy as np
+
+TOPIC = b"BITRATE"
+MAGIC = b"SDRB"
+VERSION = 1
+
+HEADER = struct.Struct("<4sBBH")
+RECORD = np.dtype([
+    ("seq", "<u8"),
+    ("ts", "<f8"),
+    ("rate", "<f4"),
+    ("link", "<u2"),
+    ("flags", "<u2"),
+])
+_RECORD_STRUCT = struct.Struct("<QdfHH")
+MAX_RECORDS = 0xFFFF
+
+assert _RECORD_STRUCT.size == RECORD.itemsize
+
+
+class CodecError(ValueError):
+    """Raised for payloads that are neither a valid frame nor a legacy format."""
+
+
+###########################################################################
+# Encoding
+###########################################################################
+
+def encode_one(rate, seq=0, link=0, ts=None):
+    """Payload with a single record (fast path, no NumPy)."""
+    if ts is None:
+        ts = time.time()
+    return HEADER.pack(MAGIC, VERSION, 0, 1) + _RECORD_STRUCT.pack(seq, ts, rate, link, 0)
+
+
+def encode(rates, seqs=0, links=0, ts=None):
+    """Payload with one record per element of `rates` (scalars broadcast)."""
+    rates = np.asarray(rates, dtype=np.float32).reshape(-1)
+    n = len(rates)
+    if n > MAX_RECORDS:
+        raise CodecError(f"At most {MAX_RECORDS} records per frame, got {n}")
+    records = np.empty(n, dtype=RECORD)
+    records["seq"] = seqs
+    records["ts"] = time.time() if ts is None else ts
+    records["rate"] = rates
+    records["link"] = links
+    records["flags"] = 0
+    return HEADER.pack(MAGIC, VERSION, 0, n) + records.tobytes()
+
+
+def message(rate, seq=0, link=0, ts=None, topic=TOPIC):
+    """Multipart message [topic, payload] for one sample."""
+    return [topic, encode_one(rate, seq, link, ts)]
+
+
+def encode_legacy(rate):
+    """GRC-style raw float32 payload, for consumers that only know that format."""
+    return struct.pack("<f", rate)
+
+
+class BatchEncoder(object):
+    """Collects samples and emits them as one multi-record payload."""
+
+    def __init__(self, capacity=1024):
+        self.records = np.empty(min(capacity, MAX_RECORDS), dtype=RECORD)
+        self.count = 0
+
+    def add(self, rate, seq=0, link=0, ts=None):
+        """Add a sample; returns True once the batch is full."""
+        self.records[self.count] = (seq, time.time() if ts is None else ts, rate, link, 0)
+        self.count += 1
+        return self.count == len(self.records)
+
+    def flush(self):
+        """Return the payload for all pending samples and reset (None if empty)."""
+        if self.count == 0:
+            return None
+        payload = HEADER.pack(MAGIC, VERSION, 0, self.count) + self.records[:self.count].tobytes()
+        self.count = 0
+        return payload
+
+
+###########################################################################
+# Decoding
+###########################################################################
+
+def is_frame(payload):
+    if len(payload) < HEADER.size or bytes(payload[:4]) != MAGIC:
+        return False
+    count = HEADER.unpack_from(payload)[3]
+    return len(payload) == HEADER.size + count * RECORD.itemsize
+
+
+def decode_payload(payload):
+    """Zero-copy view of the records in a frame payload (bytes/memoryview/zmq buffer)."""
+    if len(payload) < HEADER.size:
+        raise CodecError("Truncated telemetry frame")
+    magic, version, _, count = HEADER.unpack_from(payload)
+    if magic != MAGIC:
+        raise CodecError("Not a telemetry frame")
+    if version != VERSION:
+        raise CodecError(f"Unsupported telemetry frame version {version}")
+    if len(payload) != HEADER.size + count * RECORD.itemsize:
+        raise CodecError("Truncated telemetry frame")
+    return np.frombuffer(payload, dtype=RECORD, count=count, offset=HEADER.size)
+
+
+def _legacy_records(rates):
+    records = np.zeros(len(rates), dtype=RECORD)
+    records["ts"] = np.nan
+    records["rate"] = rates
+    return records
+
+
+def decode(parts, topic=TOPIC):
+    """
+    Decode a received multipart message (list of bytes, memoryviews or
+    zmq.Frame) into a RECORD array. Raises CodecError if it is none of
+    the supported formats or has the wrong topic.
+    """
+    parts = [p.buffer if hasattr(p, "buffer") else p for p in parts]
+
+    if len(parts) == 1:
+        # Legacy string format: "BITRATE 500000000"
+        try:
+            name, value = bytes(parts[0]).split()
+            rate = float(value)
+        except ValueError:
+            raise CodecError("Unrecognised single-frame message")
+        if not name.startswith(topic):
+            raise CodecError(f"Unexpected topic {name!r}")
+        return _legacy_records([rate])
+
+    if len(parts) != 2:
+        raise CodecError(f"Expected [topic, payload], got {len(parts)} frames")
+    name, payload = parts
+    if not bytes(name).startswith(topic):
+        raise CodecError(f"Unexpected topic {bytes(name)!r}")
+
+    # Anything starting with the magic is a frame; a bad one raises instead of reading as floats
+    if bytes(payload[:4]) == MAGIC:
+        return decode_payload(payload)
+
+    # Legacy GRC format: one or more raw little-endian float32 values
+    usable = len(payload) // 4 * 4
+    if usable == 0:
+        raise CodecError("Empty payload")
+    return _legacy_records(np.frombuffer(payload, dtype="<f4", count=usable // 4))
+
+
+# A single-record frame, header included, as one structured item
+_SINGLE = np.dtype([("magic", "S4"), ("version", "u1"), ("reserved", "u1"), ("count", "<u2")] + RECORD.descr)
+_LEGACY = np.dtype("<f4")
+
+
+def decode_batch(messages, topic=TOPIC):
+    """
+    Decode a list of received multipart messages (bytes parts) into one
+    RECORD array in message order; returns (records, undecodable count).
+
+    Single-record frames and single-float GRC frames, the common case at
+    high rates, are decoded with one np.frombuffer per batch; anything
+    else goes through decode().
+    """
+    singles, single_at = [], []
+    floats, float_at = [], []
+    others, other_at = [], []
+    bad = 0
+    for i, parts in enumerate(messages):
+        if len(parts) == 2 and parts[0].startswith(topic):
+            size = len(parts[1])
+            if size == _SINGLE.itemsize:
+                singles.append(parts[1])
+                single_at.append(i)
+                continue
+            if size == _LEGACY.itemsize:
+                floats.append(parts[1])
+                float_at.append(i)
+                continue
+        try:
+            records = decode(parts, topic)
+        except CodecError:
+            bad += 1
+            continue
+        others.append(records)
+        other_at.append(np.full(len(records), i))
+
+    chunks, order = [], []
+    if singles:
+        frames = np.frombuffer(b"".join(singles), dtype=_SINGLE)
+        ok = (frames["magic"] == MAGIC) & (frames["version"] == VERSION) & (frames["count"] == 1)
+        records = np.empty(len(frames), dtype=RECORD)
+        for name in RECORD.names:
+            records[name] = frames[name]
+        # 24 bytes that merely look like a frame size: decode them one by one
+        for j in np.nonzero(~ok)[0]:
+            try:
+                others.append(decode([topic, singles[j]], topic))
+                other_at.append(np.full(len(others[-1]), single_at[j]))
+            except CodecError:
+                bad += 1
+        chunks.append(records[ok])
+        order.append(np.asarray(single_at)[ok])
+    if floats:
+        chunks.append(_legacy_records(np.frombuffer(b"".join(floats), dtype=_LEGACY)))
+        order.append(np.asarray(float_at))
+    chunks += others
+    order += other_at
+    if not chunks:
+        return np.empty(0, dtype=RECORD), bad
+    records = np.concatenate(chunks)
+    if len(chunks) > 1:
+        records = records[np.argsort(np.concatenate(order), kind="stable")]
+    return records, bad
+
+
+def latest_rate(parts, topic=TOPIC):
+    """Newest rate in a message, or None if it cannot be decoded."""
+    try:
+        records = decode(parts, topic)
+    except CodecError:
+        return None
+    return float(records["rate"][-1]) if len(records) else None
@@ -1,5 +1,6 @@
 import zmq
 import time
+import telemetry_codec
 
 context = zmq.Context()
 socket = context.socket(zmq.PUB)
@@ -7,9 +8,11 @@ socket.bind("tcp://*:5555")
 
 print("Fake SDR transmitting...")
 
+seq = 0
 while True:
-    # Send 500 Mbps (Good for Video)
-    msg = "BITRATE 500000000"
-    socket.send_string(msg)
-    print(f"Sent: {msg}")
-    time.sleep(2)
\ No newline at end of file
+    # Send 500 Mbps (Good for Video) as a binary telemetry frame
+    bitrate = 500000000
+    socket.send_multipart(telemetry_codec.message(bitrate, seq=seq))
+    print(f"Sent: BITRATE {bitrate} (seq {seq})")
+    seq += 1
+    time.sleep(2)